@@ -5,9 +5,11 @@ import subprocess
 import logging
 import time
 
-import psutil
-
-from gpu_monitor import NvidiaPowerMonitor
+from rapl_monitor import RaplPowerLog, rapl_available
+from process_watcher import create_process_watcher
+from sampling_engine import create_monitoring_engine
+from cpu_power_model import modelled_cpu_energy_kwh
+from self_overhead import ProcessCpuMeter
 
 shortcut_path = 'C:\\Users\\lzwei\\OneDrive\\Desktop\\IntelPowerGadget.exe-autolog.lnk'
 logger = logging.getLogger(__name__)
@@ -30,6 +32,8 @@ class IntelPowerGadget:
         self._resolution = resolution
         self._setup_cli()
         self.process = None
+        # the CPU seconds of PowerLog itself, part of the monitoring overhead
+        self.cpu_time_sec = 0.0
 
     def _setup_cli(self):
         """
@@ -82,8 +86,14 @@ class IntelPowerGadget:
             # command = f"'{self._cli}' -resolution {self._resolution} -file {self._log_file_path} > /dev/null"
             self.process = subprocess.Popen(command, shell=True)
 
+        # PowerLog runs outside the monitored script's sampling engine, so its CPU time is polled here
+        meter = ProcessCpuMeter(self.process.pid, 'PowerLog')
+        meter.start()
         # Capture the output of the process
-        stdout, stderr = self.process.communicate()
+        try:
+            stdout, stderr = self.process.communicate()
+        finally:
+            self.cpu_time_sec = meter.stop()
         self.script_output = stdout.decode().strip() if stdout else stderr.decode().strip()
 
         # print(self.script_output)
@@ -112,6 +122,22 @@ class IntelPowerGadget:
                 self.process.kill()
 
 
+def create_cpu_power_logger(
+        output_dir: str = ".",
+        resolution: int = 100,
+        log_file_name: str = "intel_power_gadget_log.csv",
+):
+    """
+    Returns the CPU energy logger for the current platform.
+
+    Linux has no Intel Power Gadget, so the RAPL counters are sampled in-process instead; both
+    loggers write the same log layout.
+    """
+    if sys.platform.lower().startswith("linux"):
+        return RaplPowerLog(output_dir=output_dir, resolution=resolution, log_file_name=log_file_name)
+    return IntelPowerGadget(output_dir=output_dir, resolution=resolution, log_file_name=log_file_name)
+
+
 class Amd_Power_Log:
     def __init__(
             self,
@@ -130,7 +156,8 @@ class Amd_Power_Log:
         self.monitoring_mode = monitoring_mode
         self.program_running_name = program_running_name
         self.detecting_interval = detecting_interval
-    # For AMD cpus on Windows, the power log could not be used, so the defaultTDP was used to estimate the CPU usage
+    # For AMD cpus on Windows, the power log could not be used, so the CPU energy is modelled from the
+    # utilisation and clock frequency scaled to the TDP
 
     def amd_monitor_usage(self):
         rz_path = os.path.join(self.program_path, self.program_name)
@@ -139,21 +166,22 @@ class Amd_Power_Log:
             # use keyword or use the cmd command directly for running the powerlog from power gadget
             # current setting the bash mode includes the initiation of the GPU logging module
             start_time = time.time()
-            gpu_monitor = NvidiaPowerMonitor()
             if self.monitoring_mode.lower() == 'bash mode':
-                gpu_monitor.start_monitoring()
-                subprocess.run(rz_path, cwd=r'{}'.format(cmd_path))
-                gpu_monitor.stop_monitoring()
+                process = subprocess.Popen(rz_path, cwd=r'{}'.format(cmd_path))
+                engine = create_monitoring_engine(root_pid=process.pid, include_cpu=False, cpu_tdp=self.cpu_tdp,
+                                                  cpu_model=self.cpu)
+                engine.start()
+                process.wait()
+                engine.stop()
                 end_time = time.time()
                 duration = round(end_time - start_time, 2)
                 print(f"Simulation completed in {duration} seconds.")
-                cpu_energy_usage = self.cpu_tdp*duration/(3600*1000)
+                cpu_energy_usage = modelled_cpu_energy_kwh(engine)
                 return cpu_energy_usage, duration
             elif self.monitoring_mode.lower() == 'direct mode':
                     start_time = time.time()
                     process_name = self.program_running_name
                     interval = self.detecting_interval
-                    gpu_monitor = NvidiaPowerMonitor()
                     """
                     Waits for a process to start and then terminate.
 
@@ -161,29 +189,25 @@ class Amd_Power_Log:
                         process_name (str): The name of the process to monitor.
                         interval (int): The interval (in seconds) at which to check for the process.
                     """
-                    process_started = False
-                    while True:
-                        # Check if the process is running
-                        for process in psutil.process_iter(['name']):
-                            try:
-                                if process.info['name'] == process_name:
-                                    if not process_started:
-                                        logger.info(f"Process {process_name} has started.")
-                                        process_started = True
-                                        gpu_monitor.start_monitoring()
-                                    break
-                            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                                continue
-                        else:
-                            if process_started:
-                                logger.info(f"Process {process_name} has terminated.")
-                                gpu_monitor.stop_monitoring()
-                                end_time = time.time()
-                                duration = round(end_time - start_time, 2)
-                                print(f"Simulation completed in {duration} seconds.")
-                                cpu_energy_usage = self.cpu_tdp * duration / (3600 * 1000)
-                                return cpu_energy_usage, duration
-                        time.sleep(interval)
+                    watcher = create_process_watcher(interval)
+                    try:
+                        started = watcher.wait_for_start(process_name)
+                        logger.info(f"Process {process_name} has started.")
+                        engine = create_monitoring_engine(root_pid=started.pid, include_cpu=False,
+                                                          cpu_tdp=self.cpu_tdp, cpu_model=self.cpu)
+                        engine.start()
+                        pid = started.pid
+                        while pid is not None:
+                            exited = watcher.wait_for_exit(pid)
+                            pid = watcher.find_running(process_name)
+                        logger.info(f"Process {process_name} has terminated.")
+                        engine.stop()
+                    finally:
+                        watcher.close()
+                    duration = round(exited.timestamp - start_time, 2)
+                    print(f"Simulation completed in {duration} seconds.")
+                    cpu_energy_usage = modelled_cpu_energy_kwh(engine)
+                    return cpu_energy_usage, duration
 
         except Exception as e:
             print(e)
@@ -0,0 +1,212 @@
+import os
+import json
+import logging
+
+import psutil
+
+from sampling_engine import Sensor
+
+logger = logging.getLogger(__name__)
+
+ATTRIBUTION_FILE = 'process_attribution.json'
+PROC_ROOT = '/proc'
+
+
+def system_busy_time():
+    """
+    Returns the CPU time all cores spent doing work since boot, in seconds.
+
+    Idle and iowait are excluded; guest time is already part of user time on Linux.
+    """
+    times = psutil.cpu_times()
+    total = sum(times) - getattr(times, 'guest', 0) - getattr(times, 'guest_nice', 0)
+    return total - times.idle - getattr(times, 'iowait', 0)
+
+
+def rapl_package_energy_reader():
+    """
+    Returns a callable giving the cumulative package energy in Joules, or None without RAPL.
+    """
+    from rapl_monitor import discover_rapl_domains
+    domains = discover_rapl_domains(kinds=('package',))
+    if not domains:
+        return None
+    return lambda: sum(domain.update() for domain in domains)
+
+
+def proc_tree_pids(root_pid, proc_root=PROC_ROOT):
+    """
+    Returns the PIDs of a process and all of its descendants from /proc/<pid>/task/<tid>/children.
+
+    Returns:
+        set: The PIDs, empty once the root has exited, or None when the kernel does not expose
+        the children files.
+    """
+    if not os.path.exists(f'{proc_root}/{root_pid}/task/{root_pid}/children'):
+        return None
+    pids, pending = {root_pid}, [root_pid]
+    while pending:
+        try:
+            children = _children(pending.pop(), proc_root) - pids
+        except OSError:
+            continue
+        pids.update(children)
+        pending.extend(children)
+    return pids
+
+
+def _children(pid, proc_root):
+    # /proc/<pid>/task/<tid>/children lists the direct children of each thread
+    children = set()
+    for tid in os.listdir(f'{proc_root}/{pid}/task'):
+        with open(f'{proc_root}/{pid}/task/{tid}/children', 'r') as file:
+            children.update(int(child) for child in file.read().split())
+    return children
+
+
+class ProcessTreeTracker(Sensor):
+    """
+    Follows a launched model PID and all of its descendants, and measures which share of the
+    machine's CPU time the tree used in each sampling window.
+
+    Process handles are cached between ticks and only the tree members are sampled. The CPU time
+    of descendants that already exited is kept through their parents' children_* counters.
+    Package energy read in the same window is split by that share, so other tenants of a shared
+    node are not charged to the model. The tracker runs as a SamplingEngine sensor, see
+    sampling_engine.create_monitoring_engine.
+    """
+
+    name = 'process_tree'
+    fields = ('tree_cpu_sec', 'system_busy_sec', 'package_energy_j', 'attributed_energy_j')
+
+    def __init__(self, root_pid, energy_reader=None, proc_root=PROC_ROOT, period=1, summary_path=None):
+        self.root_pid = root_pid
+        self.energy_reader = energy_reader
+        self.proc_root = proc_root
+        self.period = period
+        self.summary_path = summary_path
+        self.start_time = None
+        self.end_time = None
+        self.tree_cpu_sec = 0.0
+        self.system_busy_sec = 0.0
+        self.measured_energy_j = None
+        self.attributed_energy_j = None
+        self._handles = {}
+        self._previous = None
+
+    def _tree_pids(self):
+        pids = proc_tree_pids(self.root_pid, self.proc_root)
+        if pids is not None:
+            return pids
+        root = self._handle(self.root_pid)
+        if root is None:
+            return set()
+        try:
+            return {self.root_pid} | {child.pid for child in root.children(recursive=True)}
+        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            return {self.root_pid}
+
+    def _handle(self, pid):
+        handle = self._handles.get(pid)
+        if handle is None:
+            try:
+                handle = self._handles[pid] = psutil.Process(pid)
+            except psutil.NoSuchProcess:
+                return None
+        return handle
+
+    def tree_cpu_time(self):
+        """
+        Returns the CPU seconds used so far by the tree, including reaped descendants.
+        """
+        pids = self._tree_pids()
+        total = 0.0
+        for pid in pids:
+            handle = self._handle(pid)
+            if handle is None:
+                continue
+            try:
+                times = handle.cpu_times()
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                self._handles.pop(pid, None)
+                continue
+            total += times.user + times.system + times.children_user + times.children_system
+        for pid in self._handles.keys() - pids:
+            del self._handles[pid]
+        return total
+
+    def _read(self, timestamp):
+        energy = self.energy_reader() if self.energy_reader is not None else None
+        return timestamp, self.tree_cpu_time(), system_busy_time(), energy
+
+    def _record_window(self, timestamp):
+        previous, current = self._previous, self._read(timestamp)
+        self._previous = current
+        # the tree total can dip while a dead child waits to be reaped; never record negative time
+        tree_delta = max(0.0, current[1] - previous[1])
+        busy_delta = max(0.0, current[2] - previous[2])
+        self.tree_cpu_sec += tree_delta
+        self.system_busy_sec += busy_delta
+        self.end_time = timestamp
+        if current[3] is None:
+            return tree_delta, busy_delta, float('nan'), float('nan')
+        energy_delta = current[3] - previous[3]
+        attributed = energy_delta * min(1.0, tree_delta / busy_delta) if busy_delta > 0 else 0.0
+        self.measured_energy_j = (self.measured_energy_j or 0.0) + energy_delta
+        self.attributed_energy_j = (self.attributed_energy_j or 0.0) + attributed
+        return tree_delta, busy_delta, energy_delta, attributed
+
+    def open(self, engine):
+        self._previous = self._read(engine.start_wall)
+        self.start_time = self.end_time = engine.start_wall
+
+    def read(self, timestamp, elapsed):
+        return [self._record_window(timestamp)]
+
+    def close(self, timestamp, elapsed):
+        self._record_window(timestamp)
+        if self.summary_path is not None:
+            self.write_summary(self.summary_path)
+
+    def summary(self):
+        """
+        Summarises the windows recorded so far.
+
+        Returns:
+            dict: The tree and whole-system CPU seconds, the overall CPU share, the measured and
+            attributed package energy in Joules when an energy reader was given, and energy_share,
+            the factor to apply to a whole-system CPU energy figure.
+        """
+        busy_time = self.system_busy_sec
+        cpu_share = min(1.0, self.tree_cpu_sec / busy_time) if busy_time > 0 else 0.0
+        energy_share = cpu_share
+        if self.measured_energy_j:
+            energy_share = self.attributed_energy_j / self.measured_energy_j
+        return {
+            'root_pid': self.root_pid,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'tree_cpu_time_sec': self.tree_cpu_sec,
+            'system_busy_time_sec': busy_time,
+            'cpu_share': cpu_share,
+            'measured_package_energy_j': self.measured_energy_j,
+            'attributed_package_energy_j': self.attributed_energy_j,
+            'energy_share': energy_share,
+        }
+
+    def write_summary(self, file_path=ATTRIBUTION_FILE):
+        """
+        Writes the attribution summary as JSON, for res_gen to pick up after the run.
+        """
+        with open(file_path, 'w') as file:
+            json.dump(self.summary(), file, indent=4)
+
+
+def load_attribution(file_path=ATTRIBUTION_FILE):
+    """
+    Loads the attribution summary written by the monitoring run, or None if there is none.
+    """
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return json.load(file)
@@ -2,61 +2,79 @@ import json
 import sys
 import time
 import subprocess
-from CPU_monitor import IntelPowerGadget
-from gpu_monitor import NvidiaPowerMonitor
+from sampling_engine import create_monitoring_engine
+from output_pipeline import Passthrough, pump
+from phases import PhaseRecorder, PHASES_FILE, phase_markers as project_phase_markers
 import threading
 import os
 
 
-def start_simulation_and_monitor(rz_dir, gpu_monitor, wrapping_mode,
-                                 starting_line, ending_line, model_name):
+def start_simulation_and_monitor(rz_dir, wrapping_mode, starting_line, ending_line, model_name, output_dir='.',
+                                 include_cpu=None, include_gpu=True, passthrough='full', output_log_file=None,
+                                 phase_markers=None, cpu_tdp=None, cpu_model=None, include_overhead=True,
+                                 log_format='csv', power_tiers=None, keep_raw_log=True):
     rz_path = os.path.join(rz_dir, model_name)
     cmd_path = rz_dir
     try:
         # use keyword or use the cmd command directly for running the powerlog from power gadget
-        # current setting the bash mode includes the initiation of the GPU logging module
+        # one sampling engine logs the CPU energy (on Linux), the GPU power and the process tree share
         start_time = time.time()
         if wrapping_mode == 2:
-            gpu_monitor.start_monitoring()
-            subprocess.run(rz_path, cwd=r'{}'.format(cmd_path))
-            gpu_monitor.stop_monitoring()
+            process = subprocess.Popen(rz_path, cwd=r'{}'.format(cmd_path))
+            engine = create_monitoring_engine(root_pid=process.pid, include_cpu=include_cpu,
+                                              include_gpu=include_gpu, output_dir=output_dir,
+                                              cpu_tdp=cpu_tdp, cpu_model=cpu_model,
+                                              include_overhead=include_overhead, log_format=log_format,
+                                              power_tiers=power_tiers, keep_raw_log=keep_raw_log)
+            engine.start()
+            process.wait()
+            engine.stop()
             end_time = time.time()
             duration = round(end_time - start_time, 2)
             print(f"Simulation completed in {duration} seconds.")
 
         elif wrapping_mode == 1:
-            cpu_monitor = IntelPowerGadget()
-
             process = subprocess.Popen(rz_path, cwd=r'{}'.format(cmd_path), stdout=subprocess.PIPE,
-                                       stderr=subprocess.PIPE, text=True)
-
-            def process_output(stream, func_map):
-                for line in iter(stream.readline, ''):
-                    print(line, end='')  # Print the line for real-time feedback
-                    for key, func_list in func_map.items():
-                        if key in line:
-                            for func in func_list:
-                                func()
+                                       stderr=subprocess.PIPE)
+            engine = create_monitoring_engine(root_pid=process.pid, include_cpu=include_cpu,
+                                              include_gpu=include_gpu, output_dir=output_dir,
+                                              cpu_tdp=cpu_tdp, cpu_model=cpu_model,
+                                              include_overhead=include_overhead, log_format=log_format,
+                                              power_tiers=power_tiers, keep_raw_log=keep_raw_log)
+            # the output is read in binary chunks and scanned for all key strings at once
+            stdout_passthrough = Passthrough(passthrough, output_log_file)
+            stderr_passthrough = Passthrough(passthrough, output_log_file, console=sys.stderr.buffer)
+
+            # phases are timed on the engine clock; the first phase marker also starts the engine
+            recorder = PhaseRecorder(engine, os.path.join(output_dir, PHASES_FILE))
 
             # Mapping strings to the respective methods without calling them immediately
             func_map = {
                 # " ====>  INITIAL VALUES READ IN": [cpu_monitor.start_logging, gpu_monitor.start_monitoring],
                 # "NORMAL TERMINATION": [cpu_monitor.stop_logging, gpu_monitor.stop_monitoring]
-                starting_line: [cpu_monitor.start_logging, gpu_monitor.start_monitoring],
-                ending_line: [cpu_monitor.stop_logging, gpu_monitor.stop_monitoring]
+                starting_line: [engine.start],
+                ending_line: [recorder.finish, engine.stop]
             }
+            for marker, func_list in recorder.callbacks(phase_markers or []).items():
+                func_map[marker] = func_map.get(marker, []) + func_list
 
-            stdout_thread = threading.Thread(target=process_output, args=(process.stdout, func_map))
-            stderr_thread = threading.Thread(target=process_output,
-                                             args=(process.stderr, {}))  # Handle stderr similarly if needed
+            stdout_thread = threading.Thread(target=pump, args=(process.stdout, stdout_passthrough, func_map),
+                                             name='stdout pump')
+            stderr_thread = threading.Thread(target=pump, args=(process.stderr, stderr_passthrough),
+                                             name='stderr pump')
 
             stdout_thread.start()
             stderr_thread.start()
 
             stdout_thread.join()
             stderr_thread.join()
+            stdout_passthrough.close()
+            stderr_passthrough.close()
 
             process.wait()
+            # the end key string may never be printed if the model fails
+            recorder.finish()
+            engine.stop()
 
             end_time = time.time()
             duration = round(end_time - start_time, 2)
@@ -91,7 +109,6 @@ if __name__ == "__main__":
     print(arg1)
     setting = load_config('conf.json')['Projects']
     setting = setting[arg1]
-    gpu_monitor = NvidiaPowerMonitor()
     # rz_dir = 'C:\\RZWQM2\\alfred\\alfred'
     setting = setting['model_wrapping_settings']
     model_dir = setting['process_based_model_dir']
@@ -100,5 +117,10 @@ if __name__ == "__main__":
     ending_key_string = setting['model_end_keystring']
     wrapping_mode = setting['bash_mode_wrapping_mode']
     model_execute_name = setting['process_based_model_cmd']
-    start_simulation_and_monitor(model_dir, gpu_monitor, wrapping_mode, starting_key_string, ending_key_string,
-                                 model_execute_name)
+    start_simulation_and_monitor(model_dir, wrapping_mode, starting_key_string, ending_key_string,
+                                 model_execute_name, passthrough=setting.get('output_passthrough', 'full'),
+                                 output_log_file=setting.get('output_log_file'),
+                                 phase_markers=project_phase_markers(setting),
+                                 log_format=setting.get('sample_log_format', 'csv'),
+                                 power_tiers=setting.get('power_tiers'),
+                                 keep_raw_log=setting.get('keep_raw_power_log', True))
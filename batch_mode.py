@@ -0,0 +1,312 @@
+import os
+import sys
+import copy
+import json
+import time
+import logging
+import argparse
+import itertools
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+from tabulate import tabulate
+
+from bash_mode import start_simulation_and_monitor
+from sampling_engine import create_monitoring_engine
+from rapl_monitor import rapl_available
+from phases import phase_markers
+from cpu_power_model import POWER_MODEL_FILE, load_power_model_summary
+from main import compute_run_metrics, parse_gpu_power_csv, load_config, grid_intensity_series
+from carbon_accounting import account_emissions, iter_gpu_energy
+from attribution import ATTRIBUTION_FILE, load_attribution
+from self_overhead import OVERHEAD_FILE, load_overhead
+from results_store import ResultsStore, RESULTS_DB
+
+logger = logging.getLogger(__name__)
+
+BATCH_OUTPUT_DIR = os.path.join('monitoring_output', 'batch')
+SUMMARY_FILE = 'batch_summary.csv'
+# metrics that add up over runs in the TOTAL row of the summary
+_ADDITIVE_METRICS = ('CPU Energy (kWh)', 'CPU Energy, Whole System (kWh)', 'Monitor Overhead CPU Energy (kWh)',
+                     'GPU Energy (kWh)', 'RAM Power Usage (kWh)', 'Total Energy Usage (kWh)',
+                     'Total Carbon Emission (g/CO2 Eq)')
+
+
+def available_cores():
+    """
+    Returns the number of cores this process may run on.
+    """
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _set_dotted(setting, dotted_key, value):
+    keys = dotted_key.split('.')
+    for key in keys[:-1]:
+        setting = setting.setdefault(key, {})
+    setting[keys[-1]] = value
+
+
+def expand_sweep(projects, sweep):
+    """
+    Expands a sweep definition into one project setting per run.
+
+    A sweep names a base project of conf.json and either a parameter grid, whose dotted keys
+    address the project settings, or an explicit list of runs:
+
+        {"base_project": "test7", "name": "rz",
+         "parameters": {"model_wrapping_settings.process_based_model_dir": ["C:/rz/a", "C:/rz/b"]}}
+
+        {"base_project": "test7",
+         "runs": [{"name": "wet", "overrides": {"model_wrapping_settings.process_based_model_dir": "C:/rz/wet"}}]}
+
+    Runs execute concurrently, so each run should point at its own model directory.
+
+    Args:
+        projects (dict): The Projects section of conf.json.
+        sweep (dict): The sweep definition.
+
+    Returns:
+        list: (run name, project setting, parameter dict) tuples.
+    """
+    base = projects[sweep['base_project']]
+    prefix = sweep.get('name', sweep['base_project'])
+    if 'runs' in sweep:
+        overrides = [(run.get('name', f'{prefix}_{index:04d}'), run.get('overrides', {}))
+                     for index, run in enumerate(sweep['runs'])]
+    else:
+        keys = list(sweep.get('parameters', {}))
+        grid = itertools.product(*(sweep['parameters'][key] for key in keys))
+        overrides = [(f'{prefix}_{index:04d}', dict(zip(keys, values))) for index, values in enumerate(grid)]
+
+    runs = []
+    for run_name, parameters in overrides:
+        setting = copy.deepcopy(base)
+        for key, value in parameters.items():
+            _set_dotted(setting, key, value)
+        setting['name'] = run_name
+        runs.append((run_name, setting, parameters))
+    return runs
+
+
+def run_project(run_name, setting, output_dir, include_cpu, include_gpu, include_overhead=True):
+    """
+    Runs and monitors one bash mode project, writing its logs to output_dir.
+
+    Args:
+        run_name (str): The name of the run, shown in the summary.
+        setting (dict): The project setting.
+        output_dir (str): The directory for the logs and the attribution summary of this run.
+        include_cpu (bool): Whether the CPU energy is read from RAPL; otherwise it is modelled
+            from the utilisation and clock frequency, scaled to the cpu_tdp of the project, as
+            Amd_Power_Log does.
+        include_gpu (bool): Whether this run logs the GPU power itself.
+        include_overhead (bool): Whether this run measures the monitoring overhead itself; runs
+            sharing the process cannot tell their overhead apart.
+
+    Returns:
+        dict: The res_gen metrics of the run.
+    """
+    if setting['monitoring_mode'] != 'bash mode':
+        raise ValueError(f"{run_name}: direct mode waits for a process by name and cannot run in a batch")
+    cpu_tdp = setting.get('cpu_tdp') or setting.get('cpu_TDP')
+    if not include_cpu and not cpu_tdp:
+        raise ValueError(f"{run_name}: without RAPL a batch run needs the cpu_tdp of the project")
+
+    os.makedirs(output_dir, exist_ok=True)
+    wrapping = setting['model_wrapping_settings']
+    duration = start_simulation_and_monitor(wrapping['process_based_model_dir'], wrapping['bash_mode_wrapping_mode'],
+                                            wrapping['model_start_keystring'], wrapping['model_end_keystring'],
+                                            wrapping['process_based_model_cmd'], output_dir=output_dir,
+                                            include_cpu=include_cpu, include_gpu=include_gpu,
+                                            # concurrent runs would interleave on the console
+                                            passthrough=wrapping.get('output_passthrough', 'tee'),
+                                            output_log_file=os.path.join(output_dir, 'model_output.log'),
+                                            phase_markers=phase_markers(wrapping),
+                                            cpu_tdp=None if include_cpu else float(cpu_tdp),
+                                            cpu_model=setting.get('cpu_info'), include_overhead=include_overhead,
+                                            log_format=wrapping.get('sample_log_format', 'csv'),
+                                            power_tiers=wrapping.get('power_tiers'),
+                                            keep_raw_log=wrapping.get('keep_raw_power_log', True))
+    if duration is None:
+        raise RuntimeError(f"{run_name}: the model run failed")
+
+    cpu_usage = None
+    if not include_cpu:
+        power_model = load_power_model_summary(os.path.join(output_dir, POWER_MODEL_FILE))
+        cpu_usage = power_model['energy_j'] / 3.6e6 if power_model is not None \
+            else float(cpu_tdp) * duration / (3600 * 1000)
+    return dict(compute_run_metrics(setting, run_name, cpu_usage, duration, output_dir=output_dir))
+
+
+def shared_gpu_emission(runs, summary, gpu_log_path, gpu_kwh):
+    """
+    Returns the emission in gCO2 of the GPU energy logged once for a whole batch.
+
+    When every run uses the same intensity, the GPU log is joined with its series as of each
+    interval, or charged at the constant intensity. Runs charged at different intensities leave
+    no single series to join with, so the mean intensity of the batch, the emission of the runs
+    over their energy, is used.
+
+    Args:
+        runs (list): (run name, project setting, parameter dict) tuples, see expand_sweep.
+        summary (pandas.DataFrame): One row of res_gen metrics per run.
+        gpu_log_path (str): The GPU power log of the batch.
+        gpu_kwh (float): The energy in that log.
+
+    Returns:
+        float: The emission in gCO2.
+    """
+    sources = []
+    for _, setting, _ in runs:
+        intensity_series = grid_intensity_series(setting)
+        sources.append(intensity_series if intensity_series is not None else setting['grid_carbon_intensity'])
+    if all(source == sources[0] for source in sources):
+        if isinstance(sources[0], (int, float)):
+            return gpu_kwh * sources[0]
+        return account_emissions([iter_gpu_energy(gpu_log_path)], sources[0])['emission_g']
+    metrics = summary.reindex(columns=['Total Energy Usage (kWh)', 'Total Carbon Emission (g/CO2 Eq)',
+                                       'Grid Carbon Intensity (g/CO2 Eq)']).apply(pd.to_numeric, errors='coerce')
+    energy_kwh = metrics['Total Energy Usage (kWh)'].sum()
+    if energy_kwh > 0:
+        return gpu_kwh * metrics['Total Carbon Emission (g/CO2 Eq)'].sum() / energy_kwh
+    return gpu_kwh * metrics['Grid Carbon Intensity (g/CO2 Eq)'].mean()
+
+
+def batch_total(runs, summary, wall_time, output_root, shared_gpu):
+    """
+    Aggregates the run metrics of a batch into its TOTAL row.
+
+    The additive metrics are summed over the runs. With a shared GPU log and monitor, the GPU
+    energy of output_root/gpu_power_log.csv and its emission, see shared_gpu_emission, are added,
+    and the CPU time of the monitor is charged at the energy per CPU second of the runs' process
+    trees.
+
+    Args:
+        runs (list): (run name, project setting, parameter dict) tuples, see expand_sweep.
+        summary (pandas.DataFrame): One row of res_gen metrics per run.
+        wall_time (float): The duration of the batch in seconds.
+        output_root (str): The directory holding the run directories and the shared logs.
+        shared_gpu (bool): Whether the GPU and the monitor overhead were logged once for the batch.
+
+    Returns:
+        dict: The TOTAL row.
+    """
+    total = {'Project_name': 'TOTAL', 'Elapsed Time (seconds)': wall_time}
+    for metric in _ADDITIVE_METRICS:
+        if metric in summary:
+            total[metric] = pd.to_numeric(summary[metric], errors='coerce').sum()
+    gpu_log_path = os.path.join(output_root, 'gpu_power_log.csv')
+    if shared_gpu and os.path.isfile(gpu_log_path):
+        batch_gpu_kwh = parse_gpu_power_csv(gpu_log_path)
+        total['GPU Energy (kWh)'] = total.get('GPU Energy (kWh)', 0.0) + batch_gpu_kwh
+        total['Total Energy Usage (kWh)'] = total.get('Total Energy Usage (kWh)', 0.0) + batch_gpu_kwh
+        total['Total Carbon Emission (g/CO2 Eq)'] = total.get('Total Carbon Emission (g/CO2 Eq)', 0.0) + \
+            shared_gpu_emission(runs, summary, gpu_log_path, batch_gpu_kwh)
+    overhead = load_overhead(os.path.join(output_root, OVERHEAD_FILE)) if shared_gpu else None
+    if overhead is not None:
+        # the batch process observed every run; its CPU seconds are charged at the energy per CPU
+        # second of the runs' process trees
+        tree_cpu_sec = 0.0
+        for run_name, _, _ in runs:
+            attribution = load_attribution(os.path.join(output_root, run_name, ATTRIBUTION_FILE))
+            tree_cpu_sec += attribution['tree_cpu_time_sec'] if attribution is not None else 0.0
+        if tree_cpu_sec > 0:
+            total['Monitor Overhead CPU Energy (kWh)'] = \
+                total.get('CPU Energy (kWh)', 0.0) / tree_cpu_sec * overhead['monitor_cpu_time_sec']
+    return total
+
+
+def run_batch(runs, workers=None, output_root=BATCH_OUTPUT_DIR, results_db=RESULTS_DB):
+    """
+    Runs several projects on a bounded worker pool and aggregates their metrics.
+
+    Every run writes to output_root/<run name>, and its CPU energy is charged by the share of the
+    machine's CPU time its process tree used, so concurrent runs are not billed for each other.
+    GPU power cannot be split by process, so with more than one worker it is logged once for the
+    whole batch and only added to the TOTAL row. So is the CPU energy of the monitor itself,
+    which then observes all runs from one process.
+
+    Args:
+        runs (list): (run name, project setting, parameter dict) tuples, see expand_sweep.
+        workers (int): The number of concurrent runs, by default the number of available cores.
+        output_root (str): The directory receiving the run directories and batch_summary.csv.
+        results_db (str): The results database the finished runs are added to; None to skip it.
+
+    Returns:
+        pandas.DataFrame: One row per run plus a TOTAL row.
+    """
+    workers = min(workers or available_cores(), len(runs)) or 1
+    include_cpu = sys.platform.lower().startswith('linux') and rapl_available()
+    shared_gpu = workers > 1
+    os.makedirs(output_root, exist_ok=True)
+    logger.info(f"Running {len(runs)} projects on {workers} workers")
+
+    batch_engine = None
+    if shared_gpu:
+        # concurrent runs share this process, so its overhead is measured once for the batch
+        batch_engine = create_monitoring_engine(include_cpu=False, output_dir=output_root)
+        batch_engine.start()
+    start_time = time.time()
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(run_project, run_name, setting, os.path.join(output_root, run_name),
+                                   include_cpu, not shared_gpu, not shared_gpu): run_name
+                       for run_name, setting, _ in runs}
+            for future in as_completed(futures):
+                run_name = futures[future]
+                try:
+                    results[run_name] = future.result()
+                    logger.info(f"Run {run_name} finished")
+                except Exception as e:
+                    logger.error(f"Run {run_name} failed: {e}")
+                    results[run_name] = {'Project_name': run_name, 'Error': str(e)}
+    finally:
+        if batch_engine is not None:
+            batch_engine.stop()
+    wall_time = time.time() - start_time
+
+    rows = []
+    for run_name, _, parameters in runs:
+        rows.append({**results[run_name], **parameters})
+    summary = pd.DataFrame(rows)
+    if results_db is not None:
+        # the whole batch is written in one transaction, sweep parameters included
+        with ResultsStore(results_db) as store:
+            for row in rows:
+                if 'Error' in row:
+                    continue
+                attribution = load_attribution(os.path.join(output_root, row['Project_name'], ATTRIBUTION_FILE))
+                store.add_run(row['Project_name'], row,
+                              started_at=attribution.get('start_time') if attribution is not None else None)
+
+    total = batch_total(runs, summary, wall_time, output_root, shared_gpu)
+    summary = pd.concat([summary, pd.DataFrame([total])], ignore_index=True)
+
+    print(tabulate(summary, headers='keys', tablefmt='grid', showindex=False))
+    summary.to_csv(os.path.join(output_root, SUMMARY_FILE), index=False)
+    return summary
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Run several ProcessC projects without prompts.')
+    parser.add_argument('projects', nargs='*', help='project names from conf.json')
+    parser.add_argument('--sweep', help='JSON file with a sweep definition')
+    parser.add_argument('--workers', type=int, default=None, help='concurrent runs, default: available cores')
+    parser.add_argument('--config', default='conf.json')
+    parser.add_argument('--output-dir', default=BATCH_OUTPUT_DIR)
+    parser.add_argument('--results-db', default=RESULTS_DB, help='results database receiving the runs')
+    args = parser.parse_args()
+
+    projects = load_config(args.config)['Projects']
+    batch_runs = [(name, projects[name], {}) for name in args.projects]
+    if args.sweep:
+        with open(args.sweep, 'r') as file:
+            batch_runs += expand_sweep(projects, json.load(file))
+    if not batch_runs:
+        parser.error('give project names or --sweep')
+    run_batch(batch_runs, workers=args.workers, output_root=args.output_dir, results_db=args.results_db)
@@ -0,0 +1,82 @@
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.log_generators import write_gpu_power_log  # noqa: E402
+from log_parsers import load_gpu_power_log, integrate_gpu_power  # noqa: E402
+
+
+def legacy_parse_gpu_power_csv(file_path):
+    """The per-row DictReader parse, mean power times first-to-last duration over all GPUs."""
+    total_power_draw_watt = 0.0
+    count = 0
+    start_timestamp = end_timestamp = None
+    with open(file_path, mode='r') as file:
+        for row in csv.DictReader(file):
+            row = {key.strip(): value.strip() if value is not None else value for key, value in row.items()}
+            power_draw_str = row.get('power.draw', '').strip()
+            timestamp_str = row.get('timestamp', '').strip()
+            try:
+                power_draw_watt = float(power_draw_str)
+            except ValueError:
+                continue
+            if timestamp_str:
+                timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S.%f')
+                total_power_draw_watt += power_draw_watt
+                count += 1
+                if start_timestamp is None:
+                    start_timestamp = timestamp
+                end_timestamp = timestamp
+    if count == 0:
+        return 0.0
+    hours = (end_timestamp - start_timestamp).total_seconds() / 3600
+    return total_power_draw_watt / count * hours / 1000
+
+
+def run(rows, gpus=2, file_path=None):
+    """
+    Times the legacy row loop against the columnar parser on a synthetic multi-GPU log.
+
+    Returns:
+        dict: Wall seconds of both parsers, the speedup and the energies they computed.
+    """
+    if file_path is None:
+        file_path = os.path.join(tempfile.gettempdir(), f'processc_bench_gpu_{rows}_{gpus}.csv')
+    if not os.path.exists(file_path):
+        write_gpu_power_log(file_path, rows, gpus)
+    start = time.perf_counter()
+    legacy_kwh = legacy_parse_gpu_power_csv(file_path)
+    legacy_sec = time.perf_counter() - start
+    start = time.perf_counter()
+    per_gpu_kwh = integrate_gpu_power(load_gpu_power_log(file_path))
+    columnar_sec = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'gpus': gpus,
+        'legacy_sec': legacy_sec,
+        'columnar_sec': columnar_sec,
+        'speedup': legacy_sec / columnar_sec if columnar_sec else None,
+        'legacy_kwh': legacy_kwh,
+        'trapezoid_kwh': sum(per_gpu_kwh.values()),
+        'per_gpu_kwh': per_gpu_kwh,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the GPU power log parsers.')
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--gpus', type=int, default=2)
+    parser.add_argument('--file', default=None, help='reuse or create the synthetic log at this path')
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.gpus, args.file), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from gpu_sensors import NvmlPowerSensor, GpustatPowerSensor, FakeNvml  # noqa: E402
+
+
+def tick_cost(sensor, ticks):
+    """
+    Returns the wall and CPU milliseconds one sensor read costs on average.
+    """
+    wall_start, cpu_start = time.perf_counter(), time.process_time()
+    for _ in range(ticks):
+        sensor.read()
+    return {'wall_ms_per_tick': (time.perf_counter() - wall_start) * 1000 / ticks,
+            'cpu_ms_per_tick': (time.process_time() - cpu_start) * 1000 / ticks}
+
+
+def run(ticks=200):
+    """
+    Compares the persistent-handle NVML sensor with the gpustat query on this machine.
+
+    Without a GPU only the simulated NVML backend is measured.
+    """
+    results = {}
+    try:
+        sensor = NvmlPowerSensor()
+        results['nvml'] = tick_cost(sensor, ticks)
+        sensor.close()
+    except Exception as e:
+        results['nvml'] = f'unavailable: {e}'
+    try:
+        results['gpustat'] = tick_cost(GpustatPowerSensor(), ticks)
+    except Exception as e:
+        results['gpustat'] = f'unavailable: {e}'
+    sensor = NvmlPowerSensor(FakeNvml(powers_w=(50.0, 120.0)))
+    results['fake_nvml'] = tick_cost(sensor, ticks)
+    sensor.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare GPU power sensor backends.')
+    parser.add_argument('--ticks', type=int, default=200)
+    args = parser.parse_args()
+    print(json.dumps(run(args.ticks), indent=4))
+
+
+if __name__ == "__main__":
+    main()
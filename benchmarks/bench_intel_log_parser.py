@@ -0,0 +1,75 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.log_generators import write_intel_power_log  # noqa: E402
+from log_parsers import read_intel_power_log_footer, load_intel_power_log, intel_interval_power, \
+    integrate_intel_power_log  # noqa: E402
+
+
+def legacy_parse_intel_power_log(file_path):
+    """The line-by-line footer scan parse_intel_power_log used before the mmap seek."""
+    cumulative_processor_energy_mwh = 0.0
+    total_elapsed_time_sec = 0.0
+    with open(file_path, mode='r') as file:
+        for line in file:
+            line = line.strip()
+            if 'Total Elapsed Time (sec)' in line:
+                total_elapsed_time_sec = float(line.split('=')[-1].strip())
+            if 'Cumulative Processor Energy_0 (mWh)' in line:
+                cumulative_processor_energy_mwh = float(line.split('=')[-1].strip())
+    return cumulative_processor_energy_mwh / 1_000_000, total_elapsed_time_sec
+
+
+def _timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def run(rows, file_path=None):
+    """
+    Times the legacy scan, the footer seek and the columnar load on a synthetic log.
+
+    Returns:
+        dict: Wall seconds of each step and the speedup of the footer seek.
+    """
+    if file_path is None:
+        file_path = os.path.join(tempfile.gettempdir(), f'processc_bench_intel_{rows}.csv')
+    if not os.path.exists(file_path):
+        write_intel_power_log(file_path, rows)
+    legacy_sec, _ = _timed(legacy_parse_intel_power_log, file_path)
+    footer_sec, footer = _timed(read_intel_power_log_footer, file_path)
+    load_sec, df = _timed(load_intel_power_log, file_path)
+    integrate_sec, energy_j = _timed(integrate_intel_power_log, df)
+    interval_sec, _ = _timed(intel_interval_power, df)
+    return {
+        'rows': rows,
+        'file_bytes': os.path.getsize(file_path),
+        'legacy_scan_sec': legacy_sec,
+        'footer_seek_sec': footer_sec,
+        'footer_speedup': legacy_sec / footer_sec if footer_sec else None,
+        'columnar_load_sec': load_sec,
+        'load_rows_per_sec': rows / load_sec if load_sec else None,
+        'integrate_sec': integrate_sec,
+        'interval_power_sec': interval_sec,
+        'integrated_energy_j': energy_j,
+        'footer_energy_j': footer.get('Cumulative Processor Energy_0 (Joules)'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Intel Power Gadget log parsers.')
+    parser.add_argument('--rows', type=int, default=10_000_000)
+    parser.add_argument('--file', default=None, help='reuse or create the synthetic log at this path')
+    args = parser.parse_args()
+    print(json.dumps(run(args.rows, args.file), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import io
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from output_pipeline import Passthrough, pump  # noqa: E402
+
+START_MARKER = ' ====>  INITIAL VALUES READ IN'
+END_MARKER = 'NORMAL TERMINATION'
+
+
+def model_output(lines):
+    """
+    Returns RZWQM2-like output of the given number of lines, with the start and end markers.
+    """
+    body = ''.join(f' DAY {day:6d}  SOIL WATER  {day * 0.37 % 1:.5f}  NO3-N  {day * 1.3 % 50:9.4f}\n'
+                   for day in range(lines))
+    return f'{START_MARKER}\n{body}{END_MARKER}\n'.encode()
+
+
+def legacy_loop(data, func_map, sink):
+    """The former text-mode readline loop of bash_mode, printing every line."""
+    stream = io.TextIOWrapper(io.BytesIO(data))
+    for line in iter(stream.readline, ''):
+        print(line, end='', file=sink)
+        for key, func_list in func_map.items():
+            if key in line:
+                for func in func_list:
+                    func()
+
+
+def measure(function, lines, repeats):
+    best = min(_timed(function) for _ in range(repeats))
+    return {'seconds': best, 'lines_per_sec': lines / best}
+
+
+def _timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def run(lines=200000, repeats=3):
+    """
+    Compares the per-line loop with the chunked scanner, echoing to os.devnull.
+    """
+    data = model_output(lines)
+    hits = []
+    func_map = {START_MARKER: [lambda: hits.append('start')], END_MARKER: [lambda: hits.append('end')]}
+    results = {'lines': lines}
+    with open(os.devnull, 'w') as text_sink, open(os.devnull, 'wb') as binary_sink:
+        results['legacy_readline'] = measure(lambda: legacy_loop(data, func_map, text_sink), lines, repeats)
+        for mode in ('full', 'throttled'):
+            passthrough = Passthrough(mode, console=binary_sink)
+            results[f'chunked_{mode}'] = measure(
+                lambda: pump(io.BufferedReader(io.BytesIO(data)), passthrough, func_map), lines, repeats)
+        tee = Passthrough('tee', os.devnull)
+        results['chunked_tee'] = measure(lambda: pump(io.BufferedReader(io.BytesIO(data)), tee, func_map),
+                                         lines, repeats)
+        tee.close()
+    results['markers_per_run'] = len(hits) // (4 * repeats)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the bash mode output pipeline throughput.')
+    parser.add_argument('--lines', type=int, default=200000)
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    print(json.dumps(run(args.lines, args.repeats), indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from process_watcher import ProcScanWatcher, create_process_watcher  # noqa: E402
+
+
+def legacy_tick(process_name):
+    """One iteration of the psutil loop direct mode used before the watchers."""
+    import psutil
+    for process in psutil.process_iter(['name']):
+        try:
+            if process.info['name'] == process_name:
+                return process.pid
+        except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+            continue
+    return None
+
+
+def tick_cost(ticks=200):
+    """
+    Measures the CPU time one detection tick costs when the process is not running.
+
+    Returns:
+        dict: Milliseconds of CPU time per tick for the legacy loop and the /proc scan.
+    """
+    missing = 'processc_missing_process'
+    results = {}
+    start = time.process_time()
+    for _ in range(ticks):
+        legacy_tick(missing)
+    results['legacy_psutil_ms_per_tick'] = (time.process_time() - start) * 1000 / ticks
+    watcher = ProcScanWatcher()
+    start = time.process_time()
+    for _ in range(ticks):
+        watcher._scan(missing)
+    results['proc_scan_ms_per_tick'] = (time.process_time() - start) * 1000 / ticks
+    results['process_count'] = sum(1 for entry in os.listdir('/proc') if entry.isdigit())
+    return results
+
+
+def detection_latency(lifetime=0.05, interval=0.1):
+    """
+    Starts a short-lived process and measures how late the default watcher reports it.
+
+    Returns:
+        dict: The watcher used, its start detection latency and the lifetime it measured, in milliseconds.
+    """
+    watcher = create_process_watcher(interval)
+    process_name = 'sleep'
+    try:
+        launched = time.time()
+        child = subprocess.Popen(['sleep', str(lifetime)])
+        started = watcher.wait_for_start(process_name, timeout=5)
+        exited = watcher.wait_for_exit(child.pid, timeout=5)
+        child.wait()
+    finally:
+        watcher.close()
+    return {
+        'watcher': type(watcher).__name__,
+        'start_latency_ms': None if started is None else (started.timestamp - launched) * 1000,
+        'measured_lifetime_ms': None if None in (started, exited) else (exited.timestamp - started.timestamp) * 1000,
+        'actual_lifetime_ms': lifetime * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare process watcher overhead with the psutil loop.')
+    parser.add_argument('--ticks', type=int, default=200)
+    args = parser.parse_args()
+    results = tick_cost(args.ticks)
+    results.update(detection_latency())
+    print(json.dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
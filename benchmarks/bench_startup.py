@@ -0,0 +1,69 @@
+import os
+import sys
+import json
+import tempfile
+import argparse
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_SNIPPET = """
+import time
+start = time.perf_counter()
+import main
+print(time.perf_counter() - start)
+"""
+
+SPECS_SNIPPET = """
+import time
+import main
+start = time.perf_counter()
+main.get_system_specs()
+print(time.perf_counter() - start)
+"""
+
+
+def time_snippet(snippet, cwd):
+    """
+    Runs a snippet in a fresh interpreter and returns the seconds it prints.
+    """
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    output = subprocess.run([sys.executable, '-c', snippet], cwd=cwd, env=env, check=True,
+                            capture_output=True, text=True).stdout
+    return float(output.strip().splitlines()[-1])
+
+
+def run(repeats=5):
+    """
+    Measures the import time of main.py and the system spec detection with and without the cache.
+
+    The first import of a repeat series is the cold one, with the bytecode and OS file caches in
+    whatever state the previous command left them; the others are warm.
+    """
+    with tempfile.TemporaryDirectory() as cwd:
+        imports = [time_snippet(IMPORT_SNIPPET, cwd) for _ in range(repeats)]
+        cold_specs = []
+        for _ in range(repeats):
+            cache_path = os.path.join(cwd, 'hardware_cache.json')
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            cold_specs.append(time_snippet(SPECS_SNIPPET, cwd))
+        warm_specs = [time_snippet(SPECS_SNIPPET, cwd) for _ in range(repeats)]
+    return {
+        'import_main_cold_ms': imports[0] * 1000,
+        'import_main_warm_ms': statistics.median(imports[1:] or imports) * 1000,
+        'system_specs_detect_ms': statistics.median(cold_specs) * 1000,
+        'system_specs_cached_ms': statistics.median(warm_specs) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure the startup cost of ProcessC.')
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+    print(json.dumps(run(args.repeats), indent=4))
+
+
+if __name__ == "__main__":
+    main()
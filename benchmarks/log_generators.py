@@ -0,0 +1,83 @@
+import random
+
+INTEL_DOMAINS = ('Processor', 'IA', 'DRAM')
+
+
+def write_intel_power_log(file_path, rows, resolution_ms=100, packages=1, seed=0):
+    """
+    Writes a synthetic Intel Power Gadget log with the PowerLog column layout and footer.
+
+    Args:
+        file_path (str): The path of the log to write.
+        rows (int): The number of sample rows.
+        resolution_ms (int): The sampling interval in milliseconds.
+        packages (int): The number of CPU packages, each getting its own _<n> columns.
+        seed (int): The random seed, so repeated runs write identical files.
+    """
+    rng = random.Random(seed)
+    columns = ['System Time', 'RDTSC', 'Elapsed Time (sec)', ' CPU Utilization(%)', 'CPU Frequency_0(MHz)']
+    for package in range(packages):
+        for domain in INTEL_DOMAINS:
+            columns += [f'{domain} Power_{package}(Watt)', f'Cumulative {domain} Energy_{package}(Joules)',
+                        f'Cumulative {domain} Energy_{package}(mWh)']
+    energy = [[0.0] * len(INTEL_DOMAINS) for _ in range(packages)]
+    dt = resolution_ms / 1000
+    start_ms = 18 * 3600 * 1000
+    with open(file_path, 'w', newline='') as file:
+        file.write(','.join(columns) + '\n')
+        chunk = []
+        for row in range(rows):
+            elapsed = (row + 1) * dt
+            ms = (start_ms + (row + 1) * resolution_ms) % (24 * 3600 * 1000)
+            values = [f'{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}:{ms % 1000:03d}',
+                      f' {2757838693488233 + row * 290000000}', f'{elapsed:9.3f}',
+                      f'{rng.uniform(5, 95):9.3f}', f'{rng.randrange(2400, 4300, 100):5d}']
+            for package in range(packages):
+                for index, base in enumerate((35.0, 27.0, 3.0)):
+                    power = base + rng.uniform(-5, 10)
+                    energy[package][index] += power * dt
+                    values += [f'{power:8.3f}', f'{energy[package][index]:8.3f}',
+                               f'{energy[package][index] / 3.6:8.3f}']
+            chunk.append(','.join(values))
+            if len(chunk) == 100000:
+                file.write('\n'.join(chunk) + '\n')
+                chunk = []
+        if chunk:
+            file.write('\n'.join(chunk) + '\n')
+        elapsed = rows * dt
+        file.write(f'\nTotal Elapsed Time (sec) = {elapsed:.6f}\nMeasured RDTSC Frequency (GHz) = 2.918\n\n')
+        for package in range(packages):
+            for index, domain in enumerate(INTEL_DOMAINS):
+                joules = energy[package][index]
+                file.write(f'Cumulative {domain} Energy_{package} (Joules) = {joules:.6f}\n'
+                           f'Cumulative {domain} Energy_{package} (mWh) = {joules / 3.6:.6f}\n'
+                           f'Average {domain} Power_{package} (Watt) = {joules / elapsed if elapsed else 0:.6f}\n\n')
+
+
+def write_gpu_power_log(file_path, rows, gpus=2, mean_interval=1.0, seed=0):
+    """
+    Writes a synthetic gpu_power_log.csv with unevenly spaced samples for several GPUs.
+
+    Args:
+        file_path (str): The path of the log to write.
+        rows (int): The total number of rows over all GPUs.
+        gpus (int): The number of GPU indices to interleave.
+        mean_interval (float): The mean spacing between query rounds in seconds.
+        seed (int): The random seed, so repeated runs write identical files.
+    """
+    import datetime
+    rng = random.Random(seed)
+    timestamp = datetime.datetime(2024, 5, 26, 18, 51, 23)
+    with open(file_path, 'w', newline='') as file:
+        file.write('timestamp,gpu,power.draw,power.limit\n')
+        chunk = []
+        for row in range(rows):
+            gpu = row % gpus
+            if gpu == 0:
+                timestamp += datetime.timedelta(seconds=rng.uniform(0.2, 2 * mean_interval - 0.2))
+            chunk.append(f'{timestamp},{gpu},{rng.uniform(15, 30 + 100 * gpu):.0f},')
+            if len(chunk) == 100000:
+                file.write('\n'.join(chunk) + '\n')
+                chunk = []
+        if chunk:
+            file.write('\n'.join(chunk) + '\n')
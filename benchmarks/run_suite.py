@@ -0,0 +1,363 @@
+import os
+import sys
+import json
+import time
+import stat
+import argparse
+import platform
+import tempfile
+import statistics
+import subprocess
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.log_generators import write_intel_power_log, write_gpu_power_log  # noqa: E402
+from benchmarks.workloads import START_MARKER, END_MARKER, PHASE_MARKER  # noqa: E402
+
+WORKLOADS_PATH = os.path.join(REPO_ROOT, 'benchmarks', 'workloads.py')
+# metrics where a larger value is better; every other numeric metric is better when smaller
+HIGHER_IS_BETTER = ('rows_per_sec', 'lines_per_sec', 'achieved_rate_hz', 'markers_detected', 'inserts_per_sec')
+
+
+def workload_command(directory, kind, *args):
+    """
+    Writes an executable wrapper for a workload, since bash mode runs a file in the model directory.
+
+    Returns:
+        str: The file name of the wrapper inside directory.
+    """
+    name = f'model_{kind}.sh'
+    path = os.path.join(directory, name)
+    arguments = ' '.join(f"'{arg}'" for arg in (WORKLOADS_PATH, kind) + args)
+    with open(path, 'w') as file:
+        file.write(f'#!/bin/sh\nexec "{sys.executable}" {arguments}\n')
+    os.chmod(path, os.stat(path).st_mode | stat.S_IXUSR)
+    return name
+
+
+def _timed_run(command, cwd):
+    start = time.perf_counter()
+    subprocess.run(command, cwd=cwd, check=True, stdout=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def monitor_overhead(workloads=('cpu', 'memory', 'bursty'), seconds=3.0):
+    """
+    Runs each workload bare and under bash mode, and reads back the monitor's own CPU time.
+
+    Returns:
+        dict: Per workload, the bare and monitored wall seconds and the monitor CPU seconds per
+        second of run time.
+    """
+    from bash_mode import start_simulation_and_monitor
+    from self_overhead import OVERHEAD_FILE, load_overhead
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for kind in workloads:
+            model = workload_command(directory, kind, '--seconds', str(seconds))
+            bare_sec = _timed_run([os.path.join(directory, model)], directory)
+            output_dir = os.path.join(directory, kind)
+            os.makedirs(output_dir)
+            start = time.perf_counter()
+            start_simulation_and_monitor(directory, 2, START_MARKER, END_MARKER, model, output_dir=output_dir,
+                                         include_gpu=False)
+            monitored_sec = time.perf_counter() - start
+            overhead = load_overhead(os.path.join(output_dir, OVERHEAD_FILE)) or {}
+            monitor_cpu_sec = overhead.get('monitor_cpu_time_sec')
+            results[kind] = {
+                'bare_sec': bare_sec,
+                'monitored_sec': monitored_sec,
+                'slowdown_pct': (monitored_sec / bare_sec - 1) * 100,
+                'monitor_cpu_sec': monitor_cpu_sec,
+                'monitor_cpu_ms_per_sec': monitor_cpu_sec / monitored_sec * 1000 if monitor_cpu_sec else None,
+                'monitor_overhead_share': overhead.get('overhead_share'),
+            }
+    return results
+
+
+class _NullSensor:
+    name = 'null'
+    fields = ()
+    period = 1
+
+    def open(self, engine):
+        pass
+
+    def read(self, timestamp, elapsed):
+        return None
+
+    def close(self, timestamp, elapsed):
+        pass
+
+
+def sampling_jitter(interval=0.01, seconds=3.0, load=True):
+    """
+    Measures how closely the sampling engine keeps its tick deadlines, optionally next to a
+    CPU-bound workload on every core.
+
+    Returns:
+        dict: The scheduler statistics of the engine.
+    """
+    from sampling_engine import SamplingEngine
+
+    load_processes = []
+    if load:
+        load_processes = [subprocess.Popen([sys.executable, WORKLOADS_PATH, 'cpu', '--seconds', str(seconds + 1)])
+                          for _ in range(os.cpu_count() or 1)]
+    engine = SamplingEngine([_NullSensor()], interval=interval)
+    engine.start()
+    time.sleep(seconds)
+    stats = engine.stop()
+    for process in load_processes:
+        process.wait()
+    stats.pop('sensor_read_sec', None)
+    stats.pop('sensor_failures', None)
+    return stats
+
+
+def marker_latency(lines=500000, markers=20, chunk_size=None):
+    """
+    Measures the delay between the flood workload flushing a marker and the pump calling back.
+
+    Returns:
+        dict: Latency percentiles in milliseconds and the output throughput.
+    """
+    from output_pipeline import Passthrough, pump, CHUNK_SIZE
+
+    received = []
+    record = received.append
+    callbacks = {marker: [lambda: record(time.time())] for marker in (START_MARKER, PHASE_MARKER, END_MARKER)}
+    with tempfile.TemporaryDirectory() as directory:
+        emit_log = os.path.join(directory, 'emitted.json')
+        start = time.perf_counter()
+        process = subprocess.Popen([sys.executable, WORKLOADS_PATH, 'flood', '--lines', str(lines),
+                                    '--markers', str(markers), '--emit-log', emit_log], stdout=subprocess.PIPE)
+        passthrough = Passthrough('tee', os.devnull)
+        pump(process.stdout, passthrough, callbacks, chunk_size or CHUNK_SIZE)
+        passthrough.close()
+        process.wait()
+        wall_sec = time.perf_counter() - start
+        with open(emit_log, 'r') as file:
+            emitted = json.load(file)
+    latencies = sorted((got - sent) * 1000 for sent, got in zip(emitted, received))
+    return {
+        'markers_emitted': len(emitted),
+        'markers_detected': len(received),
+        'latency_ms_p50': statistics.median(latencies) if latencies else None,
+        'latency_ms_p95': latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+        'latency_ms_max': latencies[-1] if latencies else None,
+        'lines_per_sec': lines / wall_sec,
+    }
+
+
+def parse_throughput(intel_rows=2_000_000, gpu_rows=1_000_000, repeats=3):
+    """
+    Times parse_intel_power_log and parse_gpu_power_csv of main.py on generated logs, in both the
+    CSV and the binary sample log format.
+
+    Returns:
+        dict: The best of `repeats` wall seconds and rows per second of each parser and format.
+    """
+    from main import parse_intel_power_log, parse_gpu_power_csv
+    from sample_log import convert
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        intel_path = os.path.join(directory, 'intel_power_gadget_log.csv')
+        gpu_path = os.path.join(directory, 'gpu_power_log.csv')
+        write_intel_power_log(intel_path, intel_rows)
+        write_gpu_power_log(gpu_path, gpu_rows)
+        convert(intel_path, intel_path + '.bin')
+        convert(gpu_path, gpu_path + '.bin')
+        for name, parser, path, rows in (('parse_intel_power_log', parse_intel_power_log, intel_path, intel_rows),
+                                         ('parse_gpu_power_csv', parse_gpu_power_csv, gpu_path, gpu_rows),
+                                         ('parse_intel_power_log_binary', parse_intel_power_log, intel_path + '.bin',
+                                          intel_rows),
+                                         ('parse_gpu_power_csv_binary', parse_gpu_power_csv, gpu_path + '.bin',
+                                          gpu_rows)):
+            timings = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                parser(path)
+                timings.append(time.perf_counter() - start)
+            results[name] = {'rows': rows, 'file_bytes': os.path.getsize(path), 'seconds': min(timings),
+                             'rows_per_sec': rows / min(timings)}
+    return results
+
+
+def wrapper_latency(repeats=5):
+    """
+    Measures what bash mode adds to a model that exits at once, in both wrapping modes.
+
+    Returns:
+        dict: Median milliseconds of the bare run and of each wrapping mode, and the difference.
+    """
+    from bash_mode import start_simulation_and_monitor
+
+    with tempfile.TemporaryDirectory() as directory:
+        model = workload_command(directory, 'flood', '--lines', '0', '--markers', '0')
+        bare = [_timed_run([os.path.join(directory, model)], directory) for _ in range(repeats)]
+        results = {'bare_ms': statistics.median(bare) * 1000}
+        for mode in (1, 2):
+            timings = []
+            for repeat in range(repeats):
+                output_dir = os.path.join(directory, f'mode{mode}_{repeat}')
+                os.makedirs(output_dir)
+                start = time.perf_counter()
+                start_simulation_and_monitor(directory, mode, START_MARKER, END_MARKER, model, output_dir=output_dir,
+                                             include_gpu=False, passthrough='tee',
+                                             output_log_file=os.path.join(output_dir, 'model_output.log'))
+                timings.append(time.perf_counter() - start)
+            results[f'mode{mode}_ms'] = statistics.median(timings) * 1000
+            results[f'mode{mode}_added_ms'] = results[f'mode{mode}_ms'] - results['bare_ms']
+    return results
+
+
+def results_queries(runs=100_000, projects=50, repeats=5):
+    """
+    Fills a results database with synthetic runs and times its aggregate queries.
+
+    Returns:
+        dict: Runs inserted per second, and the best of `repeats` milliseconds of the monthly
+        aggregate and of the p95 energy over all runs and of one project.
+    """
+    import random
+    from results_store import ResultsStore
+
+    rng = random.Random(0)
+    host = ('benchmark', 'fingerprint', 'cpu')
+    start_time = time.time() - 2 * 365 * 86400
+    results = {'runs': runs}
+    with tempfile.TemporaryDirectory() as directory:
+        with ResultsStore(os.path.join(directory, 'results.sqlite'), batch_size=10000) as store:
+            start = time.perf_counter()
+            for index in range(runs):
+                cpu, gpu, ram = rng.lognormvariate(-6, 1), rng.lognormvariate(-7, 1), rng.lognormvariate(-9, 0.5)
+                total = cpu + gpu + ram
+                store.add_run(f'project{index % projects}', {
+                    'Elapsed Time (seconds)': rng.uniform(10, 3600), 'CPU Energy (kWh)': cpu,
+                    'GPU Energy (kWh)': gpu, 'RAM Power Usage (kWh)': ram, 'Total Energy Usage (kWh)': total,
+                    'Grid Carbon Intensity (g/CO2 Eq)': 30.0, 'Total Carbon Emission (g/CO2 Eq)': total * 30,
+                }, started_at=start_time + index * 600, host=host)
+            store.flush()
+            results['inserts_per_sec'] = runs / (time.perf_counter() - start)
+            for name, query in (('monthly_ms', lambda: store.energy_by_month()),
+                                ('p95_ms', lambda: store.energy_percentile(95)),
+                                ('project_p95_ms', lambda: store.energy_percentile(95, project='project7'))):
+                timings = []
+                for _ in range(repeats):
+                    start = time.perf_counter()
+                    query()
+                    timings.append(time.perf_counter() - start)
+                results[name] = min(timings) * 1000
+    return results
+
+
+def environment():
+    """Describes the commit and machine the results were measured on."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=REPO_ROOT, capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {'commit': commit, 'timestamp': time.time(), 'python': platform.python_version(),
+            'platform': platform.platform(), 'cpu_count': os.cpu_count(), 'machine': platform.machine()}
+
+
+SUITE = {
+    'monitor_overhead': monitor_overhead,
+    'sampling_jitter': sampling_jitter,
+    'marker_latency': marker_latency,
+    'parse_throughput': parse_throughput,
+    'wrapper_latency': wrapper_latency,
+    'results_queries': results_queries,
+}
+
+
+def run(benchmarks=None, quick=False):
+    """
+    Runs the selected benchmarks, all by default, and returns their results.
+
+    A benchmark that fails is recorded with its error, so one missing dependency does not lose the
+    other results. quick shrinks the workloads for a smoke test.
+    """
+    options = {
+        'monitor_overhead': {'seconds': 1.0} if quick else {},
+        'sampling_jitter': {'seconds': 1.0} if quick else {},
+        'marker_latency': {'lines': 50000} if quick else {},
+        'parse_throughput': {'intel_rows': 100000, 'gpu_rows': 50000, 'repeats': 1} if quick else {},
+        'wrapper_latency': {'repeats': 2} if quick else {},
+        'results_queries': {'runs': 10000, 'repeats': 2} if quick else {},
+    }
+    results = {'environment': environment(), 'benchmarks': {}}
+    for name in benchmarks or SUITE:
+        start = time.perf_counter()
+        try:
+            results['benchmarks'][name] = SUITE[name](**options[name])
+        except Exception as e:
+            results['benchmarks'][name] = {'error': f'{type(e).__name__}: {e}'}
+        print(f'{name} finished in {time.perf_counter() - start:.1f} s', file=sys.stderr)
+    return results
+
+
+def _flatten(results, prefix=''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+
+def compare(baseline, current, threshold=0.1):
+    """
+    Lists the metrics that got worse than the baseline by more than threshold.
+
+    Returns:
+        dict: Metric name to {baseline, current, change} for every regression.
+    """
+    old, new = _flatten(baseline['benchmarks']), _flatten(current['benchmarks'])
+    regressions = {}
+    for name in old.keys() & new.keys():
+        if not old[name] or name.endswith(('rows', 'file_bytes', 'ticks', 'markers_emitted', 'target_rate_hz')):
+            continue
+        change = (new[name] - old[name]) / abs(old[name])
+        if name.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > threshold:
+            regressions[name] = {'baseline': old[name], 'current': new[name], 'change': change}
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the ProcessC benchmark suite and write the results as JSON.')
+    parser.add_argument('benchmarks', nargs='*', help=f'any of {", ".join(SUITE)}; default: all')
+    parser.add_argument('--quick', action='store_true', help='small workloads for a smoke test')
+    parser.add_argument('--output', default=None, help='file receiving the JSON results')
+    parser.add_argument('--compare', default=None, help='results of an earlier commit to check for regressions')
+    parser.add_argument('--threshold', type=float, default=0.1, help='relative change counted as a regression')
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - SUITE.keys()
+    if unknown:
+        parser.error(f'unknown benchmarks: {", ".join(sorted(unknown))}')
+
+    results = run(args.benchmarks or None, args.quick)
+    if args.compare:
+        with open(args.compare, 'r') as file:
+            baseline = json.load(file)
+        results['regressions'] = compare(baseline, results, args.threshold)
+        results['baseline_commit'] = baseline.get('environment', {}).get('commit')
+    text = json.dumps(results, indent=4)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(text + '\n')
+    print(text)
+    if results.get('regressions'):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
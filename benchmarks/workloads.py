@@ -0,0 +1,93 @@
+import sys
+import json
+import time
+import argparse
+
+START_MARKER = ' ====>  INITIAL VALUES READ IN'
+END_MARKER = 'NORMAL TERMINATION'
+PHASE_MARKER = 'PHASE CHANGE'
+
+
+def cpu_bound(seconds):
+    """Keeps one core busy with floating point work."""
+    deadline = time.perf_counter() + seconds
+    value = 0.0
+    while time.perf_counter() < deadline:
+        for step in range(10000):
+            value += step * 1e-9
+    return value
+
+
+def memory_bound(seconds, megabytes=256):
+    """Streams over a buffer larger than the caches, so the time goes to memory traffic."""
+    buffer = bytearray(megabytes << 20)
+    deadline = time.perf_counter() + seconds
+    passes = 0
+    while time.perf_counter() < deadline:
+        # a strided slice copy touches every cache line of the buffer
+        buffer[::64] = buffer[32::64]
+        passes += 1
+    return passes
+
+
+def bursty(seconds, burst=0.2, pause=0.3):
+    """Alternates busy bursts with idle pauses, the pattern that exposes sampling aliasing."""
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        cpu_bound(min(burst, max(0.0, deadline - time.perf_counter())))
+        time.sleep(min(pause, max(0.0, deadline - time.perf_counter())))
+
+
+def stdout_flood(lines, markers=10, start_marker=START_MARKER, end_marker=END_MARKER, phase_marker=PHASE_MARKER,
+                 emit_log=None):
+    """
+    Prints RZWQM2-like output as fast as the pipe takes it, with markers spread through it.
+
+    The start marker comes first, `markers` phase markers are spread evenly over the lines and the
+    end marker comes last. With emit_log the epoch time right after each marker was flushed is
+    written there as JSON, for measuring how long the wrapper takes to react.
+    """
+    out = sys.stdout
+    emitted = []
+    every = max(1, lines // (markers + 1)) if markers else lines + 1
+
+    def emit(marker):
+        out.write(marker + '\n')
+        out.flush()
+        emitted.append(time.time())
+
+    emit(start_marker)
+    for day in range(lines):
+        out.write(f' DAY {day:6d}  SOIL WATER  {day * 0.37 % 1:.5f}  NO3-N  {day * 1.3 % 50:9.4f}\n')
+        if markers and day % every == every - 1 and len(emitted) <= markers:
+            emit(phase_marker)
+    emit(end_marker)
+    if emit_log:
+        with open(emit_log, 'w') as file:
+            json.dump(emitted, file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Synthetic stand-in models for the ProcessC benchmarks.')
+    parser.add_argument('kind', choices=('cpu', 'memory', 'bursty', 'flood'))
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--megabytes', type=int, default=256, help='buffer size of the memory workload')
+    parser.add_argument('--lines', type=int, default=200000, help='output lines of the flood workload')
+    parser.add_argument('--markers', type=int, default=10, help='phase markers of the flood workload')
+    parser.add_argument('--start-marker', default=START_MARKER)
+    parser.add_argument('--end-marker', default=END_MARKER)
+    parser.add_argument('--phase-marker', default=PHASE_MARKER)
+    parser.add_argument('--emit-log', default=None, help='JSON file receiving the marker emit times')
+    args = parser.parse_args()
+    if args.kind == 'cpu':
+        cpu_bound(args.seconds)
+    elif args.kind == 'memory':
+        memory_bound(args.seconds, args.megabytes)
+    elif args.kind == 'bursty':
+        bursty(args.seconds)
+    else:
+        stdout_flood(args.lines, args.markers, args.start_marker, args.end_marker, args.phase_marker, args.emit_log)
+
+
+if __name__ == "__main__":
+    main()
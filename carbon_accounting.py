@@ -0,0 +1,325 @@
+import os
+import csv
+import json
+import heapq
+import bisect
+import logging
+import datetime
+from array import array
+
+from sample_log import is_sample_log, open_sample_log, read_header
+from power_tiers import select_tier, iter_tier_energy
+
+logger = logging.getLogger(__name__)
+
+JOULES_PER_KWH = 3.6e6
+# power tiers up to this bucket width are fine enough for hourly or sub-hourly intensity data
+ACCOUNTING_RESOLUTION = 60.0
+
+
+def _epoch(text):
+    """Converts an ISO 8601 timestamp to epoch seconds; naive timestamps are local time."""
+    text = text.strip()
+    if text.endswith('Z'):
+        text = text[:-1] + '+00:00'
+    return datetime.datetime.fromisoformat(text).timestamp()
+
+
+def iter_intensity(source):
+    """
+    Streams an hourly or sub-hourly carbon intensity series in time order.
+
+    Args:
+        source: A CSV file with 'datetime' and 'carbonIntensity' columns, a JSON file holding a
+            list of such records (the Electricity Maps history format), or that list itself.
+
+    Yields:
+        tuple: (epoch seconds, intensity in gCO2/kWh) from which the intensity applies.
+    """
+    if isinstance(source, (list, tuple)):
+        records = source
+    elif source.lower().endswith('.json'):
+        with open(source, 'r') as file:
+            records = json.load(file)
+        if isinstance(records, dict):
+            records = records.get('history', records.get('data', []))
+    else:
+        with open(source, 'r', newline='') as file:
+            for row in csv.DictReader(file):
+                if row.get('carbonIntensity') not in (None, ''):
+                    yield _epoch(row['datetime']), float(row['carbonIntensity'])
+        return
+    for record in sorted(records, key=lambda item: item['datetime']):
+        if record.get('carbonIntensity') is not None:
+            yield _epoch(record['datetime']), float(record['carbonIntensity'])
+
+
+class IntensitySeries:
+    """
+    A carbon intensity series loaded once into time and value arrays, for repeated point lookups.
+
+    Args:
+        source: The intensity series, see iter_intensity.
+    """
+
+    def __init__(self, source):
+        points = sorted(iter_intensity(source), key=lambda point: point[0])
+        self.times = array('d', [point_time for point_time, _ in points])
+        self.values = array('d', [value for _, value in points])
+
+    def __len__(self):
+        return len(self.times)
+
+    def at(self, timestamp):
+        """
+        Returns the intensity in effect at an epoch time, as of the latest point at or before it.
+
+        Times before the first point use the first point; None for an empty series.
+        """
+        if not self.times:
+            return None
+        return self.values[max(0, bisect.bisect_right(self.times, timestamp) - 1)]
+
+
+def intensity_at(intensity, timestamp):
+    """
+    Returns the intensity in effect at an epoch time, see IntensitySeries.at.
+
+    A source that is not an IntensitySeries is read on every call, so callers looking up many
+    times, e.g. one per phase, load it into an IntensitySeries once.
+    """
+    if not isinstance(intensity, IntensitySeries):
+        intensity = IntensitySeries(intensity)
+    return intensity.at(timestamp)
+
+
+def iter_intel_energy(file_path, start_time, domain='Processor', scale=1.0):
+    """
+    Streams the energy of each sample interval of an Intel power log, without loading it.
+
+    Args:
+        file_path (str): The log written by PowerLog or RaplPowerLog, as CSV or binary sample log.
+        start_time (float): The epoch time of elapsed time zero, e.g. the attribution start_time.
+        domain (str): 'Processor', 'IA' or 'DRAM'.
+        scale (float): A factor applied to the energy, e.g. the process tree energy_share.
+
+    Yields:
+        tuple: (interval start, interval end, energy in Joules), times in epoch seconds.
+    """
+    if is_sample_log(file_path):
+        yield from _iter_sample_log_energy(file_path, start_time, domain, scale)
+        return
+    with open(file_path, 'r', newline='') as file:
+        reader = csv.reader(file)
+        header = [column.strip() for column in next(reader)]
+        elapsed_index = header.index('Elapsed Time (sec)')
+        energy_indices = [index for index, column in enumerate(header)
+                          if column.startswith(f'Cumulative {domain} Energy_') and column.endswith('(Joules)')]
+        # the counters start at zero with the log, so the first row closes an interval as well
+        previous = (0.0, 0.0)
+        for row in reader:
+            # the summary footer has a single field per line
+            if len(row) <= max(energy_indices + [elapsed_index]):
+                continue
+            try:
+                elapsed = float(row[elapsed_index])
+                energy = sum(float(row[index]) for index in energy_indices)
+            except ValueError:
+                continue
+            if elapsed > previous[0]:
+                yield start_time + previous[0], start_time + elapsed, (energy - previous[1]) * scale
+            previous = (elapsed, energy)
+
+
+def _iter_sample_log_energy(file_path, start_time, domain, scale, chunk_rows=65536):
+    header, data = open_sample_log(file_path)
+    energy_columns = [column for column in header['columns']
+                      if column.startswith(f'Cumulative {domain} Energy_') and column.endswith('(Joules)')]
+    previous = (0.0, 0.0)
+    # only one chunk of the memory map is turned into Python floats at a time
+    for chunk_start in range(0, len(data), chunk_rows):
+        chunk = data[chunk_start:chunk_start + chunk_rows]
+        energies = [sum(values) for values in zip(*(chunk[column].tolist() for column in energy_columns))]
+        for elapsed, energy in zip(chunk['Elapsed Time (sec)'].tolist(), energies):
+            if elapsed > previous[0]:
+                yield start_time + previous[0], start_time + elapsed, (energy - previous[1]) * scale
+            previous = (elapsed, energy)
+
+
+def _iter_gpu_samples(file_path, chunk_rows=65536):
+    if is_sample_log(file_path):
+        epoch = datetime.datetime(1970, 1, 1)
+        _, data = open_sample_log(file_path)
+        for chunk_start in range(0, len(data), chunk_rows):
+            chunk = data[chunk_start:chunk_start + chunk_rows]
+            for local_seconds, gpu, power in chunk[['timestamp', 'gpu', 'power.draw']].tolist():
+                yield (epoch + datetime.timedelta(seconds=local_seconds)).timestamp(), str(int(gpu)), power
+        return
+    with open(file_path, 'r', newline='') as file:
+        for row in csv.DictReader(file, skipinitialspace=True):
+            try:
+                yield _epoch(row['timestamp']), row.get('gpu') or '0', float(row['power.draw'])
+            except (KeyError, TypeError, ValueError):
+                continue
+
+
+def iter_gpu_energy(file_path='gpu_power_log.csv', scale=1.0):
+    """
+    Streams trapezoidal energy intervals of every GPU in a gpu_power_log.csv.
+
+    Yields:
+        tuple: (interval start, interval end, energy in Joules), times in epoch seconds.
+    """
+    last = {}
+    for timestamp, gpu, power in _iter_gpu_samples(file_path):
+        previous = last.get(gpu)
+        if previous is not None and timestamp > previous[0]:
+            yield previous[0], timestamp, (previous[1] + power) / 2 * (timestamp - previous[0]) * scale
+        last[gpu] = (timestamp, power)
+
+
+def iter_constant_power(start_time, end_time, power_w, step=60.0):
+    """
+    Streams a constant power draw, such as the RAM estimate, as energy intervals of `step` seconds.
+    """
+    t0 = start_time
+    while t0 < end_time:
+        t1 = min(end_time, t0 + step)
+        yield t0, t1, power_w * (t1 - t0)
+        t0 = t1
+
+
+def asof_emissions(intervals, intensity):
+    """
+    Joins time-ordered energy intervals with an intensity series, as of each interval's midpoint.
+
+    Both inputs are consumed as streams, so memory does not grow with the log length. Intervals
+    before the first intensity point use the first point.
+
+    Args:
+        intervals (iterable): (start, end, Joules) tuples ordered by start.
+        intensity (iterable): (epoch seconds, gCO2/kWh) tuples in time order.
+
+    Yields:
+        tuple: (period start, intensity in gCO2/kWh, energy in kWh, emission in gCO2) for each
+        intensity period that received energy.
+    """
+    points = iter(intensity)
+    current = next(points, None)
+    if current is None:
+        raise ValueError("The carbon intensity series is empty")
+    upcoming = next(points, None)
+    period_energy_j = 0.0
+    for start, end, joules in intervals:
+        midpoint = (start + end) / 2
+        while upcoming is not None and upcoming[0] <= midpoint:
+            if period_energy_j:
+                yield current[0], current[1], period_energy_j / JOULES_PER_KWH, \
+                    period_energy_j / JOULES_PER_KWH * current[1]
+                period_energy_j = 0.0
+            current, upcoming = upcoming, next(points, None)
+        period_energy_j += joules
+    if period_energy_j:
+        yield current[0], current[1], period_energy_j / JOULES_PER_KWH, period_energy_j / JOULES_PER_KWH * current[1]
+
+
+def account_emissions(energy_streams, intensity, output_path=None):
+    """
+    Computes the time-resolved emissions of several energy streams, e.g. CPU, GPU and RAM.
+
+    Args:
+        energy_streams (list): Iterables of (start, end, Joules) tuples, each ordered by start.
+        intensity: The intensity series, see iter_intensity.
+        output_path (str): Optional CSV receiving one row per intensity period.
+
+    Returns:
+        dict: energy_kwh and emission_g in total, and average_intensity in gCO2/kWh.
+    """
+    merged = heapq.merge(*energy_streams, key=lambda interval: interval[0])
+    total_energy_kwh = total_emission_g = 0.0
+    file = open(output_path, 'w', newline='') if output_path else None
+    try:
+        writer = csv.writer(file) if file else None
+        if writer:
+            writer.writerow(['period_start', 'carbon_intensity_g_per_kwh', 'energy_kwh', 'emission_g'])
+        for period_start, period_intensity, energy_kwh, emission_g in asof_emissions(merged, iter_intensity(intensity)):
+            total_energy_kwh += energy_kwh
+            total_emission_g += emission_g
+            if writer:
+                writer.writerow([datetime.datetime.fromtimestamp(period_start, datetime.timezone.utc).isoformat(),
+                                 period_intensity, energy_kwh, emission_g])
+    finally:
+        if file:
+            file.close()
+    return {
+        'energy_kwh': total_energy_kwh,
+        'emission_g': total_emission_g,
+        'average_intensity': total_emission_g / total_energy_kwh if total_energy_kwh else None,
+    }
+
+
+def intel_log_start_time(file_path, attribution=None):
+    """
+    Returns the epoch time at which an Intel power log started.
+
+    The log only records the time of day, so the attribution start_time is used when available,
+    then the start_time in the header of a binary sample log or, when the log was not kept, of its
+    power tiers, otherwise the file's modification time minus its last elapsed time.
+    """
+    if attribution is not None and attribution.get('start_time'):
+        return attribution['start_time']
+    if is_sample_log(file_path) and read_header(file_path)[0].get('start_time'):
+        return read_header(file_path)[0]['start_time']
+    if not os.path.exists(file_path) and select_tier(file_path) is not None:
+        return read_header(select_tier(file_path)[1])[0]['start_time']
+    from log_parsers import read_intel_power_log_footer
+    footer = read_intel_power_log_footer(file_path)
+    return os.path.getmtime(file_path) - footer.get('Total Elapsed Time (sec)', 0.0)
+
+
+def account_run(intensity, elapsed_sec, output_dir='.', cpu_energy_kwh=None, cpu_scale=1.0, ram_energy_kwh=0.0,
+                attribution=None, output_path=None):
+    """
+    Computes the time-resolved emissions of one monitored run from the logs in output_dir.
+
+    When the run compacted its power logs into tiers, the coarsest tier no wider than
+    ACCOUNTING_RESOLUTION is streamed instead of the raw samples.
+
+    Args:
+        intensity: The intensity series, see iter_intensity.
+        elapsed_sec (float): The run duration.
+        output_dir (str): The directory holding intel_power_gadget_log.csv and gpu_power_log.csv.
+        cpu_energy_kwh (float): The CPU energy when it was estimated from the TDP; None to stream
+            the Intel power log instead.
+        cpu_scale (float): The share of the logged CPU energy charged to the run.
+        ram_energy_kwh (float): The RAM energy estimate, spread evenly over the run.
+        attribution (dict): The attribution summary, for the start time of the run.
+        output_path (str): Optional CSV receiving one row per intensity period.
+
+    Returns:
+        dict: See account_emissions.
+    """
+    intel_log_path = os.path.join(output_dir, 'intel_power_gadget_log.csv')
+    gpu_log_path = os.path.join(output_dir, 'gpu_power_log.csv')
+    if cpu_energy_kwh is None:
+        start_time = intel_log_start_time(intel_log_path, attribution)
+    elif attribution is not None and attribution.get('start_time'):
+        start_time = attribution['start_time']
+    else:
+        start_time = datetime.datetime.now().timestamp() - elapsed_sec
+    end_time = start_time + elapsed_sec
+
+    streams = []
+    if cpu_energy_kwh is None and select_tier(intel_log_path, ACCOUNTING_RESOLUTION) is not None:
+        streams.append(iter_tier_energy(intel_log_path, ACCOUNTING_RESOLUTION, scale=cpu_scale))
+    elif cpu_energy_kwh is None:
+        streams.append(iter_intel_energy(intel_log_path, start_time, scale=cpu_scale))
+    elif elapsed_sec:
+        streams.append(iter_constant_power(start_time, end_time, cpu_energy_kwh * JOULES_PER_KWH / elapsed_sec))
+    if select_tier(gpu_log_path, ACCOUNTING_RESOLUTION) is not None:
+        streams.append(iter_tier_energy(gpu_log_path, ACCOUNTING_RESOLUTION))
+    elif os.path.isfile(gpu_log_path):
+        streams.append(iter_gpu_energy(gpu_log_path))
+    if ram_energy_kwh and elapsed_sec:
+        streams.append(iter_constant_power(start_time, end_time, ram_energy_kwh * JOULES_PER_KWH / elapsed_sec))
+    return account_emissions(streams, intensity, output_path)
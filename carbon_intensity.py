@@ -0,0 +1,121 @@
+import os
+import csv
+import bisect
+import logging
+from array import array
+
+from sidecar_cache import load_or_build
+
+logger = logging.getLogger(__name__)
+
+OWID_CSV_PATH = os.path.join('database', 'carbon-intensity-electricity.csv')
+INTENSITY_COLUMN = 'Carbon intensity of electricity - gCO2/kWh'
+INDEX_VERSION = 1
+
+
+def _build_index(csv_path):
+    series = {}
+    codes = {}
+    with open(csv_path, 'r', newline='', encoding='utf-8-sig') as file:
+        for row in csv.DictReader(file):
+            try:
+                year, value = int(row['Year']), float(row[INTENSITY_COLUMN])
+            except (KeyError, ValueError):
+                continue
+            entity = row['Entity']
+            series.setdefault(entity, []).append((year, value))
+            if row.get('Code'):
+                codes[row['Code'].upper()] = entity
+    for entity, points in series.items():
+        points.sort()
+        series[entity] = (array('H', [year for year, _ in points]), array('d', [value for _, value in points]))
+    return {'series': series, 'codes': codes}
+
+
+class CarbonIntensityIndex:
+    """
+    (entity, year) lookup of the OurWorldData grid carbon intensity in gCO2/kWh.
+
+    The CSV is parsed once into per-entity year and value arrays, cached in a binary sidecar next to
+    it that is rebuilt only when the CSV changes; loading happens on the first lookup and builds an
+    (entity, year) dict for exact matches. Entities can be given by name
+    ("Canada") or ISO code ("CAN"). Years missing from the table are interpolated linearly between
+    the surrounding years, or take the nearest year outside the covered range.
+    """
+
+    def __init__(self, csv_path=OWID_CSV_PATH):
+        self.csv_path = csv_path
+        self._index = None
+
+    def _load(self):
+        if self._index is None:
+            index = load_or_build(self.csv_path, _build_index, version=INDEX_VERSION)
+            index['values'] = {(entity, year): value for entity, (years, values) in index['series'].items()
+                               for year, value in zip(years, values)}
+            self._index = index
+        return self._index
+
+    def entities(self):
+        """Returns the entity names of the table."""
+        return list(self._load()['series'])
+
+    def _entity(self, entity):
+        index = self._load()
+        if entity in index['series']:
+            return entity
+        return index['codes'].get(str(entity).upper())
+
+    def lookup(self, entity, year, fallback='interpolate'):
+        """
+        Returns the carbon intensity of an entity in a year.
+
+        Args:
+            entity (str): The country or region name, or its ISO code.
+            year (int): The year.
+            fallback (str): What to do for a year missing from the table: 'interpolate' between
+                the surrounding years, take the 'nearest' year, or None to require an exact match.
+
+        Returns:
+            float: The intensity in gCO2/kWh, or None if the entity is unknown or no fallback applies.
+        """
+        name = self._entity(entity)
+        if name is None:
+            return None
+        index, year = self._load(), int(year)
+        value = index['values'].get((name, year))
+        if value is not None or fallback is None:
+            return value
+
+        years, values = index['series'][name]
+        position = bisect.bisect_left(years, year)
+        if position == 0:
+            return values[0]
+        if position == len(years):
+            return values[-1]
+        before, after = years[position - 1], years[position]
+        if fallback == 'nearest':
+            return values[position - 1] if year - before <= after - year else values[position]
+        weight = (year - before) / (after - before)
+        return values[position - 1] + weight * (values[position] - values[position - 1])
+
+    def lookup_many(self, pairs, fallback='interpolate'):
+        """
+        Resolves many (entity, year) pairs in one call, e.g. for a batch report.
+
+        Returns:
+            list: The intensities in the order of the pairs, None where a pair cannot be resolved.
+        """
+        return [self.lookup(entity, year, fallback) for entity, year in pairs]
+
+
+_default_index = None
+
+
+def carbon_intensity_index():
+    """
+    Returns the shared index of database/carbon-intensity-electricity.csv.
+    """
+    global _default_index
+    if _default_index is None:
+        _default_index = CarbonIntensityIndex()
+    return _default_index
@@ -0,0 +1,401 @@
+import os
+import re
+import json
+import math
+import time
+import logging
+import argparse
+import itertools
+
+from sampling_engine import Sensor, SamplingEngine
+from sample_log import SampleLogWriter, ENERGY_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+CALIBRATION_FILE = 'cpu_power_calibration.json'
+POWER_MODEL_FILE = 'cpu_power_model.json'
+POWER_MODEL_LOG = 'cpu_power_model_log.bin'
+PROC_STAT_PATH = '/proc/stat'
+CPU_ROOT = '/sys/devices/system/cpu'
+FREQUENCY_EXPONENTS = (0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0)
+
+
+class CpuPowerModel:
+    """
+    Estimates the package power from CPU utilisation and clock frequency, scaled to the TDP.
+
+    power = tdp_w * (idle_fraction + dynamic_fraction * utilization * frequency_ratio ** frequency_exponent)
+
+    utilization is the busy share of all cores (0 to 1) and frequency_ratio the busy-weighted
+    clock over the maximum clock, so a single-threaded model on a mostly idle package is charged
+    close to the idle power rather than the full TDP. The defaults reach the TDP at full load and
+    full clock; calibrate() fits the parameters against RAPL readings.
+    """
+
+    def __init__(self, tdp_w, idle_fraction=0.2, dynamic_fraction=None, frequency_exponent=1.0):
+        self.tdp_w = float(tdp_w)
+        self.idle_fraction = idle_fraction
+        self.dynamic_fraction = 1.0 - idle_fraction if dynamic_fraction is None else dynamic_fraction
+        self.frequency_exponent = frequency_exponent
+
+    def power(self, utilization, frequency_ratio=1.0):
+        """Returns the modelled package power in Watts."""
+        return self.tdp_w * (self.idle_fraction + self.dynamic_fraction * utilization *
+                             frequency_ratio ** self.frequency_exponent)
+
+    def parameters(self):
+        return {'tdp_w': self.tdp_w, 'idle_fraction': self.idle_fraction,
+                'dynamic_fraction': self.dynamic_fraction, 'frequency_exponent': self.frequency_exponent}
+
+    def calibrate(self, utilization, frequency_ratio, measured_power_w):
+        """
+        Fits the parameters by least squares to power measured on the same samples, e.g. RAPL.
+
+        idle_fraction and dynamic_fraction are solved in closed form for each candidate frequency
+        exponent, and the exponent with the smallest error is kept.
+
+        Args:
+            utilization (sequence): Busy share of all cores per sample.
+            frequency_ratio (sequence): Busy-weighted clock over the maximum clock per sample.
+            measured_power_w (sequence): The measured package power per sample.
+
+        Returns:
+            float: The root mean square error of the fit in Watts.
+        """
+        samples = [(u, r, p / self.tdp_w) for u, r, p in zip(utilization, frequency_ratio, measured_power_w)
+                   if not math.isnan(p)]
+        if len(samples) < 2:
+            raise ValueError("At least two measured samples are needed for calibration")
+        best = None
+        for exponent in FREQUENCY_EXPONENTS:
+            xs = [u * r ** exponent for u, r, _ in samples]
+            ys = [y for _, _, y in samples]
+            n = len(xs)
+            mean_x, mean_y = sum(xs) / n, sum(ys) / n
+            variance = sum((x - mean_x) ** 2 for x in xs)
+            slope = sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / variance if variance else 0.0
+            slope = max(slope, 0.0)
+            intercept = max(mean_y - slope * mean_x, 0.0)
+            error = sum((intercept + slope * x - y) ** 2 for x, y in zip(xs, ys)) / n
+            if best is None or error < best[0]:
+                best = (error, intercept, slope, exponent)
+        error, self.idle_fraction, self.dynamic_fraction, self.frequency_exponent = best
+        return math.sqrt(error) * self.tdp_w
+
+
+def _calibration_key(cpu_model):
+    from cpu_spec_index import normalize_cpu_name
+    family, number, suffix = normalize_cpu_name(cpu_model)
+    return ' '.join(part for part in (family, number, suffix) if part) if number else cpu_model.strip().lower()
+
+
+def load_power_model(cpu_model, tdp_w, calibration_path=CALIBRATION_FILE):
+    """
+    Returns the power model of a CPU, with its calibrated parameters when there are any.
+
+    Args:
+        cpu_model (str): The CPU model string, e.g. the cpu_info of the project.
+        tdp_w (float): The TDP of the CPU in Watts.
+        calibration_path (str): The calibration file written by save_calibration.
+
+    Returns:
+        CpuPowerModel: The model.
+    """
+    model = CpuPowerModel(tdp_w)
+    if isinstance(cpu_model, str) and cpu_model and os.path.isfile(calibration_path):
+        with open(calibration_path, 'r') as file:
+            entry = json.load(file).get(_calibration_key(cpu_model))
+        if entry is not None:
+            # calibrated fractions are relative to the TDP they were fitted with
+            scale = entry['tdp_w'] / model.tdp_w
+            model.idle_fraction = entry['idle_fraction'] * scale
+            model.dynamic_fraction = entry['dynamic_fraction'] * scale
+            model.frequency_exponent = entry['frequency_exponent']
+            logger.info(f"Using the calibrated CPU power model of {cpu_model}")
+    return model
+
+
+def save_calibration(cpu_model, model, rmse_w, samples, calibration_path=CALIBRATION_FILE):
+    """
+    Stores the parameters of a calibrated model under the normalized CPU model name.
+    """
+    calibrations = {}
+    if os.path.isfile(calibration_path):
+        with open(calibration_path, 'r') as file:
+            calibrations = json.load(file)
+    calibrations[_calibration_key(cpu_model)] = dict(model.parameters(), cpu_model=cpu_model, rmse_w=rmse_w,
+                                                     samples=samples, calibrated_at=time.time())
+    temporary_path = f'{calibration_path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w') as file:
+        json.dump(calibrations, file, indent=4)
+    os.replace(temporary_path, calibration_path)
+
+
+class _ProcCoreReader:
+    """
+    Per-core busy time from /proc/stat and clocks from cpufreq, through raw preads of open files.
+    """
+
+    def __init__(self, proc_stat_path=PROC_STAT_PATH, cpu_root=CPU_ROOT):
+        self._stat_fd = os.open(proc_stat_path, os.O_RDONLY)
+        # the per-core lines come first; the interrupt counters after them can be very long, so
+        # only a first guess at the bytes that hold the per-core lines is read, see _cpu_lines
+        self._stat_size = 128 * ((os.cpu_count() or 1) + 1)
+        self._freq = {}
+        if os.path.isdir(cpu_root):
+            for entry in os.listdir(cpu_root):
+                if not re.match(r'^cpu\d+$', entry):
+                    continue
+                cpufreq = os.path.join(cpu_root, entry, 'cpufreq')
+                try:
+                    with open(os.path.join(cpufreq, 'cpuinfo_max_freq'), 'r') as file:
+                        max_khz = int(file.read())
+                    self._freq[int(entry[3:])] = (os.open(os.path.join(cpufreq, 'scaling_cur_freq'),
+                                                          os.O_RDONLY), max_khz)
+                except (OSError, ValueError):
+                    continue
+
+    def _cpu_lines(self):
+        # doubles the read until a complete line after the per-core lines is in it, so the last
+        # core's counters are never cut off mid-number
+        while True:
+            data = os.pread(self._stat_fd, self._stat_size, 0)
+            if len(data) < self._stat_size:
+                lines = data.split(b'\n')
+            else:
+                # the last piece is cut off by the read size
+                lines = data.split(b'\n')[:-1]
+                if all(line.startswith(b'cpu') for line in lines):
+                    self._stat_size *= 2
+                    continue
+            return list(itertools.takewhile(lambda line: line.startswith(b'cpu'), lines))
+
+    def read(self):
+        """
+        Returns:
+            dict: Core index to (busy ticks, total ticks, frequency ratio).
+        """
+        cores = {}
+        for line in self._cpu_lines():
+            name, _, rest = line.partition(b' ')
+            if len(name) == 3:
+                continue
+            values = [int(value) for value in rest.split()]
+            total = sum(values[:8])
+            idle = values[3] + values[4]
+            cores[int(name[3:])] = (total - idle, total)
+        frequencies = {}
+        for core, (fd, max_khz) in self._freq.items():
+            frequencies[core] = int(os.pread(fd, 32, 0)) / max_khz
+        return {core: (busy, total, frequencies.get(core, 1.0)) for core, (busy, total) in cores.items()}
+
+    def close(self):
+        for fd, _ in self._freq.values():
+            os.close(fd)
+        os.close(self._stat_fd)
+        self._freq = {}
+
+
+class _PsutilCoreReader:
+    """Per-core times and clocks through psutil, for systems without /proc."""
+
+    def __init__(self):
+        import psutil
+        self._psutil = psutil
+
+    def read(self):
+        times = self._psutil.cpu_times(percpu=True)
+        try:
+            frequencies = self._psutil.cpu_freq(percpu=True) or []
+        except (AttributeError, NotImplementedError, OSError):
+            frequencies = []
+        cores = {}
+        for core, core_times in enumerate(times):
+            total = sum(core_times)
+            busy = total - core_times.idle - getattr(core_times, 'iowait', 0.0)
+            frequency = frequencies[core] if core < len(frequencies) else (frequencies[0] if frequencies else None)
+            ratio = frequency.current / frequency.max if frequency is not None and frequency.max else 1.0
+            cores[core] = (busy, total, ratio)
+        return cores
+
+    def close(self):
+        pass
+
+
+def core_reader(proc_stat_path=PROC_STAT_PATH, cpu_root=CPU_ROOT):
+    """Returns the cheapest per-core reader of the platform."""
+    if os.path.exists(proc_stat_path):
+        return _ProcCoreReader(proc_stat_path, cpu_root)
+    return _PsutilCoreReader()
+
+
+class CpuPowerModelSensor(Sensor):
+    """
+    Engine sensor integrating the CpuPowerModel power over the run.
+
+    Each read takes the busy share of every core since the previous read and its current clock,
+    and adds the modelled power times the interval to the energy. With a measured energy reader,
+    such as attribution.rapl_package_energy_reader, the measured power is stored alongside so the
+    samples can calibrate the model. With a log_path the cumulative energy is appended to a
+    binary sample log on every read, so it can be split at phase boundaries later. At close the
+    totals are written to summary_path.
+    """
+
+    name = 'cpu_power_model'
+    fields = ('utilization', 'frequency_ratio', 'power_w', 'energy_j', 'measured_power_w')
+
+    def __init__(self, model, period=1, summary_path=None, measured_energy_reader=None,
+                 proc_stat_path=PROC_STAT_PATH, cpu_root=CPU_ROOT, log_path=None):
+        self.model = model
+        self.period = period
+        self.summary_path = summary_path
+        self.log_path = log_path
+        self._log = None
+        self.measured_energy_reader = measured_energy_reader
+        self.proc_stat_path = proc_stat_path
+        self.cpu_root = cpu_root
+        self.energy_j = 0.0
+        self.duration_sec = 0.0
+        self._reader = None
+
+    def open(self, engine):
+        self.energy_j = 0.0
+        self.duration_sec = 0.0
+        self._reader = core_reader(self.proc_stat_path, self.cpu_root)
+        if self.log_path is not None:
+            self._log = SampleLogWriter(self.log_path, ENERGY_COLUMNS, 'cpu_power_model')
+            self._log.write((engine.start_wall, 0.0))
+        self._previous = self._reader.read()
+        self._previous_measured = self.measured_energy_reader() if self.measured_energy_reader else None
+        self._last_elapsed = None
+
+    def read(self, timestamp, elapsed):
+        cores = self._reader.read()
+        busy_share = weighted_ratio = 0.0
+        for core, (busy, total, ratio) in cores.items():
+            previous = self._previous.get(core)
+            if previous is None or total <= previous[1]:
+                continue
+            share = min(max((busy - previous[0]) / (total - previous[1]), 0.0), 1.0)
+            busy_share += share
+            weighted_ratio += share * ratio
+        self._previous = cores
+        utilization = busy_share / len(cores) if cores else 0.0
+        frequency_ratio = weighted_ratio / busy_share if busy_share else 1.0
+        power_w = self.model.power(utilization, frequency_ratio)
+        measured_power_w = float('nan')
+
+        if self._last_elapsed is not None and elapsed > self._last_elapsed:
+            dt = elapsed - self._last_elapsed
+            self.energy_j += power_w * dt
+            self.duration_sec += dt
+            if self.measured_energy_reader is not None:
+                measured = self.measured_energy_reader()
+                measured_power_w = (measured - self._previous_measured) / dt
+                self._previous_measured = measured
+        self._last_elapsed = elapsed
+        if self._log is not None:
+            self._log.write((timestamp, self.energy_j))
+        return [(utilization, frequency_ratio, power_w, self.energy_j, measured_power_w)]
+
+    def close(self, timestamp, elapsed):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if self.summary_path is not None:
+            with open(self.summary_path, 'w') as file:
+                json.dump(dict(self.model.parameters(), energy_j=self.energy_j, duration_sec=self.duration_sec,
+                               average_power_w=self.energy_j / self.duration_sec if self.duration_sec else None),
+                          file, indent=4)
+
+
+def load_power_model_summary(file_path=POWER_MODEL_FILE):
+    """
+    Loads the summary written by CpuPowerModelSensor, or None if the run did not model the CPU.
+    """
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+def modelled_cpu_energy_kwh(engine):
+    """
+    Returns the CPU energy integrated by the engine's CpuPowerModelSensor in kWh, or None.
+    """
+    for sensor in engine.sensors:
+        if isinstance(sensor, CpuPowerModelSensor):
+            return sensor.energy_j / 3.6e6
+    return None
+
+
+def _spin(stop_event):
+    while not stop_event.is_set():
+        pass
+
+
+def calibrate(cpu_model, tdp_w, seconds=60.0, interval=0.05, calibration_path=CALIBRATION_FILE):
+    """
+    Calibrates the power model of this machine against its RAPL package counters.
+
+    Busy-looping worker processes step the load from idle to every core, so the samples cover
+    the whole utilisation range; the fitted parameters are saved for the CPU model.
+
+    Returns:
+        CpuPowerModel: The calibrated model.
+    """
+    import multiprocessing
+    from attribution import rapl_package_energy_reader
+
+    reader = rapl_package_energy_reader()
+    if reader is None:
+        raise SystemError("Calibration needs readable RAPL package counters")
+    cores = os.cpu_count() or 1
+    levels = sorted({0, 1, max(1, cores // 4), max(1, cores // 2), cores})
+    model = CpuPowerModel(tdp_w)
+    sensor = CpuPowerModelSensor(model, measured_energy_reader=reader)
+    engine = SamplingEngine([sensor], interval=interval)
+    stop_event = multiprocessing.Event()
+    workers = []
+    engine.start()
+    try:
+        for level in levels:
+            logger.info(f"Calibrating with {level} busy cores")
+            while len(workers) < level:
+                worker = multiprocessing.Process(target=_spin, args=(stop_event,), daemon=True)
+                worker.start()
+                workers.append(worker)
+            time.sleep(seconds / len(levels))
+    finally:
+        stop_event.set()
+        for worker in workers:
+            worker.join()
+        engine.stop()
+    store = engine.stores[sensor.name]
+    rmse_w = model.calibrate(store.column('utilization'), store.column('frequency_ratio'),
+                             store.column('measured_power_w'))
+    save_calibration(cpu_model, model, rmse_w, len(store), calibration_path)
+    logger.info(f"Calibrated CPU power model {model.parameters()}, RMSE {rmse_w:.2f} W")
+    return model
+
+
+def main():
+    from hardware_cache import cpu_model_name
+    parser = argparse.ArgumentParser(description='Calibrate the CPU power model against RAPL.')
+    parser.add_argument('--tdp', type=float, required=True, help='The TDP of the CPU in Watts.')
+    parser.add_argument('--cpu-model', default=None, help='The CPU model, by default the one of this machine.')
+    parser.add_argument('--seconds', type=float, default=60.0)
+    parser.add_argument('--interval', type=float, default=0.05, help='The sampling interval in seconds.')
+    parser.add_argument('--calibration-file', default=CALIBRATION_FILE)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    model = calibrate(args.cpu_model or cpu_model_name(), args.tdp, args.seconds, args.interval,
+                      args.calibration_file)
+    print(json.dumps(model.parameters(), indent=4))
+
+
+if __name__ == "__main__":
+    main()
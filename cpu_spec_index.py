@@ -0,0 +1,154 @@
+import os
+import re
+import csv
+import logging
+from collections import namedtuple
+
+from sidecar_cache import load_or_build
+
+logger = logging.getLogger(__name__)
+
+AMD_SPEC_PATHS = (os.path.join('database', 'AMD_non_server_spec.csv'),
+                  os.path.join('database', 'AMD_server_processor_spec.csv'))
+INDEX_VERSION = 2
+
+CpuSpec = namedtuple('CpuSpec', ['name', 'family', 'model', 'source', 'cores', 'threads', 'tdp_w',
+                                 'ctdp_min_w', 'ctdp_max_w'])
+CpuMatch = namedtuple('CpuMatch', ['spec', 'score', 'exact'])
+
+# marketing text around the model in spec names and cpuinfo brand strings
+_NOISE = re.compile(r'[™®©\u200b]|\(.*?\)|\bwith\b.*$|\b(\d+|dual|triple|quad|six|eight|twelve|sixteen)-cores?\b'
+                    r'|\bprocessor\b|\bapu\b|\bamd\b|\b\d+(st|nd|rd|th) gen\b')
+_MODEL_TOKEN = re.compile(r'^(?P<number>\d+)(?P<suffix>[a-z0-9]*)$')
+_WATTS = re.compile(r'\d+(?:\.\d+)?')
+
+
+def normalize_cpu_name(name):
+    """
+    Splits a CPU name into family, model number and suffix.
+
+    Trademark signs, case and text such as '6-Core Processor', '64-Cores' or 'with Radeon
+    Graphics' are dropped, so 'AMD Ryzen™ 5 5600X' and 'AMD Ryzen 5 5600X 6-Core Processor'
+    both give ('ryzen 5', '5600', 'x').
+
+    Returns:
+        tuple: (family, number, suffix); number is None when no model number is found.
+    """
+    tokens = _NOISE.sub(' ', name.lower()).replace('-', ' ').split()
+    for position, token in enumerate(tokens):
+        match = _MODEL_TOKEN.match(token)
+        # single digits are tiers such as the 5 of Ryzen 5
+        if match and len(token) >= 3:
+            # trailing letters written apart, such as the HE of Opteron 4276 HE, belong to the suffix
+            suffix = match.group('suffix') + ''.join(tokens[position + 1:])
+            return ' '.join(tokens[:position]), match.group('number'), suffix
+    for position in range(len(tokens) - 1, -1, -1):
+        if any(char.isdigit() for char in tokens[position]):
+            return ' '.join(tokens[:position]), tokens[position], ''
+    return ' '.join(tokens), None, ''
+
+
+def _watts(text):
+    return [float(value) for value in _WATTS.findall(text or '')]
+
+
+def _int_or_none(text):
+    try:
+        return int(text)
+    except (TypeError, ValueError):
+        return None
+
+
+def _build_specs(csv_path):
+    source = os.path.basename(csv_path)
+    specs = []
+    with open(csv_path, 'r', newline='', encoding='utf-8-sig') as file:
+        for row in csv.DictReader(file):
+            family, number, suffix = normalize_cpu_name(row['Name'])
+            if number is None:
+                continue
+            tdp = _watts(row.get('Default TDP'))
+            ctdp = _watts(row.get('AMD Configurable TDP (cTDP)')) or tdp
+            specs.append(CpuSpec(row['Name'].replace('\u200b', '').strip(), family, number + suffix, source,
+                                 _int_or_none(row.get('# of CPU Cores')), _int_or_none(row.get('# of Threads')),
+                                 tdp[0] if tdp else None, min(ctdp) if ctdp else None, max(ctdp) if ctdp else None))
+    return specs
+
+
+class CpuSpecIndex:
+    """
+    Model number index over the AMD spec databases, for TDP, core and thread lookups.
+
+    Each CSV is normalised once and cached in a sidecar next to it. Candidates are ranked: the
+    exact model (number and suffix) first, preferring the same family, then rows with the same
+    number and the longest common suffix, so '5600' resolves to the Ryzen 5 5600 and never to
+    whichever of 5600X or 5600G comes first.
+    """
+
+    def __init__(self, csv_paths=AMD_SPEC_PATHS):
+        self.csv_paths = tuple(csv_paths)
+        self._by_number = None
+
+    def _load(self):
+        if self._by_number is None:
+            by_number = {}
+            for csv_path in self.csv_paths:
+                for spec in load_or_build(csv_path, _build_specs, version=INDEX_VERSION):
+                    number = _MODEL_TOKEN.match(spec.model)
+                    key = number.group('number') if number else spec.model
+                    by_number.setdefault(key, []).append(spec)
+            self._by_number = by_number
+        return self._by_number
+
+    def candidates(self, cpu_string, source=None, limit=5):
+        """
+        Returns the best matching spec rows of a CPU name.
+
+        Args:
+            cpu_string (str): A CPU name, e.g. the cpuinfo brand string.
+            source (str): Restrict to one database, by file name or path.
+            limit (int): The number of candidates to return.
+
+        Returns:
+            list: CpuMatch tuples, best first.
+        """
+        family, number, suffix = normalize_cpu_name(cpu_string)
+        if number is None:
+            return []
+        source = os.path.basename(source) if source else None
+        matches = []
+        for spec in self._load().get(number, ()):
+            if source is not None and spec.source != source:
+                continue
+            spec_suffix = spec.model[len(number):]
+            exact = spec_suffix == suffix
+            common = len(os.path.commonprefix([spec_suffix, suffix]))
+            score = (2 if exact else 0) + (1 if spec.family == family else 0) + common / 10 - \
+                len(spec_suffix) / 100
+            matches.append(CpuMatch(spec, score, exact))
+        matches.sort(key=lambda match: match.score, reverse=True)
+        return matches[:limit]
+
+    def resolve(self, cpu_string, source=None):
+        """
+        Returns the best matching CpuSpec of a CPU name, or None without a candidate.
+        """
+        matches = self.candidates(cpu_string, source)
+        if not matches:
+            return None
+        if not matches[0].exact:
+            logger.warning(f"No exact spec for {cpu_string}, using the closest model {matches[0].spec.name}")
+        return matches[0].spec
+
+
+_default_index = None
+
+
+def cpu_spec_index():
+    """
+    Returns the shared index of the AMD spec databases.
+    """
+    global _default_index
+    if _default_index is None:
+        _default_index = CpuSpecIndex()
+    return _default_index
@@ -1,44 +1,45 @@
 import json
 import sys
 
-import psutil
-import time
 import logging
-from gpu_monitor import NvidiaPowerMonitor
+from process_watcher import create_process_watcher
+from sampling_engine import create_monitoring_engine
 
 logger = logging.getLogger(__name__)
 
 
 # detecting interval defaulted at 0.1 second
-def wait_for_process(process_name, interval=0.1):
-    gpu_monitor = NvidiaPowerMonitor()
+def wait_for_process(process_name, interval=0.1, log_format='csv', power_tiers=None, keep_raw_log=True):
     """
     Waits for a process to start and then terminate.
 
     Args:
         process_name (str): The name of the process to monitor.
         interval (int): The interval (in seconds) at which to check for the process.
-    """
-    process_started = False
+        log_format (str): 'csv' or 'binary', the format of the power logs.
+        power_tiers: The tier widths the power logs are compacted into, see create_monitoring_engine.
+        keep_raw_log (bool): Whether the raw power logs are kept besides the tiers.
 
-    while True:
-        # Check if the process is running
-        for process in psutil.process_iter(['name']):
-            try:
-                if process.info['name'] == process_name:
-                    if not process_started:
-                        logger.info(f"Process {process_name} has started.")
-                        process_started = True
-                        gpu_monitor.start_monitoring()
-                    break
-            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                continue
-        else:
-            if process_started:
-                logger.info(f"Process {process_name} has terminated.")
-                gpu_monitor.stop_monitoring()
-                return
-        time.sleep(interval)
+    Returns:
+        tuple: The ProcessEvent of the start and of the last exit, with wall-clock timestamps.
+    """
+    watcher = create_process_watcher(interval)
+    try:
+        started = watcher.wait_for_start(process_name)
+        logger.info(f"Process {process_name} ({started.pid}) has started.")
+        engine = create_monitoring_engine(root_pid=started.pid, log_format=log_format, power_tiers=power_tiers,
+                                          keep_raw_log=keep_raw_log)
+        engine.start()
+        pid = started.pid
+        while pid is not None:
+            exited = watcher.wait_for_exit(pid)
+            # keep monitoring while another instance with the same name is still running
+            pid = watcher.find_running(process_name)
+        logger.info(f"Process {process_name} has terminated.")
+        engine.stop()
+    finally:
+        watcher.close()
+    return started, exited
 
 
 def load_config(config_path):
@@ -64,5 +65,7 @@ if __name__ == "__main__":
     setting = load_config('conf.json')['Projects'][arg1]
     process_name = setting['model_wrapping_settings']['process_running_name']
     detect_interval = setting['model_wrapping_settings']['detecting_interval']
-    wait_for_process(process_name, )
+    wrapping = setting['model_wrapping_settings']
+    wait_for_process(process_name, detect_interval or 0.1, wrapping.get('sample_log_format', 'csv'),
+                     wrapping.get('power_tiers'), wrapping.get('keep_raw_power_log', True))
     print(f"Process {process_name} has started and terminated.")
@@ -0,0 +1,147 @@
+import time
+import sqlite3
+import logging
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+API_URL = 'https://api.electricitymap.org/v3'
+CACHE_FILE = 'electricity_maps_cache.sqlite'
+# the past-range endpoint returns at most ten days of hourly values per request
+MAX_WINDOW = datetime.timedelta(days=10)
+HOUR = 3600
+# hours this recent may still be published, so a missing value is not cached for them
+NO_DATA_GRACE = 86400
+
+
+def _parse_time(value):
+    if isinstance(value, (int, float)):
+        return datetime.datetime.fromtimestamp(value, datetime.timezone.utc)
+    if isinstance(value, datetime.datetime):
+        moment = value
+    else:
+        text = value.strip()
+        moment = datetime.datetime.fromisoformat(text[:-1] + '+00:00' if text.endswith('Z') else text)
+    return moment if moment.tzinfo else moment.replace(tzinfo=datetime.timezone.utc)
+
+
+def _iso(hour):
+    return datetime.datetime.fromtimestamp(hour, datetime.timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+class ElectricityMapsClient:
+    """
+    Client for the Electricity Maps carbon intensity history with an on-disk hourly cache.
+
+    Requests go through one pooled requests.Session. A range is split into API-sized windows,
+    and only windows with hours missing from the SQLite cache are fetched, concurrently on a
+    bounded pool. Rate-limited (429) and server errors are retried with exponential backoff,
+    honouring Retry-After. base_url can point at a local stub server for testing.
+    """
+
+    def __init__(self, api_token, zone=None, cache_path=CACHE_FILE, base_url=API_URL, max_workers=4,
+                 max_retries=5, backoff=1.0, timeout=30):
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.zone = zone
+        self.base_url = base_url.rstrip('/')
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._requests = requests
+        self.session = requests.Session()
+        self.session.headers['auth-token'] = api_token
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self._cache = sqlite3.connect(cache_path, check_same_thread=False)
+        self._cache.execute('CREATE TABLE IF NOT EXISTS carbon_intensity '
+                            '(zone TEXT NOT NULL, hour INTEGER NOT NULL, value REAL, PRIMARY KEY (zone, hour))')
+        self._lock = threading.Lock()
+
+    def close(self):
+        self.session.close()
+        self._cache.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _get(self, path, params):
+        for attempt in range(self.max_retries + 1):
+            response = self.session.get(f'{self.base_url}/{path}', params=params, timeout=self.timeout)
+            if response.status_code != 429 and response.status_code < 500 or attempt == self.max_retries:
+                response.raise_for_status()
+                return response.json()
+            retry_after = response.headers.get('Retry-After')
+            delay = float(retry_after) if retry_after and retry_after.isdigit() else self.backoff * 2 ** attempt
+            logger.info(f"Electricity Maps returned {response.status_code}, retrying in {delay} s")
+            time.sleep(delay)
+
+    def _fetch_window(self, zone, start_hour, end_hour):
+        params = {'start': _iso(start_hour), 'end': _iso(end_hour)}
+        if zone:
+            params['zone'] = zone
+        data = self._get('carbon-intensity/past-range', params)
+        records = data.get('data', []) if isinstance(data, dict) else data
+        values = {int(_parse_time(record['datetime']).timestamp()) // HOUR * HOUR: record.get('carbonIntensity')
+                  for record in records}
+        # hours without a row are cached as NULL, so they are not fetched again
+        settled = time.time() - NO_DATA_GRACE
+        for hour in range(start_hour, end_hour, HOUR):
+            if hour not in values and hour + HOUR <= settled:
+                values[hour] = None
+        return list(values.items())
+
+    def _cached_hours(self, zone, start_hour, end_hour):
+        with self._lock:
+            rows = self._cache.execute('SELECT hour, value FROM carbon_intensity WHERE zone = ? AND hour >= ? '
+                                       'AND hour < ?', (zone, start_hour, end_hour)).fetchall()
+        return dict(rows)
+
+    def carbon_intensity_history(self, start, end, zone=None):
+        """
+        Returns the hourly carbon intensity between start and end.
+
+        Args:
+            start: The start as ISO 8601 text, datetime or epoch seconds; naive values are UTC.
+            end: The exclusive end, in the same forms.
+            zone (str): The Electricity Maps zone, e.g. 'CA-QC'; by default the client's zone,
+                or the token's default zone when neither is set.
+
+        Returns:
+            list: {'datetime', 'carbonIntensity'} records in time order, the format stored in
+            grid_carbon_intensity and read by carbon_accounting. Hours without data are left out.
+        """
+        zone = zone or self.zone
+        zone_key = zone or ''
+        start_hour = int(_parse_time(start).timestamp()) // HOUR * HOUR
+        end_hour = int(_parse_time(end).timestamp())
+        cached = self._cached_hours(zone_key, start_hour, end_hour)
+
+        # split each run of consecutive missing hours into API-sized windows
+        window = int(MAX_WINDOW.total_seconds())
+        windows = []
+        for hour in range(start_hour, end_hour, HOUR):
+            if hour in cached:
+                continue
+            if windows and windows[-1][1] == hour and hour - windows[-1][0] < window:
+                windows[-1] = (windows[-1][0], min(end_hour, hour + HOUR))
+            else:
+                windows.append((hour, min(end_hour, hour + HOUR)))
+        if windows:
+            logger.info(f"Fetching {len(windows)} Electricity Maps windows for zone {zone or 'default'}")
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(windows))) as pool:
+                results = list(pool.map(lambda bounds: self._fetch_window(zone, *bounds), windows))
+            fetched = [(zone_key, hour, value) for result in results for hour, value in result]
+            with self._lock, self._cache:
+                self._cache.executemany('INSERT OR REPLACE INTO carbon_intensity VALUES (?, ?, ?)', fetched)
+            cached = self._cached_hours(zone_key, start_hour, end_hour)
+
+        return [{'datetime': _iso(hour), 'carbonIntensity': value} for hour, value in sorted(cached.items())
+                if value is not None]
@@ -1,66 +1,170 @@
-import gpustat
+import os
+import math
 import time
-import threading
 import logging
 import datetime
-import csv
+
+from sampling import BufferedCsvWriter
+from sample_log import SampleLogWriter, GPU_COLUMNS, local_seconds
+from sampling_engine import Sensor, SamplingEngine
+from gpu_sensors import create_gpu_sensor
+from power_tiers import TierCompactor, remove_tiers
 
 logger = logging.getLogger(__name__)
 
 
-class NvidiaPowerMonitor:
-    def __init__(self, log_file="gpu_power_log.csv"):
+class GpuPowerLogSensor(Sensor):
+    """
+    Engine sensor for GPU power, writing gpu_power_log.csv in batches.
+
+    With log_format 'binary' the log is a sample_log file holding local-time epoch seconds, the
+    GPU index and the power draw. With tiers the trapezoidal energy of all GPUs is rolled into
+    power_tiers files as it is measured; with raw_log False only those are kept.
+    """
+
+    name = 'gpu'
+    fields = ('gpu', 'power.draw')
+
+    def __init__(self, log_file="gpu_power_log.csv", sensor=None, period=1, flush_interval=5.0,
+                 log_samples=False, spill_path=None, log_format='csv', tiers=None, raw_log=True):
         self.log_file = log_file
-        self.monitor_thread = None
-        self._stop_event = threading.Event()
-        self.measurements = []
+        self.log_format = log_format
+        self.tiers = tiers
+        self.raw_log = raw_log
+        # NVML by default; any GpuPowerSensor (e.g. NvmlPowerSensor(FakeNvml())) can be injected
+        self.sensor = sensor
+        self.period = period
+        self.flush_interval = flush_interval
+        self.log_samples = log_samples
+        self.spill_path = spill_path
+        self._writer = None
+        self._compactor = None
+        self._owns_sensor = False
 
-    def _monitor_power(self, interval):
-        """
-        Monitors GPU power usage and logs it at specified intervals.
-        """
-        with open(self.log_file, 'w', newline='') as csvfile:
+    def open(self, engine):
+        self._last_power = {}
+        self._last_timestamp = None
+        if self.tiers:
+            self._compactor = TierCompactor(self.log_file, self.tiers, 'gpu', flush_interval=self.flush_interval)
+        else:
+            remove_tiers(self.log_file)
+        if not self.raw_log:
+            # a raw log of an earlier run would be read instead of the tiers
+            if os.path.isfile(self.log_file):
+                os.remove(self.log_file)
+        elif self.log_format == 'binary':
+            self._writer = SampleLogWriter(self.log_file, GPU_COLUMNS, 'gpu', {'timestamp': 'local'},
+                                           flush_interval=self.flush_interval)
+        else:
             fieldnames = ['timestamp', 'gpu', 'power.draw', 'power.limit']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            writer.writeheader()
-
-            while not self._stop_event.is_set():
-                stats = gpustat.new_query()
-                for gpu in stats.gpus:
-                    measurement = {
-                        'timestamp': datetime.datetime.now(),
-                        'gpu': gpu.index,
-                        'power.draw': gpu.power_draw,
-                        # 'power.limit': gpu.enforced_power_limit
-                    }
-                    writer.writerow(measurement)
-                    self.measurements.append(measurement)
-                    logger.info(f"Logged power usage for GPU {gpu.index}: {measurement}")
-                time.sleep(interval)
+            self._writer = BufferedCsvWriter(self.log_file, fieldnames, flush_interval=self.flush_interval)
+        if self.sensor is None:
+            self.sensor = create_gpu_sensor()
+            self._owns_sensor = self.sensor is not None
+        if self.sensor is None:
+            logger.warning("No NVIDIA GPU power sensor available, GPU power is not logged.")
+
+    def read(self, timestamp, elapsed):
+        if self.sensor is None:
+            return None
+        moment = datetime.datetime.fromtimestamp(timestamp)
+        rows = []
+        for index, power_draw in self.sensor.read():
+            measurement = {
+                'timestamp': moment,
+                'gpu': index,
+                'power.draw': power_draw,
+                # 'power.limit': gpu.enforced_power_limit
+            }
+            if self._writer is not None and self.log_format == 'binary':
+                self._writer.write((local_seconds(timestamp), index,
+                                    power_draw if power_draw is not None else float('nan')))
+            elif self._writer is not None:
+                self._writer.write(measurement)
+            rows.append((index, power_draw if power_draw is not None else float('nan')))
+            if self.log_samples:
+                logger.info(f"Logged power usage for GPU {index}: {measurement}")
+        if self._compactor is not None:
+            self._compact(timestamp, rows)
+        return rows
+
+    def _compact(self, timestamp, rows):
+        # each GPU's trapezoid runs from its own last valid sample, as integrate_gpu_power does;
+        # the energies of one tick are added into a single interval
+        energy_j = 0.0
+        for index, power_draw in rows:
+            if math.isnan(power_draw):
+                continue
+            last = self._last_power.get(index)
+            if last is not None:
+                energy_j += (last[1] + power_draw) / 2 * (timestamp - last[0])
+            self._last_power[index] = (timestamp, power_draw)
+        if self._last_timestamp is not None:
+            self._compactor.add(self._last_timestamp, timestamp, energy_j)
+        self._last_timestamp = timestamp
+
+    def close(self, timestamp, elapsed):
+        if self._compactor is not None:
+            self._compactor.close()
+            self._compactor = None
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._owns_sensor:
+            # shuts NVML down; an injected sensor belongs to the caller
+            self.sensor.close()
+            self.sensor = None
+            self._owns_sensor = False
+
+
+class NvidiaPowerMonitor:
+    """
+    Standalone GPU power monitor: a GpuPowerLogSensor on its own SamplingEngine.
+
+    Queries are scheduled on absolute monotonic deadlines, so the query latency does not stretch
+    the interval, rows are written to the log in batches and the samples are kept in a bounded
+    columnar store.
+    """
+
+    def __init__(self, log_file="gpu_power_log.csv", log_samples=False, flush_interval=5.0,
+                 ring_size=86400, spill_path=None, sensor=None):
+        self.log_file = log_file
+        self.log_sensor = GpuPowerLogSensor(log_file, sensor=sensor, flush_interval=flush_interval,
+                                            log_samples=log_samples, spill_path=spill_path)
+        self.engine = SamplingEngine([self.log_sensor], ring_size=ring_size)
+        # epoch seconds, elapsed seconds, GPU index and Watt per sample
+        self.measurements = self.engine.stores[self.log_sensor.name]
 
     def start_monitoring(self, interval=1):
         """
         Starts the GPU power monitoring in a separate thread.
         """
-        self._stop_event.clear()
-        self.monitor_thread = threading.Thread(target=self._monitor_power, args=(interval,))
-        self.monitor_thread.start()
+        self.engine.interval = interval
+        self.engine.start()
         logger.info(f"Started GPU power monitoring, logging to {self.log_file}")
 
     def stop_monitoring(self):
         """
         Stops the GPU power monitoring process.
         """
-        self._stop_event.set()
-        if self.monitor_thread is not None:
-            self.monitor_thread.join()
+        self.engine.stop()
         logger.info("Stopped GPU power monitoring")
 
     def get_measurements(self):
         """
-        Returns the recorded measurements.
+        Returns the recorded measurements still in memory as zero-copy column views.
+
+        Returns:
+            dict: 'timestamp' (epoch seconds), 'elapsed', 'gpu' and 'power.draw' (Watt) memoryviews.
+            Older samples are in the spill file when spill_path was given, see SampleStore.iter_spilled.
+        """
+        return self.measurements.views()
+
+    def get_stats(self):
+        """
+        Returns the sampler statistics: achieved rate, missed deadlines and query latency percentiles.
         """
-        return self.measurements
+        return self.engine.stats()
 
 
 # Example usage
@@ -0,0 +1,191 @@
+import abc
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class GpuPowerSensor(abc.ABC):
+    """
+    Interface of the GPU power backends used by NvidiaPowerMonitor.
+    """
+
+    @abc.abstractmethod
+    def names(self):
+        """Returns the name of each GPU, ordered by index."""
+
+    @abc.abstractmethod
+    def read(self):
+        """
+        Reads the current power draw.
+
+        Returns:
+            list: (GPU index, power in Watt) tuples, power None when the device does not report it.
+        """
+
+    def close(self):
+        pass
+
+
+class NvmlPowerSensor(GpuPowerSensor):
+    """
+    Reads power through NVML with device handles opened once.
+
+    Where the driver exposes the total energy counter (Volta and newer) the power of a tick is the
+    energy difference over the elapsed time, so nothing between two samples is missed; otherwise
+    the instantaneous power usage is read. Any module with the pynvml API can be passed as nvml,
+    such as FakeNvml on machines without a GPU.
+    """
+
+    def __init__(self, nvml=None):
+        if nvml is None:
+            import pynvml as nvml
+        self._nvml = nvml
+        nvml.nvmlInit()
+        self._handles = [nvml.nvmlDeviceGetHandleByIndex(index) for index in range(nvml.nvmlDeviceGetCount())]
+        self._last_energy = []
+        for handle in self._handles:
+            try:
+                self._last_energy.append((nvml.nvmlDeviceGetTotalEnergyConsumption(handle), time.monotonic()))
+            except nvml.NVMLError:
+                self._last_energy.append(None)
+
+    def names(self):
+        names = []
+        for handle in self._handles:
+            name = self._nvml.nvmlDeviceGetName(handle)
+            names.append(name.decode() if isinstance(name, bytes) else name)
+        return names
+
+    def _power_w(self, index, handle):
+        last = self._last_energy[index]
+        if last is not None:
+            energy_mj, now = self._nvml.nvmlDeviceGetTotalEnergyConsumption(handle), time.monotonic()
+            self._last_energy[index] = (energy_mj, now)
+            if now > last[1] and energy_mj >= last[0]:
+                return (energy_mj - last[0]) / 1000 / (now - last[1])
+        return self._nvml.nvmlDeviceGetPowerUsage(handle) / 1000
+
+    def read(self):
+        readings = []
+        for index, handle in enumerate(self._handles):
+            try:
+                readings.append((index, self._power_w(index, handle)))
+            except self._nvml.NVMLError as e:
+                logger.debug(f"NVML power read failed for GPU {index}: {e}")
+                readings.append((index, None))
+        return readings
+
+    def read_energy_j(self):
+        """
+        Returns the total energy counter of each GPU in Joules, None where it is not supported.
+        """
+        energies = []
+        for handle, last in zip(self._handles, self._last_energy):
+            energies.append(None if last is None else self._nvml.nvmlDeviceGetTotalEnergyConsumption(handle) / 1000)
+        return energies
+
+    def close(self):
+        if self._handles is not None:
+            self._nvml.nvmlShutdown()
+            self._handles = None
+
+
+class GpustatPowerSensor(GpuPowerSensor):
+    """
+    The former gpustat query, kept for machines where NVML cannot be loaded directly.
+    """
+
+    def __init__(self):
+        import gpustat
+        self._gpustat = gpustat
+
+    def names(self):
+        return [gpu.name for gpu in self._gpustat.new_query().gpus]
+
+    def read(self):
+        return [(gpu.index, gpu.power_draw) for gpu in self._gpustat.new_query().gpus]
+
+
+class FakeNvml:
+    """
+    Simulated pynvml module for testing on machines without an NVIDIA GPU.
+
+    Power follows the given values per device; the energy counter integrates them over time,
+    mimicking devices with and without nvmlDeviceGetTotalEnergyConsumption.
+    """
+
+    class NVMLError(Exception):
+        pass
+
+    def __init__(self, powers_w=(50.0,), names=None, energy_supported=True):
+        self.powers_w = list(powers_w)
+        self.device_names = list(names) if names is not None else [f'Fake GPU {index}' for index in
+                                                                   range(len(self.powers_w))]
+        self.energy_supported = energy_supported
+        self.initialized = False
+        self._start = time.monotonic()
+
+    def nvmlInit(self):
+        self.initialized = True
+
+    def nvmlShutdown(self):
+        self.initialized = False
+
+    def _check(self):
+        if not self.initialized:
+            raise self.NVMLError('NVML_ERROR_UNINITIALIZED')
+
+    def nvmlDeviceGetCount(self):
+        self._check()
+        return len(self.powers_w)
+
+    def nvmlDeviceGetHandleByIndex(self, index):
+        self._check()
+        if not 0 <= index < len(self.powers_w):
+            raise self.NVMLError('NVML_ERROR_INVALID_ARGUMENT')
+        return index
+
+    def nvmlDeviceGetName(self, handle):
+        self._check()
+        return self.device_names[handle]
+
+    def nvmlDeviceGetPowerUsage(self, handle):
+        self._check()
+        return int(self.powers_w[handle] * 1000)
+
+    def nvmlDeviceGetTotalEnergyConsumption(self, handle):
+        self._check()
+        if not self.energy_supported:
+            raise self.NVMLError('NVML_ERROR_NOT_SUPPORTED')
+        return int(self.powers_w[handle] * (time.monotonic() - self._start) * 1000)
+
+
+def create_gpu_sensor():
+    """
+    Returns the cheapest available GPU power sensor: NVML, then gpustat, or None without a GPU.
+    """
+    try:
+        return NvmlPowerSensor()
+    except Exception as e:
+        logger.debug(f"NVML unavailable: {e}")
+    try:
+        return GpustatPowerSensor()
+    except Exception as e:
+        logger.debug(f"gpustat unavailable: {e}")
+    return None
+
+
+def gpu_names():
+    """
+    Returns the names of the installed NVIDIA GPUs, without shelling out to nvidia-smi when NVML loads.
+    """
+    try:
+        sensor = NvmlPowerSensor()
+    except Exception:
+        import GPUtil
+        return [gpu.name for gpu in GPUtil.getGPUs()]
+    try:
+        return sensor.names()
+    finally:
+        sensor.close()
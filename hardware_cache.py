@@ -0,0 +1,89 @@
+import os
+import json
+import hashlib
+import logging
+import platform
+
+logger = logging.getLogger(__name__)
+
+HARDWARE_CACHE_FILE = 'hardware_cache.json'
+BOOT_ID_PATH = '/proc/sys/kernel/random/boot_id'
+CPUINFO_PATH = '/proc/cpuinfo'
+
+
+def _boot_id():
+    try:
+        with open(BOOT_ID_PATH, 'r') as file:
+            return file.read().strip()
+    except OSError:
+        import psutil
+        return str(psutil.boot_time())
+
+
+def cpu_model_name():
+    """Returns the CPU model string of this machine, without importing cpuinfo."""
+    try:
+        with open(CPUINFO_PATH, 'r') as file:
+            for line in file:
+                if line.startswith('model name'):
+                    return line.partition(':')[2].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def machine_fingerprint():
+    """
+    Returns a cheap identifier of the current boot of this machine.
+
+    The boot ID changes on every reboot, which is when CPUs, GPUs and RAM can change; the CPU
+    model string guards against a cache file copied between machines.
+    """
+    key = f'{platform.node()}|{_boot_id()}|{cpu_model_name()}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def hardware_fingerprint():
+    """
+    Returns an identifier of the hardware of this machine that survives reboots.
+
+    Unlike machine_fingerprint it leaves out the boot ID, so results of one machine can be
+    grouped over time; a change of CPU or RAM size gives a new fingerprint.
+    """
+    import psutil
+    key = f'{platform.node()}|{cpu_model_name()}|{psutil.virtual_memory().total}'
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def cached_system_specs(detect, cache_path=HARDWARE_CACHE_FILE):
+    """
+    Returns the hardware specs from the cache, detecting and storing them on a fingerprint miss.
+
+    Args:
+        detect (callable): Returns the specs as a JSON-serialisable dict; only called on a miss.
+        cache_path (str): The cache file.
+
+    Returns:
+        dict: The system specs.
+    """
+    fingerprint = machine_fingerprint()
+    try:
+        with open(cache_path, 'r') as file:
+            cached = json.load(file)
+        if cached.get('fingerprint') == fingerprint:
+            return cached['specs']
+    except (OSError, ValueError, KeyError):
+        pass
+
+    specs = detect()
+    temporary_path = f'{cache_path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary_path, 'w') as file:
+            json.dump({'fingerprint': fingerprint, 'specs': specs}, file)
+        # replace atomically, so concurrent runs never read a half written cache
+        os.replace(temporary_path, cache_path)
+    except (OSError, TypeError) as e:
+        logger.warning(f"Could not cache the system specs: {e}")
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    return specs
@@ -0,0 +1,357 @@
+import os
+import re
+import mmap
+import logging
+
+import numpy as np
+import pandas as pd
+
+from sample_log import is_sample_log, open_sample_log
+
+logger = logging.getLogger(__name__)
+
+INTEL_FOOTER_MARKER = b'Total Elapsed Time (sec)'
+# the summary footer is a few hundred bytes per package, this bounds the backwards search
+MAX_FOOTER_BYTES = 1 << 20
+_PACKAGE_COLUMN = re.compile(r'^(?P<quantity>.+)_(?P<package>\d+)\s*\((?P<unit>[^)]*)\)$')
+
+
+def _last_line(mm, end):
+    """Returns the last non-empty line of the mapped file before the given offset."""
+    while end > 0 and mm[end - 1:end] in (b'\n', b'\r', b' '):
+        end -= 1
+    return mm[mm.rfind(b'\n', 0, end) + 1:end]
+
+
+def read_intel_power_log_footer(file_path='intel_power_gadget_log.csv'):
+    """
+    Reads the summary footer of an Intel Power Gadget log without scanning the samples.
+
+    The file is memory mapped and searched backwards from the end, so the cost does not depend
+    on the log length. When the footer is missing, for example because PowerLog was killed, the
+    cumulative columns of the last sample row are returned under the footer key names instead.
+    When the raw log was not kept, the totals come from its coarsest power tier, with the
+    processor energy of all packages under package 0.
+
+    Args:
+        file_path (str): The path to the log file.
+
+    Returns:
+        dict: The footer values, e.g. {'Total Elapsed Time (sec)': 33.88, ...}.
+    """
+    if is_sample_log(file_path):
+        return _footer_from_sample_log(file_path)
+    if not os.path.exists(file_path):
+        footer = _footer_from_tiers(file_path)
+        if footer is not None:
+            return footer
+    with open(file_path, 'rb') as file:
+        size = os.fstat(file.fileno()).st_size
+        if size == 0:
+            return {}
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            window = 4096
+            while True:
+                start = max(0, size - window)
+                position = mm.rfind(INTEL_FOOTER_MARKER, start)
+                if position >= 0 or start == 0 or window >= MAX_FOOTER_BYTES:
+                    break
+                window *= 2
+            if position < 0:
+                header = mm[:mm.find(b'\n')].decode(errors='replace')
+                return _footer_from_last_row(header, _last_line(mm, size).decode(errors='replace'))
+            text = mm[mm.rfind(b'\n', 0, position) + 1:].decode(errors='replace')
+
+    footer = {}
+    for line in text.splitlines():
+        key, separator, value = line.partition('=')
+        if not separator:
+            continue
+        try:
+            footer[key.strip()] = float(value)
+        except ValueError as e:
+            logger.warning(f"Error parsing {key.strip()}: {e}")
+    return footer
+
+
+def _footer_from_last_row(header, last_row):
+    columns = [column.strip() for column in header.split(',')]
+    values = [value.strip() for value in last_row.split(',')]
+    footer = {}
+    for column, value in zip(columns, values):
+        if column == 'Elapsed Time (sec)':
+            key = 'Total Elapsed Time (sec)'
+        elif column.startswith('Cumulative'):
+            # "Cumulative Processor Energy_0(mWh)" -> "Cumulative Processor Energy_0 (mWh)"
+            key = column.replace('(', ' (', 1)
+        else:
+            continue
+        try:
+            footer[key] = float(value)
+        except ValueError:
+            continue
+    if footer:
+        logger.warning("Intel power log has no summary footer, using its last sample row.")
+    return footer
+
+
+def _footer_from_sample_log(file_path):
+    # a binary log has no footer; only its last record is read
+    header, data = open_sample_log(file_path)
+    if not len(data):
+        return {}
+    last = data[-1]
+    elapsed = float(last['Elapsed Time (sec)'])
+    footer = {'Total Elapsed Time (sec)': elapsed}
+    for column in header['columns']:
+        if column.startswith('Cumulative') and column.endswith('(Joules)'):
+            name = column[:-len('(Joules)')]
+            joules = float(last[column])
+            footer[f'{name} (Joules)'] = joules
+            footer[f'{name} (mWh)'] = joules / 3.6
+            average = name[len('Cumulative '):].replace('Energy', 'Power')
+            footer[f'Average {average} (Watt)'] = joules / elapsed if elapsed else 0.0
+    return footer
+
+
+def _footer_from_tiers(file_path):
+    from power_tiers import tier_summary
+    summary = tier_summary(file_path)
+    if summary is None:
+        return None
+    start_time = summary['start_time'] if summary['start_time'] is not None else summary['start']
+    elapsed = summary['end'] - start_time if summary['end'] is not None else 0.0
+    joules = summary['energy_j']
+    return {'Total Elapsed Time (sec)': elapsed,
+            'Cumulative Processor Energy_0 (Joules)': joules,
+            'Cumulative Processor Energy_0 (mWh)': joules / 3.6,
+            'Average Processor Power_0 (Watt)': joules / elapsed if elapsed else 0.0}
+
+
+def _time_of_day_seconds(system_time):
+    """
+    Converts the HH:MM:SS:ms System Time column to seconds, vectorised over fixed-width bytes.
+
+    A wrap past midnight adds a day, so the result keeps increasing over multi-day runs.
+    """
+    raw = system_time.str.strip().to_numpy(dtype='S12')
+    digits = np.frombuffer(raw.tobytes(), dtype=np.uint8).reshape(-1, 12).astype(np.int64) - ord('0')
+    seconds = ((digits[:, 0] * 10 + digits[:, 1]) * 3600 + (digits[:, 3] * 10 + digits[:, 4]) * 60
+               + digits[:, 6] * 10 + digits[:, 7]) + (digits[:, 9] * 100 + digits[:, 10] * 10 + digits[:, 11]) / 1000
+    days = np.concatenate(([0], np.cumsum(np.diff(seconds) < 0)))
+    return seconds + days * 86400
+
+
+def load_intel_power_log(file_path='intel_power_gadget_log.csv'):
+    """
+    Loads the sample rows of an Intel Power Gadget log into a DataFrame with the C parser.
+
+    Column names are stripped of the padding PowerLog writes, the footer lines are dropped and
+    a 'Time of Day (sec)' column is derived from System Time. Binary sample logs are read
+    through their memory map instead, with the same numeric columns.
+
+    Args:
+        file_path (str): The path to the log file.
+
+    Returns:
+        pandas.DataFrame: One row per sample, numeric columns as float64.
+    """
+    if is_sample_log(file_path):
+        header, data = open_sample_log(file_path)
+        return pd.DataFrame({column: data[column] for column in header['columns']})
+    df = pd.read_csv(file_path, skipinitialspace=True, skip_blank_lines=True, dtype={'System Time': str})
+    df.columns = [column.strip() for column in df.columns]
+    # footer lines parse as rows with only a System Time field
+    df = df[df['Elapsed Time (sec)'].notna()].reset_index(drop=True)
+    df['Time of Day (sec)'] = _time_of_day_seconds(df['System Time'])
+    return df
+
+
+def intel_package_columns(df, quantity, unit):
+    """
+    Returns the per-package columns of a quantity, ordered by package index.
+
+    Args:
+        df (pandas.DataFrame): A frame from load_intel_power_log.
+        quantity (str): The column prefix, e.g. 'Processor Power' or 'Cumulative Processor Energy'.
+        unit (str): The unit in brackets, e.g. 'Watt', 'Joules' or 'mWh'.
+
+    Returns:
+        list: Column names such as ['Processor Power_0(Watt)', 'Processor Power_1(Watt)'].
+    """
+    matches = []
+    for column in df.columns:
+        match = _PACKAGE_COLUMN.match(column)
+        if match and match.group('quantity') == quantity and match.group('unit') == unit:
+            matches.append((int(match.group('package')), column))
+    return [column for _, column in sorted(matches)]
+
+
+def intel_interval_power(df, domain='Processor'):
+    """
+    Computes the average power of each sampling interval from the cumulative energy columns.
+
+    Args:
+        df (pandas.DataFrame): A frame from load_intel_power_log.
+        domain (str): 'Processor', 'IA' or 'DRAM'.
+
+    Returns:
+        pandas.DataFrame: Interval start and end (elapsed seconds), the energy in Joules and the
+        average power in Watt, summed over all packages.
+    """
+    energy = df[intel_package_columns(df, f'Cumulative {domain} Energy', 'Joules')].to_numpy().sum(axis=1)
+    elapsed = df['Elapsed Time (sec)'].to_numpy()
+    duration = np.diff(elapsed)
+    interval_energy = np.diff(energy)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        power = np.where(duration > 0, interval_energy / duration, 0.0)
+    return pd.DataFrame({'start_sec': elapsed[:-1], 'end_sec': elapsed[1:],
+                         'energy_j': interval_energy, 'power_w': power})
+
+
+def integrate_intel_power_log(df, domain='Processor'):
+    """
+    Recomputes the energy of a log by trapezoidal integration of the sampled power.
+
+    Args:
+        df (pandas.DataFrame): A frame from load_intel_power_log.
+        domain (str): 'Processor', 'IA' or 'DRAM'.
+
+    Returns:
+        float: The energy in Joules summed over all packages.
+    """
+    power = df[intel_package_columns(df, f'{domain} Power', 'Watt')].to_numpy().sum(axis=1)
+    elapsed = df['Elapsed Time (sec)'].to_numpy()
+    if len(elapsed) < 2:
+        return 0.0
+    return float(np.sum((power[1:] + power[:-1]) * np.diff(elapsed)) / 2)
+
+
+def load_gpu_power_log(file_path='gpu_power_log.csv'):
+    """
+    Loads a gpu_power_log.csv written by NvidiaPowerMonitor into typed columns.
+
+    Timestamps are parsed in one vectorised pass; rows with an unparsable timestamp or power
+    value are dropped. Binary sample logs are read through their memory map instead.
+
+    Args:
+        file_path (str): The path to the CSV file.
+
+    Returns:
+        pandas.DataFrame: Columns timestamp (datetime64), gpu (int) and power.draw (float, Watt).
+    """
+    if is_sample_log(file_path):
+        _, data = open_sample_log(file_path)
+        df = pd.DataFrame({
+            # local-time epoch seconds, the clock of the CSV timestamps
+            'timestamp': np.rint(data['timestamp'] * 1e9).astype(np.int64).astype('datetime64[ns]'),
+            'gpu': data['gpu'].astype(np.int64),
+            'power.draw': data['power.draw'],
+        })
+        return df[df['power.draw'].notna()].reset_index(drop=True)
+    df = pd.read_csv(file_path, skipinitialspace=True, dtype=str)
+    df.columns = [column.strip() for column in df.columns]
+    if 'gpu' not in df.columns:
+        df['gpu'] = '0'
+    df = pd.DataFrame({
+        # datetime.now() drops the fraction when it is zero, so both ISO variants occur
+        'timestamp': pd.to_datetime(df['timestamp'].str.strip(), format='ISO8601', errors='coerce'),
+        'gpu': pd.to_numeric(df['gpu'], errors='coerce'),
+        'power.draw': pd.to_numeric(df['power.draw'], errors='coerce'),
+    }).dropna()
+    df['gpu'] = df['gpu'].astype(np.int64)
+    return df.reset_index(drop=True)
+
+
+def integrate_gpu_power(df):
+    """
+    Integrates each GPU's power over its own timestamps with the trapezoidal rule.
+
+    Args:
+        df (pandas.DataFrame): A frame from load_gpu_power_log.
+
+    Returns:
+        dict: The energy of each GPU index in kWh.
+    """
+    if df.empty:
+        return {}
+    df = df.sort_values(['gpu', 'timestamp'], kind='stable')
+    gpu = df['gpu'].to_numpy()
+    seconds = df['timestamp'].to_numpy().astype('datetime64[ns]').astype(np.int64) / 1e9
+    power = df['power.draw'].to_numpy(dtype=np.float64)
+    # a trapezoid only joins consecutive samples of the same device
+    same_gpu = gpu[1:] == gpu[:-1]
+    segments = np.where(same_gpu, (power[1:] + power[:-1]) / 2 * np.diff(seconds), 0.0)
+    indices, positions = np.unique(gpu, return_inverse=True)
+    energy_j = np.bincount(positions[1:], weights=segments, minlength=len(indices))
+    return {int(index): float(joules) / 3.6e6 for index, joules in zip(indices, energy_j)}
+
+
+def intel_energy_between(df, starts, ends, domain='Processor'):
+    """
+    Returns the energy used between each pair of elapsed times, summed over all packages.
+
+    The cumulative energy columns are interpolated at every boundary in one call.
+
+    Args:
+        df (pandas.DataFrame): A frame from load_intel_power_log.
+        starts (array): Interval starts in elapsed seconds of the log.
+        ends (array): Interval ends in elapsed seconds of the log.
+        domain (str): 'Processor', 'IA' or 'DRAM'.
+
+    Returns:
+        numpy.ndarray: The energy of each interval in Joules.
+    """
+    energy = df[intel_package_columns(df, f'Cumulative {domain} Energy', 'Joules')].to_numpy().sum(axis=1)
+    elapsed = df['Elapsed Time (sec)'].to_numpy()
+    if len(elapsed) == 0:
+        return np.zeros(len(starts))
+    return np.interp(ends, elapsed, energy) - np.interp(starts, elapsed, energy)
+
+
+def energy_log_between(file_path, starts, ends):
+    """
+    Returns the energy used between each pair of epoch times from a cumulative energy log, such
+    as those of CpuPowerModelSensor and MemoryEnergySensor.
+
+    Args:
+        file_path (str): A binary sample log with the sample_log.ENERGY_COLUMNS.
+        starts (array): Interval starts in epoch seconds.
+        ends (array): Interval ends in epoch seconds.
+
+    Returns:
+        numpy.ndarray: The energy of each interval in Joules.
+    """
+    _, data = open_sample_log(file_path)
+    if not len(data):
+        return np.zeros(len(starts))
+    times, energy = data['timestamp'], data['energy_j']
+    return np.interp(ends, times, energy) - np.interp(starts, times, energy)
+
+
+def gpu_energy_between(df, starts, ends):
+    """
+    Returns the GPU energy used between each pair of timestamps, summed over all GPUs.
+
+    Each GPU's trapezoidal energy is accumulated over its samples and interpolated at the
+    boundaries, vectorised over the samples.
+
+    Args:
+        df (pandas.DataFrame): A frame from load_gpu_power_log.
+        starts (array): Interval starts as datetime64, in the log's local time.
+        ends (array): Interval ends as datetime64, in the log's local time.
+
+    Returns:
+        numpy.ndarray: The energy of each interval in Joules.
+    """
+    starts = np.asarray(starts, dtype='datetime64[ns]').astype(np.int64) / 1e9
+    ends = np.asarray(ends, dtype='datetime64[ns]').astype(np.int64) / 1e9
+    energy_j = np.zeros(len(starts))
+    for _, samples in df.sort_values('timestamp', kind='stable').groupby('gpu'):
+        seconds = samples['timestamp'].to_numpy().astype('datetime64[ns]').astype(np.int64) / 1e9
+        power = samples['power.draw'].to_numpy(dtype=np.float64)
+        if len(seconds) < 2:
+            continue
+        cumulative = np.concatenate(([0.0], np.cumsum((power[1:] + power[:-1]) / 2 * np.diff(seconds))))
+        energy_j += np.interp(ends, seconds, cumulative) - np.interp(starts, seconds, cumulative)
+    return energy_j
@@ -1,20 +1,31 @@
 import os
+import sys
 import json
-from datetime import datetime
+import sqlite3
+import subprocess
 from pprint import pprint
-from tabulate import tabulate
-import requests
-import pandas as pd
 import psutil
-from cpuinfo import get_cpu_info
-import GPUtil
 import logging
-from CPU_monitor import IntelPowerGadget, Amd_Power_Log
-import csv
-from art import *
-
-
-def get_system_specs():
+from CPU_monitor import Amd_Power_Log, create_cpu_power_logger, rapl_available
+from attribution import ATTRIBUTION_FILE, load_attribution
+from gpu_sensors import gpu_names
+from hardware_cache import cached_system_specs
+from carbon_intensity import carbon_intensity_index
+from cpu_spec_index import cpu_spec_index
+from carbon_accounting import account_run, intel_log_start_time, intensity_at, IntensitySeries
+from phases import PHASES_FILE, load_phases, phase_energy
+from self_overhead import OVERHEAD_FILE, load_overhead, add_helper_overhead
+from memory_energy import MEMORY_ENERGY_FILE, MEMORY_ENERGY_LOG, load_memory_energy
+from cpu_power_model import POWER_MODEL_LOG
+from power_tiers import tier_summary, remove_tiers
+from results_store import record_run
+from electricity_maps import ElectricityMapsClient
+# pandas, requests, tabulate, cpuinfo and art are imported where they are used, so starting
+# ProcessC for a short model run does not pay for loading them
+
+
+def detect_system_specs():
+    from cpuinfo import get_cpu_info
     # CPU info
     cpu_info = get_cpu_info()
     cpu_codename = cpu_info.get('brand_raw', 'Unknown CPU')
@@ -23,10 +34,10 @@ def get_system_specs():
     ram_info = psutil.virtual_memory()
     ram_size_gb = ram_info.total / (1024 ** 3)  # Convert bytes to GB
 
-    # GPU info
-    gpus = GPUtil.getGPUs()
+    # GPU info, read through NVML handles so nvidia-smi is not spawned
+    gpus = gpu_names()
     if gpus:
-        gpu_info = gpus[0].name
+        gpu_info = gpus[0]
     else:
         gpu_info = 'No GPU found'
 
@@ -37,6 +48,13 @@ def get_system_specs():
     }
 
 
+def get_system_specs():
+    """
+    Returns the CPU, RAM and GPU specs, detected once per boot and then read from hardware_cache.json.
+    """
+    return cached_system_specs(detect_system_specs)
+
+
 def is_config_available(config_path):
     """
     Check if the local configuration file is available.
@@ -100,22 +118,17 @@ def select_project(projects):
             print("Invalid input. Please enter a number.")
 
 
-def get_past_carbon_intensity_electricity_maps(api_token, start, end):
-    url = "https://api.electricitymap.org/v3/carbon-intensity/past"
-    headers = {
-        'auth-token': api_token
-    }
-    params = {
-        'start': start,
-        'end': end
-    }
+def get_past_carbon_intensity_electricity_maps(api_token, start, end, zone=None):
+    """
+    Returns the hourly grid carbon intensity between start and end from Electricity Maps.
 
-    response = requests.get(url, headers=headers, params=params)
+    Hours fetched before are read from the local cache; see ElectricityMapsClient.
 
-    if response.status_code == 200:
-        return response.json()['data']['carbonIntensity']
-    else:
-        response.raise_for_status()
+    Returns:
+        list: {'datetime', 'carbonIntensity'} records in time order.
+    """
+    with ElectricityMapsClient(api_token, zone=zone) as client:
+        return client.carbon_intensity_history(start, end)
     # # Example usage
     # api_token = 'your_api_token_here'
     # zone = 'DE'
@@ -130,15 +143,17 @@ def get_past_carbon_intensity_electricity_maps(api_token, start, end):
     #     print(f"An error occurred: {err}")
 
 
-def get_carbon_intensity_ourworlddata(entity, year, carbon_intensity_df):
-    # Filter the DataFrame based on the entity and year
-    result = carbon_intensity_df[
-        (carbon_intensity_df['Entity'] == entity) & (carbon_intensity_df['Year'] == year)]
+def get_carbon_intensity_ourworlddata(entity, year, carbon_intensity_df=None):
+    """
+    Returns the OurWorldData grid carbon intensity of a country or region in gCO2/kWh.
 
-    if not result.empty:
-        return result['Carbon intensity of electricity - gCO2/kWh'].values[0]
-    else:
-        return None
+    The lookup goes through the cached CarbonIntensityIndex; years missing from the table are
+    interpolated. carbon_intensity_df is no longer needed and only kept for existing callers.
+
+    Returns:
+        float: The intensity, or None if the entity is not in the table.
+    """
+    return carbon_intensity_index().lookup(entity, year)
 
 
 def extract_model_from_cpu_string(cpu_string):
@@ -169,32 +184,25 @@ def get_tdp(cpu_string, csv_path):
     Returns:
         float: The TDP value of the CPU, or None if not found.
     """
-    try:
-        # Extract the model number from the CPU string
-        model = extract_model_from_cpu_string(cpu_string)
-        if not model:
-            print(f"No model number found in CPU string: {cpu_string}")
-            return None
+    spec = get_cpu_spec(cpu_string, csv_path)
+    if spec is None or spec.tdp_w is None:
+        print(f"No matching CPU found for: {cpu_string}")
+        return None
+    return spec.tdp_w
 
-        # Load the CSV file into a pandas DataFrame
-        df = pd.read_csv(csv_path)
 
-        # Print the DataFrame columns for debugging
-        print("CSV Columns:", df.columns)
+def get_cpu_spec(cpu_string, csv_path=None):
+    """
+    Resolves a CPU string to its row in the AMD spec databases through the cached model index.
 
-        # Filter the DataFrame to find the row that contains the model number in the 'CPU' column
-        matching_row = df[df['Name'].str.contains(model, case=False, na=False)]
+    Args:
+        cpu_string (str): The CPU string to search for.
+        csv_path (str): Restrict the search to one spec CSV; both are searched by default.
 
-        if not matching_row.empty:
-            # Extract the TDP value from the matching row
-            tdp_value = int(matching_row['Default TDP'].values[0].replace('W', ''))
-            return tdp_value
-        else:
-            print(f"No matching CPU found for model: {model}")
-            return None
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        return None
+    Returns:
+        CpuSpec: The TDP, cTDP range, cores and threads of the best match, or None if not found.
+    """
+    return cpu_spec_index().resolve(cpu_string, source=csv_path)
 
 
 def create_new_project():
@@ -265,8 +273,14 @@ def create_new_project():
                     cpu_tdp = int(input("Input the default TDP manually here, numbers only."))
                 ans = int(input('Instance was created using the server CPU from the Cloud Computing provider? 1:Yes, 2:No'))
                 if ans == 1:
-                    server_usage_ratio = float(input(
-                        'please input the ratio of the cores used over the total number of cores'))
+                    spec = get_cpu_spec(cpu_info, './database/AMD_server_processor_spec.csv')
+                    if spec is not None and spec.threads:
+                        # a cloud instance sees its vCPUs, i.e. its share of the hardware threads
+                        server_usage_ratio = min(1.0, psutil.cpu_count(logical=True) / spec.threads)
+                        print(f"Using {server_usage_ratio:.3f} of the {spec.threads} threads of {spec.name}")
+                    else:
+                        server_usage_ratio = float(input(
+                            'please input the ratio of the cores used over the total number of cores'))
                     cpu_tdp = round(server_usage_ratio*cpu_tdp,2)
 
 
@@ -283,8 +297,7 @@ def create_new_project():
             if intensity_choice == 1:
                 desired_year = int(input("Please inform the desired year"))
                 # ourworlddata only has country wide data, not regional
-                carbon_intensity_df = pd.read_csv('./database/carbon-intensity-electricity.csv')
-                grid_carbon_intensity = get_carbon_intensity_ourworlddata(country, desired_year, carbon_intensity_df)
+                grid_carbon_intensity = get_carbon_intensity_ourworlddata(country, desired_year)
                 break
             elif intensity_choice == 2:
                 Electricitymaps_sub = input("Paid subscription available?: yes/no")
@@ -337,6 +350,7 @@ def check_internet_connection():
     Returns:
     bool: True if internet is available, False otherwise.
     """
+    import requests
     try:
         requests.get("http://www.google.com", timeout=5)
         return True
@@ -355,6 +369,7 @@ def get_location():
     Returns:
     tuple: (region, country) based on the IP location, or manual input if no internet.
     """
+    import requests
     if check_internet_connection():
         try:
             response = requests.get("http://ip-api.com/json/")
@@ -379,55 +394,32 @@ def is_float(value):
         return False
 
 
-def parse_gpu_power_csv(file_path='gpu_power_log.csv'):
+def parse_gpu_power_csv_per_gpu(file_path='gpu_power_log.csv'):
     """
-    Parses the GPU power CSV file and returns the cumulative power.draw in kWh.
+    Parses the GPU power CSV file and integrates every GPU separately over its timestamps.
 
     Args:
         file_path (str): The path to the CSV file.
 
     Returns:
-        float: The cumulative power.draw in kWh.
+        tuple: A dict of the energy of each GPU index in kWh, and the total over all GPUs in kWh.
     """
-    total_power_draw_watt = 0.0
-    count = 0
-    start_timestamp = None
-    end_timestamp = None
-
-    with open(file_path, mode='r') as file:
-        csv_reader = csv.DictReader(file)
-        headers = csv_reader.fieldnames
+    from log_parsers import load_gpu_power_log, integrate_gpu_power
+    per_gpu_kwh = integrate_gpu_power(load_gpu_power_log(file_path))
+    return per_gpu_kwh, sum(per_gpu_kwh.values())
 
-        for row in csv_reader:
-            # Strip leading and trailing spaces from the keys and values, handling None values
-            row = {key.strip(): value.strip() if value is not None else value for key, value in row.items()}
 
-            # Extract power.draw and timestamp values
-            power_draw_str = row.get('power.draw', '').strip()
-            timestamp_str = row.get('timestamp', '').strip()
-
-            if is_float(power_draw_str) and timestamp_str:
-                power_draw_watt = float(power_draw_str)
-                timestamp = datetime.strptime(timestamp_str, '%Y-%m-%d %H:%M:%S.%f')
-
-                total_power_draw_watt += power_draw_watt
-                count += 1
-
-                if start_timestamp is None:
-                    start_timestamp = timestamp
-                end_timestamp = timestamp
-
-    if count == 0:
-        return 0.0  # Return 0 if there are no valid power draw entries
+def parse_gpu_power_csv(file_path='gpu_power_log.csv'):
+    """
+    Parses the GPU power CSV file and returns the cumulative power.draw in kWh.
 
-    # Calculate average power draw
-    average_power_draw_watt = total_power_draw_watt / count
-    # Calculate total duration in hours
-    total_duration_hours = (end_timestamp - start_timestamp).total_seconds() / 3600
-    # Calculate cumulative energy in kWh
-    cumulative_energy_kwh = average_power_draw_watt * total_duration_hours / 1000
+    Args:
+        file_path (str): The path to the CSV file.
 
-    return cumulative_energy_kwh
+    Returns:
+        float: The cumulative power.draw in kWh, summed over all GPUs.
+    """
+    return parse_gpu_power_csv_per_gpu(file_path)[1]
 
 
 def save_config(config, config_path):
@@ -488,23 +480,42 @@ def start_monitor(desired_project):
     log_file_path = "intel_power_gadget_log.csv"
     output_dir = "."
     logger = logging.getLogger(__name__)
-    if 'amd' in setting['cpu_info'].lower():
-        cpu_monitor = Amd_Power_Log(setting['cpu_info'], setting['cpu_TDP'], setting['process_based_model_dir'], setting['process_based_model_cmd'],
-                                    setting['monitoring_mode'], setting['process_running_name'], setting['detecting_interval'])
+    # the wrapped run writes a fresh attribution summary; never reuse the one of a previous run
+    for stale_file in (ATTRIBUTION_FILE, PHASES_FILE, OVERHEAD_FILE, MEMORY_ENERGY_FILE, MEMORY_ENERGY_LOG,
+                       POWER_MODEL_LOG):
+        if os.path.isfile(stale_file):
+            os.remove(stale_file)
+    # power tiers are read before the raw logs, a run writing none must not report old ones
+    remove_tiers(log_file_path)
+    remove_tiers('gpu_power_log.csv')
+    # RAPL counters are read directly on Linux for both Intel and AMD packages
+    use_rapl = sys.platform.lower().startswith('linux') and rapl_available()
+    if 'amd' in setting['cpu_info'].lower() and not use_rapl:
+        # projects store cpu_tdp and the wrapping settings as create_new_project writes them; older ones cpu_TDP
+        wrapping = setting['model_wrapping_settings']
+        cpu_tdp = float(setting.get('cpu_tdp') or setting.get('cpu_TDP'))
+        cpu_monitor = Amd_Power_Log(setting['cpu_info'], cpu_tdp, wrapping['process_based_model_dir'],
+                                    wrapping['process_based_model_cmd'], setting['monitoring_mode'],
+                                    wrapping['process_running_name'], wrapping['detecting_interval'])
         amd_cpu_usage, duration = cpu_monitor.amd_monitor_usage()
         return amd_cpu_usage, duration
     else:
-        if setting['monitoring_mode'] == 'bash mode':
-            cmd_to_monitor = 'Python bash_mode.py ' + desired_project
-        else:
-            cmd_to_monitor = "Python direct_mode.py " + desired_project
+        script = 'bash_mode.py' if setting['monitoring_mode'] == 'bash mode' else 'direct_mode.py'
+        if use_rapl:
+            # the sampling engine of the wrapped run logs RAPL itself, on the same clock as the GPU
+            subprocess.run([sys.executable, script, desired_project])
+            print(f"Log file created at: {os.path.join(output_dir, log_file_path)}")
+            return None, None
+        cmd_to_monitor = f'"{sys.executable}" {script} ' + desired_project
         try:
-            gadget = IntelPowerGadget(output_dir=output_dir,
-                                      log_file_name=log_file_path)
+            gadget = create_cpu_power_logger(output_dir=output_dir,
+                                             log_file_name=log_file_path)
 
             gadget.start_logging(cmd_to_monitor)
             # time.sleep(2)  # Wait for user input to stop logging
             gadget.stop_logging()
+            # the wrapped script measured its own overhead; PowerLog, its parent, is added to it
+            add_helper_overhead('PowerLog', getattr(gadget, 'cpu_time_sec', 0.0))
             print(f"Log file created at: {gadget._log_file_path}")
             return None, None
         except Exception as e:
@@ -556,38 +567,175 @@ def calculate_ram_power_usage(ram_gb, duration_sec):
 #     print(f'Total carbon emission for running the model is {total_emission} g/CO2 Eq\n '
 #           f'under grid carbon intensity of {grid_carbon_intensity}')
 
-def res_gen(project_setting_val, project_name_val, cpu_usage, total_elapsed_time_sec):
+def grid_intensity_series(project_setting_val):
+    """
+    Returns the hourly intensity series of a project, a local file or a stored Electricity Maps list,
+    or None when the project uses a constant grid_carbon_intensity.
+    """
+    intensity_series = project_setting_val.get('grid_carbon_intensity_file')
+    if intensity_series is None and isinstance(project_setting_val['grid_carbon_intensity'], list):
+        intensity_series = project_setting_val['grid_carbon_intensity']
+    return intensity_series
+
+
+def compute_run_metrics(project_setting_val, project_name_val, cpu_usage, total_elapsed_time_sec, output_dir='.'):
+    """
+    Computes the energy and emission metrics of one monitored run from the logs in output_dir.
+
+    Args:
+        project_setting_val (dict): The project settings, for the grid carbon intensity and
+            subtract_monitor_overhead.
+        project_name_val (str): The project or run name shown in the table.
+        cpu_usage (float): The CPU energy in kWh when it was estimated from the TDP, or None to
+            read it from the Intel power log.
+        total_elapsed_time_sec (float): The run duration, used together with cpu_usage.
+        output_dir (str): The directory holding the logs and the attribution summary of the run.
+
+    Returns:
+        list: [metric, value] rows in the order of the result table.
+    """
     # Parse the power log
     if cpu_usage is None:
-        cumulative_processor_energy_kwh, total_elapsed_time_sec = parse_intel_power_log()
+        cumulative_processor_energy_kwh, total_elapsed_time_sec = parse_intel_power_log(
+            os.path.join(output_dir, 'intel_power_gadget_log.csv'))
     else:
         cumulative_processor_energy_kwh = cpu_usage
         total_elapsed_time_sec = total_elapsed_time_sec
 
-    # parse the power usage from the graphic card log
-    gpu_kwh = parse_gpu_power_csv()
+    # charge the model only with its process tree's share of the package energy
+    attribution = load_attribution(os.path.join(output_dir, ATTRIBUTION_FILE))
+    system_cpu_energy_kwh = cumulative_processor_energy_kwh
+    cpu_scale = 1.0
+    if attribution is not None:
+        cpu_scale = attribution['energy_share']
+
+    # the CPU energy ProcessC spent observing, by its share of the busy CPU time
+    overhead = load_overhead(os.path.join(output_dir, OVERHEAD_FILE))
+    overhead_kwh = system_cpu_energy_kwh * overhead['overhead_share'] if overhead is not None else None
+    # an attributed share already leaves out the monitor, which is not in the model's process tree
+    if overhead is not None and attribution is None and project_setting_val.get('subtract_monitor_overhead'):
+        cpu_scale = 1.0 - overhead['overhead_share']
+    cumulative_processor_energy_kwh = system_cpu_energy_kwh * cpu_scale
+
+    # parse the power usage from the graphic card log; concurrent batch runs log the GPU once per batch
+    gpu_log_path = os.path.join(output_dir, 'gpu_power_log.csv')
+    gpu_tiers = tier_summary(gpu_log_path)
+    if os.path.isfile(gpu_log_path):
+        gpu_kwh = parse_gpu_power_csv(gpu_log_path)
+    elif gpu_tiers is not None:
+        # the raw log was not kept; every tier holds its exact energy
+        gpu_kwh = gpu_tiers['energy_j'] / 3.6e6
+    else:
+        gpu_kwh = 0.0
 
-    # RAM info and power usage
-    ram_info = psutil.virtual_memory()
-    ram_size_gb = round(ram_info.total / (1024 ** 3), 0)  # Convert bytes to GB
-    ram_power_usage = calculate_ram_power_usage(ram_size_gb, total_elapsed_time_sec)
+    # the memory energy sampled from the model's resident set and RAPL DRAM; runs without a
+    # process tree to follow are charged for the installed RAM
+    memory = load_memory_energy(os.path.join(output_dir, MEMORY_ENERGY_FILE))
+    if memory is not None:
+        ram_power_usage = memory['energy_j'] / 3.6e6
+    else:
+        ram_info = psutil.virtual_memory()
+        ram_size_gb = round(ram_info.total / (1024 ** 3), 0)  # Convert bytes to GB
+        ram_power_usage = calculate_ram_power_usage(ram_size_gb, total_elapsed_time_sec)
 
     # Total energy and emission
     total_energy = gpu_kwh + cumulative_processor_energy_kwh + ram_power_usage
     grid_carbon_intensity = project_setting_val['grid_carbon_intensity']
-    total_emission = grid_carbon_intensity * total_energy
+    # an hourly series, from a local file or stored from Electricity Maps, is joined with the logs
+    intensity_series = grid_intensity_series(project_setting_val)
+    if intensity_series is not None:
+        accounting = account_run(intensity_series, total_elapsed_time_sec, output_dir=output_dir,
+                                 cpu_energy_kwh=cumulative_processor_energy_kwh if cpu_usage is not None else None,
+                                 cpu_scale=cpu_scale,
+                                 ram_energy_kwh=ram_power_usage, attribution=attribution,
+                                 output_path=os.path.join(output_dir, 'carbon_timeline.csv'))
+        total_emission = accounting['emission_g']
+        grid_carbon_intensity = accounting['average_intensity']
+    else:
+        total_emission = grid_carbon_intensity * total_energy
 
     # Prepare data for the table
     table_data = [
         ["Project_name", project_name_val],
         ["Elapsed Time (seconds)", total_elapsed_time_sec],
         ["CPU Energy (kWh)", cumulative_processor_energy_kwh],
+    ]
+    if attribution is not None:
+        table_data += [
+            ["CPU Energy, Whole System (kWh)", system_cpu_energy_kwh],
+            ["Model Process Tree CPU Share", attribution['cpu_share']],
+        ]
+    if overhead_kwh is not None:
+        table_data.append(["Monitor Overhead CPU Energy (kWh)", overhead_kwh])
+    if memory is not None:
+        table_data.append(["Model Peak Resident Memory (GB)", memory['peak_rss_bytes'] / (1024 ** 3)])
+    table_data += [
         ["GPU Energy (kWh)", gpu_kwh],
         ["RAM Power Usage (kWh)", ram_power_usage],
         ["Total Energy Usage (kWh)", total_energy],
         ["Grid Carbon Intensity (g/CO2 Eq)", grid_carbon_intensity],
         ["Total Carbon Emission (g/CO2 Eq)", total_emission]
     ]
+    return table_data
+
+
+def compute_phase_metrics(project_setting_val, cpu_usage, total_elapsed_time_sec, output_dir='.'):
+    """
+    Computes the energy and emission of each model phase recorded from the phase markers.
+
+    Args:
+        project_setting_val (dict): The project settings, for the grid carbon intensity and the
+            report_resolution in seconds, the widest power tier bucket the phases may be split at.
+        cpu_usage (float): The CPU energy in kWh when it was estimated from the TDP, or None to
+            read it from the Intel power log.
+        total_elapsed_time_sec (float): The run duration, used together with cpu_usage.
+        output_dir (str): The directory holding the logs, the attribution summary and the phases.
+
+    Returns:
+        list: One row per phase in the order of the phase table, or None without recorded phases.
+    """
+    phases = load_phases(os.path.join(output_dir, PHASES_FILE))
+    if not phases:
+        return None
+    intel_log_path = os.path.join(output_dir, 'intel_power_gadget_log.csv')
+    attribution = load_attribution(os.path.join(output_dir, ATTRIBUTION_FILE))
+    if cpu_usage is None:
+        _, total_elapsed_time_sec = parse_intel_power_log(intel_log_path)
+    memory = load_memory_energy(os.path.join(output_dir, MEMORY_ENERGY_FILE))
+    if memory is not None and memory['duration_sec']:
+        ram_power_w = memory['energy_j'] / memory['duration_sec']
+    else:
+        ram_power_w = 3 * round(psutil.virtual_memory().total / (1024 ** 3), 0) / 8
+    # the sampling engine writes the RAPL log on the clock of the phase markers; other power
+    # logs are aligned through their start time
+    start_time = None
+    if cpu_usage is None and not (sys.platform.lower().startswith('linux') and rapl_available()):
+        start_time = intel_log_start_time(intel_log_path, attribution)
+    cpu_power_w = cpu_usage * 3.6e6 / total_elapsed_time_sec if cpu_usage is not None and total_elapsed_time_sec \
+        else None
+    breakdown = phase_energy(phases, output_dir=output_dir,
+                             cpu_scale=attribution['energy_share'] if attribution is not None else 1.0,
+                             ram_power_w=ram_power_w, start_time=start_time, cpu_power_w=cpu_power_w,
+                             resolution=project_setting_val.get('report_resolution'))
+
+    grid_carbon_intensity = project_setting_val['grid_carbon_intensity']
+    intensity_series = grid_intensity_series(project_setting_val)
+    if intensity_series is not None:
+        intensity_series = IntensitySeries(intensity_series)
+    rows = []
+    for phase, recorded in zip(breakdown, (phase for phase in phases if phase['end_time'] is not None)):
+        energy_kwh = phase['cpu_kwh'] + phase['gpu_kwh'] + phase['ram_kwh']
+        intensity = grid_carbon_intensity if intensity_series is None else \
+            intensity_at(intensity_series, (recorded['start_time'] + recorded['end_time']) / 2)
+        rows.append([phase['name'], phase['duration_sec'], phase['cpu_kwh'], phase['gpu_kwh'], phase['ram_kwh'],
+                     energy_kwh, intensity, energy_kwh * intensity if intensity is not None else None])
+    return rows
+
+
+def res_gen(project_setting_val, project_name_val, cpu_usage, total_elapsed_time_sec):
+    import pandas as pd
+    from tabulate import tabulate
+    table_data = compute_run_metrics(project_setting_val, project_name_val, cpu_usage, total_elapsed_time_sec)
 
     # Print the table
     print(tabulate(table_data, headers=["Metric", "Value"], tablefmt="grid"))
@@ -598,35 +746,42 @@ def res_gen(project_setting_val, project_name_val, cpu_usage, total_elapsed_time
     # Save the DataFrame to a CSV file
     df.to_csv('./monitoring_output/' + project_name_val + '.csv', index=False)
 
+    # per-phase breakdown when the project defines phase markers
+    phase_rows = compute_phase_metrics(project_setting_val, cpu_usage, total_elapsed_time_sec)
+    if phase_rows:
+        headers = ["Phase", "Duration (seconds)", "CPU Energy (kWh)", "GPU Energy (kWh)", "RAM Power Usage (kWh)",
+                   "Total Energy Usage (kWh)", "Grid Carbon Intensity (g/CO2 Eq)", "Carbon Emission (g/CO2 Eq)"]
+        print(tabulate(phase_rows, headers=headers, tablefmt="grid"))
+        pd.DataFrame(phase_rows, columns=headers).to_csv(
+            './monitoring_output/' + project_name_val + '_phases.csv', index=False)
+
+    # the CSVs above hold the latest run only; the results database keeps every run
+    attribution = load_attribution(ATTRIBUTION_FILE)
+    try:
+        record_run(project_name_val, table_data, phase_rows,
+                   started_at=attribution.get('start_time') if attribution is not None else None)
+    except sqlite3.Error as e:
+        print(f'Could not store the run in the results database: {e}')
+
 
 def parse_intel_power_log(file_path='intel_power_gadget_log.csv'):
     """
-    Parses the Intel Power Gadget log CSV file and returns the final Cumulative Processor Energy_0 (kWh) and Total Elapsed Time (sec).
+    Parses the Intel Power Gadget log CSV file and returns the final Cumulative Processor Energy (kWh) and Total Elapsed Time (sec).
+
+    Only the summary footer is read, by seeking backwards from the end of the file. The processor
+    energy is summed over all packages (Cumulative Processor Energy_0, _1, ...).
 
     Args:
         file_path (str): The path to the CSV file.
 
     Returns:
-        tuple: A tuple containing the final Cumulative Processor Energy_0 (kWh) and Total Elapsed Time (sec).
+        tuple: A tuple containing the final Cumulative Processor Energy (kWh) and Total Elapsed Time (sec).
     """
-    cumulative_processor_energy_mwh = 0.0
-    total_elapsed_time_sec = 0.0
-
-    with open(file_path, mode='r') as file:
-        for line in file:
-            line = line.strip()
-            # print(f"Processing line: {line}")  # Print each line for debugging\
-            if 'Total Elapsed Time (sec)' in line:
-                try:
-                    total_elapsed_time_sec = float(line.split('=')[-1].strip())
-                except ValueError as e:
-                    print(f"Error parsing Total Elapsed Time (sec): {e}")
-
-            if 'Cumulative Processor Energy_0 (mWh)' in line:
-                try:
-                    cumulative_processor_energy_mwh = float(line.split('=')[-1].strip())
-                except ValueError as e:
-                    print(f"Error parsing Cumulative Processor Energy_0 (mWh): {e}")
+    from log_parsers import read_intel_power_log_footer
+    footer = read_intel_power_log_footer(file_path)
+    total_elapsed_time_sec = footer.get('Total Elapsed Time (sec)', 0.0)
+    cumulative_processor_energy_mwh = sum(value for key, value in footer.items()
+                                          if key.startswith('Cumulative Processor Energy_') and key.endswith('(mWh)'))
 
     # Convert cumulative processor energy from mWh to kWh
     cumulative_processor_energy_kwh = cumulative_processor_energy_mwh / 1_000_000
@@ -649,6 +804,7 @@ def print_existing_projects(projects):
 
 
 def print_welcome():
+    from art import tprint
     tprint('ProcessC beta 1.0 @McGill')
 
 
@@ -0,0 +1,244 @@
+import os
+import json
+import logging
+
+import psutil
+
+from sampling_engine import Sensor
+from attribution import PROC_ROOT, proc_tree_pids
+from sample_log import SampleLogWriter, ENERGY_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+MEMORY_ENERGY_FILE = 'memory_energy.json'
+MEMORY_ENERGY_LOG = 'memory_energy_log.bin'
+# the installed-RAM estimate main.calculate_ram_power_usage applies, here per GB resident
+RAM_WATTS_PER_GB = 3 / 8
+_GB = 1024 ** 3
+
+
+def rapl_dram_energy_reader():
+    """
+    Returns a callable giving the cumulative RAPL DRAM energy in Joules, or None without a DRAM domain.
+    """
+    from rapl_monitor import discover_rapl_domains
+    domains = discover_rapl_domains(kinds=('dram',))
+    if not domains:
+        return None
+    return lambda: sum(domain.update() for domain in domains)
+
+
+class _MeminfoReader:
+    """The memory in use machine-wide, from a /proc/meminfo descriptor kept open."""
+
+    def __init__(self, proc_root=PROC_ROOT):
+        self._fd = os.open(f'{proc_root}/meminfo', os.O_RDONLY)
+
+    def used_bytes(self):
+        values = {}
+        for line in os.pread(self._fd, 8192, 0).split(b'\n'):
+            if line.startswith((b'MemTotal:', b'MemAvailable:')):
+                key, value = line.split(b':')
+                values[key] = int(value.split()[0]) * 1024
+        return values[b'MemTotal'] - values.get(b'MemAvailable', 0)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class MemoryEnergySensor(Sensor):
+    """
+    Engine sensor integrating the memory power of the model process tree over the run.
+
+    Each read sums the resident set of the tree from /proc/<pid>/statm, whose descriptors are kept
+    open so a read costs one pread per process; the tree itself is walked again only every
+    `tree_period` reads. Pages shared between processes of the tree are counted once per process.
+    The resident set is turned into power with watts_per_gb and integrated with the trapezoidal
+    rule. Where RAPL exposes a DRAM domain, its energy is split by the tree's share of the memory
+    in use machine-wide and reported instead of the modelled energy. Without /proc the resident
+    set is read through psutil. With a log_path the cumulative energy is appended to a binary
+    sample log on every read, so it can be split at phase boundaries later. At close the totals
+    are written to summary_path.
+    """
+
+    name = 'memory_energy'
+    fields = ('rss_bytes', 'power_w', 'energy_j')
+
+    def __init__(self, root_pid, period=1, tree_period=10, watts_per_gb=RAM_WATTS_PER_GB, summary_path=None,
+                 dram_energy_reader=None, proc_root=PROC_ROOT, log_path=None):
+        self.root_pid = root_pid
+        self.period = period
+        self.tree_period = tree_period
+        self.watts_per_gb = watts_per_gb
+        self.summary_path = summary_path
+        self.dram_energy_reader = dram_energy_reader
+        self.proc_root = proc_root
+        self.log_path = log_path
+        self._log = None
+        self._page_size = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+        self._reset()
+
+    def _reset(self):
+        self.start_time = self.end_time = None
+        self.duration_sec = 0.0
+        self.rss_gb_seconds = 0.0
+        self.peak_rss_bytes = 0
+        self.model_energy_j = 0.0
+        self.dram_energy_j = None
+        self.attributed_dram_energy_j = None
+        self._fds = {}
+        self._handles = {}
+        self._reads = 0
+        self._meminfo = None
+        self._previous = None
+
+    def _refresh_tree(self):
+        pids = proc_tree_pids(self.root_pid, self.proc_root)
+        if pids is None:
+            self._refresh_handles()
+            return
+        for pid in self._fds.keys() - pids:
+            os.close(self._fds.pop(pid))
+        for pid in pids - self._fds.keys():
+            try:
+                self._fds[pid] = os.open(f'{self.proc_root}/{pid}/statm', os.O_RDONLY)
+            except OSError:
+                continue
+
+    def _refresh_handles(self):
+        try:
+            root = self._handles.get(self.root_pid) or psutil.Process(self.root_pid)
+            processes = [root] + root.children(recursive=True)
+        except psutil.Error:
+            processes = []
+        self._handles = {process.pid: self._handles.get(process.pid, process) for process in processes}
+
+    def tree_rss(self):
+        """
+        Returns the resident bytes of the process tree, walking the tree every tree_period calls.
+        """
+        if self._reads % self.tree_period == 0:
+            self._refresh_tree()
+        self._reads += 1
+        pages = 0
+        for pid, fd in list(self._fds.items()):
+            try:
+                pages += int(os.pread(fd, 128, 0).split()[1])
+            except (OSError, IndexError, ValueError):
+                # the process exited; its descriptor now reads nothing or fails
+                os.close(self._fds.pop(pid))
+        total = pages * self._page_size
+        for pid, handle in list(self._handles.items()):
+            try:
+                total += handle.memory_info().rss
+            except psutil.Error:
+                del self._handles[pid]
+        return total
+
+    def _sample(self, timestamp):
+        rss = self.tree_rss()
+        dram = self.dram_energy_reader() if self.dram_energy_reader is not None else None
+        share = None
+        if dram is not None:
+            used = self._meminfo.used_bytes() if self._meminfo is not None else 0
+            share = min(1.0, rss / used) if used > 0 else 0.0
+        return timestamp, rss, dram, share
+
+    def open(self, engine):
+        self._reset()
+        if self.dram_energy_reader is not None:
+            try:
+                self._meminfo = _MeminfoReader(self.proc_root)
+            except OSError:
+                # without the machine-wide memory in use the DRAM energy cannot be split
+                self.dram_energy_reader = None
+        self._previous = self._sample(engine.start_wall)
+        self.start_time = self.end_time = engine.start_wall
+        if self._previous[2] is not None:
+            self.dram_energy_j = self.attributed_dram_energy_j = 0.0
+        self.peak_rss_bytes = self._previous[1]
+        if self.log_path is not None:
+            self._log = SampleLogWriter(self.log_path, ENERGY_COLUMNS, 'memory_energy')
+            self._log.write((engine.start_wall, 0.0))
+
+    def _record(self, timestamp):
+        previous, current = self._previous, self._sample(timestamp)
+        self._previous = current
+        dt = timestamp - previous[0]
+        self.end_time = timestamp
+        self.peak_rss_bytes = max(self.peak_rss_bytes, current[1])
+        if dt <= 0:
+            return current[1], self.watts_per_gb * current[1] / _GB, self.energy_j
+        rss_gb_seconds = (previous[1] + current[1]) / 2 / _GB * dt
+        self.duration_sec += dt
+        self.rss_gb_seconds += rss_gb_seconds
+        self.model_energy_j += self.watts_per_gb * rss_gb_seconds
+        power_w = self.watts_per_gb * current[1] / _GB
+        if current[2] is not None:
+            delta = current[2] - previous[2]
+            self.dram_energy_j += delta
+            self.attributed_dram_energy_j += delta * (previous[3] + current[3]) / 2
+            power_w = delta * current[3] / dt
+        if self._log is not None:
+            self._log.write((timestamp, self.energy_j))
+        return current[1], power_w, self.energy_j
+
+    @property
+    def energy_j(self):
+        """The memory energy of the tree so far: the attributed DRAM energy where measured, else the model's."""
+        return self.attributed_dram_energy_j if self.attributed_dram_energy_j is not None else self.model_energy_j
+
+    def read(self, timestamp, elapsed):
+        return [self._record(timestamp)]
+
+    def close(self, timestamp, elapsed):
+        self._record(timestamp)
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds = {}
+        self._handles = {}
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if self._meminfo is not None:
+            self._meminfo.close()
+            self._meminfo = None
+        if self.summary_path is not None:
+            with open(self.summary_path, 'w') as file:
+                json.dump(self.summary(), file, indent=4)
+
+    def summary(self):
+        """
+        Summarises the run so far.
+
+        Returns:
+            dict: The energy in Joules and its source, 'rapl_dram' or 'rss_model', the integral of
+            the resident set in GB seconds, so the energy can be recomputed under another
+            watts_per_gb, the mean and peak resident bytes, and the DRAM energy measured
+            machine-wide and attributed to the tree, None without a DRAM domain.
+        """
+        return {
+            'root_pid': self.root_pid,
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'duration_sec': self.duration_sec,
+            'source': 'rapl_dram' if self.attributed_dram_energy_j is not None else 'rss_model',
+            'energy_j': self.energy_j,
+            'watts_per_gb': self.watts_per_gb,
+            'rss_gb_seconds': self.rss_gb_seconds,
+            'mean_rss_bytes': self.rss_gb_seconds / self.duration_sec * _GB if self.duration_sec else 0.0,
+            'peak_rss_bytes': self.peak_rss_bytes,
+            'model_energy_j': self.model_energy_j,
+            'dram_energy_j': self.dram_energy_j,
+            'attributed_dram_energy_j': self.attributed_dram_energy_j,
+        }
+
+
+def load_memory_energy(file_path=MEMORY_ENERGY_FILE):
+    """
+    Loads the summary written by MemoryEnergySensor, or None if the run did not sample memory.
+    """
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return json.load(file)
@@ -0,0 +1,173 @@
+import os
+import json
+import logging
+import datetime
+import threading
+
+logger = logging.getLogger(__name__)
+
+PHASES_FILE = 'model_phases.json'
+
+
+def phase_markers(wrapping_settings):
+    """
+    Returns the phase markers of a project as an ordered list of (name, marker) pairs.
+
+    model_wrapping_settings['phase_markers'] is either a list of {"name", "marker"} objects or
+    an object mapping phase names to markers in phase order.
+    """
+    markers = wrapping_settings.get('phase_markers') or []
+    if isinstance(markers, dict):
+        return list(markers.items())
+    return [(entry['name'], entry['marker']) for entry in markers]
+
+
+class PhaseRecorder:
+    """
+    Records the start of each model phase on the sampling engine clock.
+
+    A phase lasts until the next phase starts or finish() is called, e.g. on the end key string.
+    A marker of the phase already running is ignored, so a model printing its marker every epoch
+    records one phase; returning to a phase after another one starts it again. The phases are
+    written to model_phases.json with wall-clock and engine elapsed times.
+    """
+
+    def __init__(self, engine, file_path=PHASES_FILE):
+        self.engine = engine
+        self.file_path = file_path
+        self.phases = []
+        self._lock = threading.Lock()
+        self._finished = False
+
+    def mark(self, name):
+        """Starts the named phase unless it is running, closing the current one; starts the engine if needed."""
+        self.engine.start()
+        timestamp, elapsed = self.engine.now()
+        with self._lock:
+            if self._finished:
+                return
+            if self.phases and self.phases[-1]['end_time'] is None and self.phases[-1]['name'] == name:
+                return
+            self._close_current(timestamp, elapsed)
+            self.phases.append({'name': name, 'start_time': timestamp, 'start_elapsed': elapsed,
+                                'end_time': None, 'end_elapsed': None})
+        logger.info(f"Model phase {name} started")
+
+    def _close_current(self, timestamp, elapsed):
+        if self.phases and self.phases[-1]['end_time'] is None:
+            self.phases[-1]['end_time'] = timestamp
+            self.phases[-1]['end_elapsed'] = elapsed
+
+    def finish(self):
+        """Ends the current phase and writes the phases file; later calls do nothing."""
+        with self._lock:
+            if self._finished:
+                return
+            self._finished = True
+            if self.engine.start_monotonic is not None:
+                self._close_current(*self.engine.now())
+            phases = list(self.phases)
+        if phases:
+            with open(self.file_path, 'w') as file:
+                json.dump(phases, file, indent=4)
+
+    def callbacks(self, markers):
+        """
+        Returns the marker to function list mapping for output_pipeline.pump.
+        """
+        return {marker: [lambda name=name: self.mark(name)] for name, marker in markers}
+
+
+def load_phases(file_path=PHASES_FILE):
+    """
+    Loads the phases recorded by the monitoring run, or None if there are none.
+    """
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+def _tier_resolution(log_path, resolution):
+    from power_tiers import available_tiers, select_tier
+    # the raw log is read unless a resolution is asked for, or it was not kept
+    if resolution is None and not os.path.isfile(log_path) and available_tiers(log_path):
+        return available_tiers(log_path)[0][0]
+    if resolution is not None and select_tier(log_path, resolution) is not None:
+        return resolution
+    return None
+
+
+def phase_energy(phases, output_dir='.', cpu_scale=1.0, ram_power_w=0.0, start_time=None, cpu_power_w=None,
+                 resolution=None):
+    """
+    Splits the CPU, GPU and RAM energy of a run at the phase boundaries.
+
+    The cumulative energy of each log is interpolated at all boundaries in one vectorised call,
+    so the cost is one pass over each log however many phases there are. The modelled CPU energy
+    and the memory energy are split the same way from the cumulative energy logs of their
+    sensors; the constant powers are only used for runs that did not write them.
+
+    Args:
+        phases (list): The phases from load_phases.
+        output_dir (str): The directory holding the logs of the run.
+        cpu_scale (float): The share of the logged CPU energy charged to the model.
+        ram_power_w (float): The RAM power estimate, for runs without a memory energy log.
+        start_time (float): The epoch time of elapsed zero of the Intel log; phase wall times are
+            converted with it. By default the phases' own engine elapsed times are used.
+        cpu_power_w (float): A constant CPU power, e.g. from the TDP, used instead of the Intel log;
+            the CPU power model log is read instead when the run wrote one.
+        resolution (float): Reads the coarsest power tier no wider than this many seconds instead
+            of the raw logs. The finest tier is used anyway for a raw log that was not kept.
+
+    Returns:
+        list: One dict per phase with the duration in seconds and the CPU, GPU and RAM energy in kWh.
+    """
+    import numpy as np
+    from log_parsers import load_intel_power_log, intel_energy_between, load_gpu_power_log, gpu_energy_between, \
+        energy_log_between
+    from power_tiers import tier_energy_between
+    from cpu_power_model import POWER_MODEL_LOG
+    from memory_energy import MEMORY_ENERGY_LOG
+
+    phases = [phase for phase in phases if phase['end_time'] is not None]
+    starts = np.array([phase['start_time'] for phase in phases])
+    ends = np.array([phase['end_time'] for phase in phases])
+    if start_time is None:
+        elapsed_starts = np.array([phase['start_elapsed'] for phase in phases])
+        elapsed_ends = np.array([phase['end_elapsed'] for phase in phases])
+    else:
+        elapsed_starts, elapsed_ends = starts - start_time, ends - start_time
+
+    cpu_j = np.zeros(len(phases))
+    intel_log_path = os.path.join(output_dir, 'intel_power_gadget_log.csv')
+    intel_resolution = _tier_resolution(intel_log_path, resolution)
+    model_log_path = os.path.join(output_dir, POWER_MODEL_LOG)
+    if cpu_power_w is not None and os.path.isfile(model_log_path):
+        cpu_j = energy_log_between(model_log_path, starts, ends) * cpu_scale
+    elif cpu_power_w is not None:
+        cpu_j = (ends - starts) * cpu_power_w * cpu_scale
+    elif intel_resolution is not None:
+        # tiers are on the epoch clock
+        cpu_j = tier_energy_between(intel_log_path, starts, ends, intel_resolution) * cpu_scale
+    elif os.path.isfile(intel_log_path):
+        cpu_j = intel_energy_between(load_intel_power_log(intel_log_path), elapsed_starts, elapsed_ends) * cpu_scale
+    gpu_j = np.zeros(len(phases))
+    gpu_log_path = os.path.join(output_dir, 'gpu_power_log.csv')
+    gpu_resolution = _tier_resolution(gpu_log_path, resolution)
+    if gpu_resolution is not None:
+        gpu_j = tier_energy_between(gpu_log_path, starts, ends, gpu_resolution)
+    elif os.path.isfile(gpu_log_path):
+        # the GPU log holds naive local timestamps
+        local = [np.datetime64(datetime.datetime.fromtimestamp(t)) for t in np.concatenate((starts, ends))]
+        gpu_j = gpu_energy_between(load_gpu_power_log(gpu_log_path), local[:len(phases)], local[len(phases):])
+    durations = ends - starts
+    memory_log_path = os.path.join(output_dir, MEMORY_ENERGY_LOG)
+    if os.path.isfile(memory_log_path):
+        ram_j = energy_log_between(memory_log_path, starts, ends)
+    else:
+        ram_j = durations * ram_power_w
+
+    return [{'name': phase['name'], 'duration_sec': float(duration), 'cpu_kwh': float(cpu) / 3.6e6,
+             'gpu_kwh': float(gpu) / 3.6e6, 'ram_kwh': float(ram) / 3.6e6}
+            for phase, duration, cpu, gpu, ram in zip(phases, durations, cpu_j, gpu_j, ram_j)]
@@ -0,0 +1,353 @@
+import os
+import math
+import glob
+import logging
+import argparse
+
+from sample_log import SampleLogWriter, is_sample_log, read_header, open_sample_log
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIERS = (1, 60, 3600)
+# every tier but the coarsest keeps only its latest buckets, 6 hours at 1 s and 15 days at 1 min;
+# the energy of older buckets lives on in the coarser tiers
+TIER_RETENTION = 21600
+TIER_COLUMNS = ('start', 'end', 'duration_sec', 'energy_j', 'min_power_w', 'max_power_w', 'mean_power_w')
+_TIER_SUFFIX = 's.tier'
+
+
+def tier_path(log_path, width):
+    """
+    Returns the file of one tier of a power log, e.g. intel_power_gadget_log.60s.tier.
+    """
+    root, _ = os.path.splitext(log_path)
+    return f'{root}.{width:g}{_TIER_SUFFIX}'
+
+
+def tier_widths(widths):
+    """
+    Validates tier widths: positive, increasing, and each a whole multiple of the previous one,
+    so every bucket of a tier lies inside one bucket of the next.
+
+    Args:
+        widths: Bucket widths in seconds, or True for DEFAULT_TIERS.
+
+    Returns:
+        tuple: The widths as floats.
+    """
+    if widths is True:
+        widths = DEFAULT_TIERS
+    widths = tuple(float(width) for width in widths)
+    if not widths or widths[0] <= 0:
+        raise ValueError("Tier widths must be positive")
+    for finer, coarser in zip(widths, widths[1:]):
+        ratio = coarser / finer
+        if abs(ratio - round(ratio)) > 1e-9 or round(ratio) < 2:
+            raise ValueError(f"Tier width {coarser:g} s is not a multiple of {finer:g} s")
+    return widths
+
+
+class TierCompactor:
+    """
+    Rolls energy intervals into tiers of fixed-width buckets while they are being measured.
+
+    Buckets are aligned to multiples of their width in epoch seconds. Each bucket stores the time
+    it covers, the exact energy of the intervals in it, the lowest and highest interval power and
+    the mean power. An interval crossing a bucket boundary of the finest tier is split in
+    proportion to time; a closed bucket is passed on to the next coarser tier, so every tier holds
+    the same total energy as the raw samples. Each tier is appended to its own sample_log file, so
+    a crash loses at most the open buckets.
+
+    Every tier but the coarsest is bounded: once it spans twice `retention` buckets it is rewritten
+    with about the latest `retention`, cut at a bucket boundary of the next tier, so its file stays
+    small however long the run. tier_records fills the dropped time in from the coarser tiers.
+    """
+
+    def __init__(self, log_path, widths=DEFAULT_TIERS, kind='power', metadata=None, flush_interval=5.0,
+                 retention=TIER_RETENTION):
+        self.log_path = log_path
+        self.widths = tier_widths(widths)
+        self.retention = retention
+        self.flush_interval = flush_interval
+        self._metadata = dict(metadata or {}, source=kind)
+        # a tier of another width left by an earlier run would be mistaken for part of this one
+        remove_tiers(log_path, keep=self.widths)
+        self._writers = [self._open_writer(width) for width in self.widths]
+        self._rows = [0] * len(self.widths)
+        # the seconds each bounded tier keeps: at least one bucket of the next tier, so everything
+        # it drops lies in closed coarser buckets
+        self._keep_sec = [max(retention * width, coarser) if retention is not None else None
+                          for width, coarser in zip(self.widths, self.widths[1:])] + [None]
+        # per tier: [bucket index, start, end, covered seconds, energy, min power, max power]
+        self._buckets = [None] * len(self.widths)
+
+    def _open_writer(self, width):
+        return SampleLogWriter(tier_path(self.log_path, width), TIER_COLUMNS, 'power_tier',
+                               dict(self._metadata, width=width), flush_interval=self.flush_interval)
+
+    def add(self, start, end, energy_j):
+        """
+        Adds the energy measured between two epoch times; intervals must come in time order.
+        """
+        if end <= start:
+            return
+        power = energy_j / (end - start)
+        width = self.widths[0]
+        remaining = energy_j
+        while start < end:
+            boundary = (math.floor(start / width) + 1) * width
+            if boundary <= start:
+                boundary += width
+            piece_end = min(end, boundary)
+            # the last piece takes the remainder, so the pieces sum to the interval exactly
+            energy = remaining if piece_end >= end else power * (piece_end - start)
+            remaining -= energy
+            self._add(0, start, piece_end, piece_end - start, energy, power, power)
+            start = piece_end
+
+    def _add(self, level, start, end, duration, energy, low, high):
+        index = math.floor((start + end) / 2 / self.widths[level])
+        bucket = self._buckets[level]
+        if bucket is not None and bucket[0] != index:
+            self._emit(level)
+            bucket = None
+        if bucket is None:
+            self._buckets[level] = [index, start, end, duration, energy, low, high]
+            return
+        bucket[1] = min(bucket[1], start)
+        bucket[2] = max(bucket[2], end)
+        bucket[3] += duration
+        bucket[4] += energy
+        bucket[5] = min(bucket[5], low)
+        bucket[6] = max(bucket[6], high)
+
+    def _emit(self, level):
+        _, start, end, duration, energy, low, high = self._buckets[level]
+        self._buckets[level] = None
+        self._writers[level].write((start, end, duration, energy, low, high,
+                                    energy / duration if duration > 0 else 0.0))
+        self._rows[level] += 1
+        if level + 1 < len(self.widths):
+            self._add(level + 1, start, end, duration, energy, low, high)
+            keep_sec = self._keep_sec[level]
+            if keep_sec is not None and self._rows[level] * self.widths[level] > 2 * keep_sec:
+                self._roll(level, end)
+
+    def _roll(self, level, end):
+        import numpy as np
+        coarser = self.widths[level + 1]
+        cut = math.floor((end - self._keep_sec[level]) / coarser) * coarser
+        self._writers[level + 1].flush()
+        self._writers[level].close()
+        data = open_sample_log(tier_path(self.log_path, self.widths[level]))[1]
+        # a copy, so the memory map is released before the file is truncated
+        kept = np.array(data[data['start'] >= cut])
+        del data
+        self._writers[level] = self._open_writer(self.widths[level])
+        for row in kept.tolist():
+            self._writers[level].write(row)
+        self._rows[level] = len(kept)
+
+    def close(self):
+        """Writes the open buckets, finest first so they reach the coarser tiers, and closes the files."""
+        for level in range(len(self.widths)):
+            if self._buckets[level] is not None:
+                self._emit(level)
+        for writer in self._writers:
+            writer.close()
+        self._writers = []
+
+
+def available_tiers(log_path):
+    """
+    Returns the tiers written next to a power log.
+
+    Returns:
+        list: (width in seconds, file path) pairs, finest first.
+    """
+    root, _ = os.path.splitext(log_path)
+    tiers = []
+    for path in glob.glob(glob.escape(root) + '.*' + _TIER_SUFFIX):
+        if is_sample_log(path):
+            tiers.append((float(read_header(path)[0]['width']), path))
+    return sorted(tiers)
+
+
+def remove_tiers(log_path, keep=()):
+    """
+    Deletes the tiers of a power log, except those of the widths in keep; readers prefer tiers,
+    so a run that writes none must not leave those of an earlier run in place.
+    """
+    for width, path in available_tiers(log_path):
+        if width not in keep:
+            os.remove(path)
+
+
+def select_tier(log_path, resolution=None):
+    """
+    Picks the coarsest tier whose buckets are no wider than the requested resolution.
+
+    Args:
+        log_path (str): The raw power log the tiers belong to; it need not exist.
+        resolution (float): The widest acceptable bucket in seconds; None for the coarsest tier,
+            which is enough for totals.
+
+    Returns:
+        tuple: (width, file path), or None when no tier is fine enough.
+    """
+    tiers = available_tiers(log_path)
+    if resolution is not None:
+        tiers = [tier for tier in tiers if tier[0] <= resolution]
+    return tiers[-1] if tiers else None
+
+
+def tier_records(log_path, resolution=None):
+    """
+    Returns the buckets of the whole run from the tier select_tier picks.
+
+    A bounded tier only holds its latest buckets; the time before its first bucket is taken from
+    the next coarser tier, whose buckets there hold exactly the energy that was dropped.
+
+    Returns:
+        numpy.ndarray: A record array with the TIER_COLUMNS, times in epoch seconds, or None when
+        no tier is fine enough. It is a zero-copy memory map when the tier was never trimmed.
+    """
+    import numpy as np
+    tier = select_tier(log_path, resolution)
+    if tier is None:
+        return None
+    tiers = available_tiers(log_path)
+    parts = []
+    for _, path in tiers[tiers.index(tier):]:
+        data = open_sample_log(path)[1]
+        if parts:
+            data = data[data['end'] <= parts[-1]['start'][0]]
+        if len(data):
+            parts.append(data)
+    if len(parts) <= 1:
+        return parts[0] if parts else open_sample_log(tier[1])[1]
+    return np.concatenate(parts[::-1])
+
+
+def tier_summary(log_path):
+    """
+    Returns the totals of a power log from its coarsest tier.
+
+    Returns:
+        dict: energy_j, the first start and last end in epoch seconds and the start_time of the
+        run from the tier header, or None without tiers.
+    """
+    tier = select_tier(log_path)
+    if tier is None:
+        return None
+    header, data = open_sample_log(tier[1])
+    return {
+        'energy_j': float(data['energy_j'].sum()) if len(data) else 0.0,
+        'start': float(data['start'][0]) if len(data) else None,
+        'end': float(data['end'][-1]) if len(data) else None,
+        'start_time': header.get('start_time'),
+    }
+
+
+def iter_tier_energy(log_path, resolution=None, scale=1.0, chunk_rows=65536):
+    """
+    Streams the buckets of the tier select_tier picks like carbon_accounting.iter_intel_energy.
+
+    Yields:
+        tuple: (bucket start, bucket end, energy in Joules), times in epoch seconds.
+    """
+    data = tier_records(log_path, resolution)
+    if data is None:
+        return
+    for chunk_start in range(0, len(data), chunk_rows):
+        chunk = data[chunk_start:chunk_start + chunk_rows]
+        for start, end, energy in chunk[['start', 'end', 'energy_j']].tolist():
+            yield start, end, energy * scale
+
+
+def tier_energy_between(log_path, starts, ends, resolution=None):
+    """
+    Returns the energy between each pair of epoch times from the tier select_tier picks.
+
+    The energy of a bucket is spread evenly over the time it covers, like
+    log_parsers.intel_energy_between interpolates within a sampling interval.
+
+    Returns:
+        numpy.ndarray: The energy of each interval in Joules.
+    """
+    import numpy as np
+    data = tier_records(log_path, resolution)
+    if not len(data):
+        return np.zeros(len(starts))
+    cumulative = np.cumsum(data['energy_j'])
+    times = np.column_stack((data['start'], data['end'])).ravel()
+    energy = np.column_stack((cumulative - data['energy_j'], cumulative)).ravel()
+    return np.interp(ends, times, energy) - np.interp(starts, times, energy)
+
+
+def _is_gpu_log(log_path):
+    if is_sample_log(log_path):
+        return read_header(log_path)[0]['kind'] == 'gpu'
+    with open(log_path, 'r') as file:
+        return 'power.draw' in file.readline()
+
+
+def _merge_ticks(intervals):
+    # the GPUs of one tick are logged one after the other with the same timestamp
+    current = None
+    for start, end, energy in intervals:
+        if current is not None and end == current[1]:
+            current = (min(current[0], start), end, current[2] + energy)
+            continue
+        if current is not None:
+            yield current
+        current = (start, end, energy)
+    if current is not None:
+        yield current
+
+
+def raw_intervals(log_path, attribution=None):
+    """
+    Streams the energy intervals of a raw Intel or GPU power log, GPUs summed per sample time.
+
+    Yields:
+        tuple: (interval start, interval end, energy in Joules), times in epoch seconds.
+    """
+    from carbon_accounting import iter_intel_energy, iter_gpu_energy, intel_log_start_time
+    if _is_gpu_log(log_path):
+        return _merge_ticks(iter_gpu_energy(log_path))
+    return iter_intel_energy(log_path, intel_log_start_time(log_path, attribution))
+
+
+def compact_log(log_path, widths=DEFAULT_TIERS, attribution=None, retention=TIER_RETENTION):
+    """
+    Builds the tiers of a raw power log after the fact, e.g. for runs made without power_tiers.
+    """
+    gpu = _is_gpu_log(log_path)
+    metadata = {}
+    if not gpu:
+        from carbon_accounting import intel_log_start_time
+        metadata['start_time'] = intel_log_start_time(log_path, attribution)
+    compactor = TierCompactor(log_path, widths, 'gpu' if gpu else 'intel', metadata, retention=retention)
+    try:
+        for start, end, energy in raw_intervals(log_path, attribution):
+            compactor.add(start, end, energy)
+    finally:
+        compactor.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compact Intel and GPU power logs into energy-preserving tiers.')
+    parser.add_argument('logs', nargs='+')
+    parser.add_argument('--tiers', type=float, nargs='+', default=list(DEFAULT_TIERS),
+                        help='bucket widths in seconds, each a multiple of the previous one')
+    parser.add_argument('--retention', type=int, default=TIER_RETENTION,
+                        help='buckets kept by every tier but the coarsest, 0 to keep all')
+    args = parser.parse_args()
+    for log_path in args.logs:
+        compact_log(log_path, args.tiers, retention=args.retention or None)
+        print(f"{log_path}: {', '.join(path for _, path in available_tiers(log_path))}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+import os
+import abc
+import time
+import errno
+import select
+import socket
+import struct
+import logging
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+PROC_ROOT = '/proc'
+# the kernel truncates /proc/<pid>/comm to TASK_COMM_LEN - 1 characters
+COMM_LENGTH = 15
+# a freshly forked child still carries its parent's comm until it calls exec,
+# so new PIDs are re-read for this long before their comm is trusted
+EXEC_GRACE_SEC = 1.0
+
+# netlink proc connector constants (linux/connector.h, linux/cn_proc.h)
+NETLINK_CONNECTOR = 11
+CN_IDX_PROC = 1
+CN_VAL_PROC = 1
+NLMSG_DONE = 3
+PROC_CN_MCAST_LISTEN = 1
+PROC_CN_MCAST_IGNORE = 2
+PROC_EVENT_EXEC = 0x00000002
+PROC_EVENT_COMM = 0x00000200
+PROC_EVENT_EXIT = 0x80000000
+
+_NLMSGHDR = struct.Struct('=IHHII')
+_CN_MSG = struct.Struct('=IIIIHH')
+_PROC_EVENT = struct.Struct('=IIQ')
+_EVENT_PIDS = struct.Struct('=ii')
+_COMM_EVENT = struct.Struct('=ii16s')
+
+ProcessEvent = namedtuple('ProcessEvent', ['pid', 'name', 'timestamp'])
+
+
+def _read_comm(pid, proc_root=PROC_ROOT):
+    try:
+        with open(f'{proc_root}/{pid}/comm', 'rb') as file:
+            return file.read().rstrip(b'\n').decode(errors='replace')
+    except OSError:
+        return None
+
+
+def _name_matches(pid, comm, process_name, proc_root=PROC_ROOT):
+    """
+    Compares a comm value against the process name psutil would report.
+
+    Names longer than the comm limit are confirmed against the executable in the command line.
+    """
+    if comm is None:
+        return False
+    if comm == process_name:
+        return True
+    if len(comm) == COMM_LENGTH and process_name.startswith(comm):
+        try:
+            with open(f'{proc_root}/{pid}/cmdline', 'rb') as file:
+                executable = file.read().split(b'\0', 1)[0].decode(errors='replace')
+        except OSError:
+            return False
+        return os.path.basename(executable) == process_name
+    return False
+
+
+def _pid_exists(pid, proc_root=PROC_ROOT):
+    return os.path.exists(f'{proc_root}/{pid}')
+
+
+class ProcessWatcher(abc.ABC):
+    """
+    Base class of the process start/exit detectors used by direct mode.
+
+    Subclasses implement wait_for_start; exit detection uses a pidfd where the kernel offers one
+    and falls back to polling for the PID otherwise.
+    """
+
+    def __init__(self, interval=0.1, proc_root=PROC_ROOT):
+        self.interval = interval
+        self.proc_root = proc_root
+
+    @abc.abstractmethod
+    def wait_for_start(self, process_name, timeout=None):
+        """
+        Blocks until a process with the given name is running.
+
+        Args:
+            process_name (str): The name of the process as psutil reports it.
+            timeout (float): Seconds to wait before giving up, or None to wait forever.
+
+        Returns:
+            ProcessEvent: The detected process and its wall-clock start time, or None on timeout.
+        """
+
+    def find_running(self, process_name):
+        """Returns the PID of a running process with the given name, or None."""
+        for entry in os.listdir(self.proc_root):
+            if entry.isdigit() and _name_matches(entry, _read_comm(entry, self.proc_root), process_name,
+                                                 self.proc_root):
+                return int(entry)
+        return None
+
+    def wait_for_exit(self, pid, timeout=None):
+        """
+        Blocks until the process exits.
+
+        Args:
+            pid (int): The process to wait for.
+            timeout (float): Seconds to wait before giving up, or None to wait forever.
+
+        Returns:
+            ProcessEvent: The process and its wall-clock exit time, or None on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if hasattr(os, 'pidfd_open'):
+            try:
+                fd = os.pidfd_open(pid)
+            except ProcessLookupError:
+                return ProcessEvent(pid, None, time.time())
+            except OSError:
+                fd = None
+            if fd is not None:
+                try:
+                    # a pidfd becomes readable when the process terminates, so this sleeps in the kernel
+                    poller = select.poll()
+                    poller.register(fd, select.POLLIN)
+                    wait_ms = None if deadline is None else max(0, int((deadline - time.monotonic()) * 1000))
+                    if poller.poll(wait_ms):
+                        return ProcessEvent(pid, None, time.time())
+                    return None
+                finally:
+                    os.close(fd)
+        while _pid_exists(pid, self.proc_root):
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.interval)
+        return ProcessEvent(pid, None, time.time())
+
+    def close(self):
+        pass
+
+
+class ProcScanWatcher(ProcessWatcher):
+    """
+    Detects processes by listing /proc and reading comm only for PIDs not seen before.
+
+    The PID to comm cache is kept between ticks, so a tick on a busy node costs one listdir
+    plus a handful of small reads instead of a psutil.Process object per PID.
+    """
+
+    def __init__(self, interval=0.1, proc_root=PROC_ROOT):
+        super().__init__(interval, proc_root)
+        self._known = {}
+
+    def _scan(self, process_name):
+        now = time.monotonic()
+        current = [entry for entry in os.listdir(self.proc_root) if entry.isdigit()]
+        # prune before matching, a tick that finds the process returns early
+        for entry in self._known.keys() - set(current):
+            del self._known[entry]
+        for entry in current:
+            cached = self._known.get(entry)
+            if cached is None or now - cached[1] < EXEC_GRACE_SEC:
+                comm = _read_comm(entry, self.proc_root)
+                self._known[entry] = (comm, now if cached is None else cached[1])
+            else:
+                comm = cached[0]
+            if _name_matches(entry, comm, process_name, self.proc_root):
+                return int(entry)
+        return None
+
+    def wait_for_start(self, process_name, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            pid = self._scan(process_name)
+            if pid is not None:
+                return ProcessEvent(pid, process_name, time.time())
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.interval)
+
+
+class ProcConnectorWatcher(ProcessWatcher):
+    """
+    Event-driven detector on the netlink process connector.
+
+    The kernel pushes an event for every exec and exit, timestamped on CLOCK_MONOTONIC, so even
+    processes shorter than the detecting interval are seen. Subscribing needs CAP_NET_ADMIN.
+    """
+
+    def __init__(self, interval=0.1, proc_root=PROC_ROOT):
+        super().__init__(interval, proc_root)
+        self._socket = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_CONNECTOR)
+        try:
+            self._socket.bind((0, CN_IDX_PROC))
+            self._send_control(PROC_CN_MCAST_LISTEN)
+        except OSError:
+            self._socket.close()
+            raise
+
+    def _send_control(self, operation):
+        payload = struct.pack('=I', operation)
+        cn_msg = _CN_MSG.pack(CN_IDX_PROC, CN_VAL_PROC, 0, 0, len(payload), 0) + payload
+        header = _NLMSGHDR.pack(_NLMSGHDR.size + len(cn_msg), NLMSG_DONE, 0, 0, os.getpid())
+        self._socket.send(header + cn_msg)
+
+    @staticmethod
+    def _event_wall_time(timestamp_ns):
+        # proc events carry ktime_get_ns(), which is CLOCK_MONOTONIC like time.monotonic_ns()
+        return time.time() - (time.monotonic_ns() - timestamp_ns) / 1e9
+
+    def _events(self, timeout):
+        """Yields (what, pid, tgid, wall time, comm) tuples received within the timeout."""
+        self._socket.settimeout(timeout)
+        try:
+            data = self._socket.recv(65536)
+        except socket.timeout:
+            return
+        except OSError as e:
+            if e.errno == errno.ENOBUFS:
+                # the receive queue overflowed; callers re-check /proc to recover
+                logger.warning("Process connector queue overflowed, events were dropped.")
+                return
+            raise
+        offset = 0
+        while offset + _NLMSGHDR.size <= len(data):
+            length = _NLMSGHDR.unpack_from(data, offset)[0]
+            if length < _NLMSGHDR.size:
+                break
+            event_offset = offset + _NLMSGHDR.size + _CN_MSG.size
+            if event_offset + _PROC_EVENT.size + _EVENT_PIDS.size <= offset + length:
+                what, _, timestamp_ns = _PROC_EVENT.unpack_from(data, event_offset)
+                pid, tgid = _EVENT_PIDS.unpack_from(data, event_offset + _PROC_EVENT.size)
+                comm = None
+                if what == PROC_EVENT_COMM and event_offset + _PROC_EVENT.size + _COMM_EVENT.size <= offset + length:
+                    # comm events carry the new name, which survives a process that already exited
+                    raw = _COMM_EVENT.unpack_from(data, event_offset + _PROC_EVENT.size)[2]
+                    comm = raw.split(b'\0', 1)[0].decode(errors='replace')
+                yield what, pid, tgid, self._event_wall_time(timestamp_ns), comm
+            offset += (length + 3) & ~3
+
+    def wait_for_start(self, process_name, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        # subscribed already, so nothing can slip between this scan and the event loop
+        pid = self.find_running(process_name)
+        if pid is not None:
+            return ProcessEvent(pid, process_name, time.time())
+        while deadline is None or time.monotonic() < deadline:
+            remaining = 1.0 if deadline is None else max(0.0, min(1.0, deadline - time.monotonic()))
+            for what, pid, tgid, timestamp, comm in self._events(remaining):
+                if what not in (PROC_EVENT_EXEC, PROC_EVENT_COMM) or pid != tgid:
+                    continue
+                if _name_matches(pid, comm or _read_comm(pid, self.proc_root), process_name, self.proc_root):
+                    return ProcessEvent(pid, process_name, timestamp)
+        return None
+
+    def wait_for_exit(self, pid, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while deadline is None or time.monotonic() < deadline:
+            remaining = 0.5 if deadline is None else max(0.0, min(0.5, deadline - time.monotonic()))
+            for what, event_pid, tgid, timestamp, _ in self._events(remaining):
+                if what == PROC_EVENT_EXIT and event_pid == pid and tgid == pid:
+                    return ProcessEvent(pid, None, timestamp)
+            if not _pid_exists(pid, self.proc_root):
+                # the exit event was dropped; fall back to the time the PID was found gone
+                return ProcessEvent(pid, None, time.time())
+        return None
+
+    def close(self):
+        try:
+            self._send_control(PROC_CN_MCAST_IGNORE)
+        except OSError:
+            pass
+        self._socket.close()
+
+
+class PsutilPollWatcher(ProcessWatcher):
+    """
+    Portable detector for platforms without /proc, polling psutil.process_iter.
+
+    Exit detection uses psutil's wait, which blocks on the process handle on Windows.
+    """
+
+    def wait_for_start(self, process_name, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            pid = self.find_running(process_name)
+            if pid is not None:
+                return ProcessEvent(pid, process_name, time.time())
+            if deadline is not None and time.monotonic() >= deadline:
+                return None
+            time.sleep(self.interval)
+
+    def find_running(self, process_name):
+        import psutil
+        for process in psutil.process_iter(['name']):
+            if process.info['name'] == process_name:
+                return process.pid
+        return None
+
+    def wait_for_exit(self, pid, timeout=None):
+        import psutil
+        try:
+            psutil.Process(pid).wait(timeout)
+        except psutil.NoSuchProcess:
+            pass
+        except psutil.TimeoutExpired:
+            return None
+        return ProcessEvent(pid, None, time.time())
+
+
+def create_process_watcher(interval=0.1, proc_root=PROC_ROOT):
+    """
+    Returns the cheapest process watcher this platform and user can run.
+
+    Args:
+        interval (float): The polling interval for the non event-driven backends.
+        proc_root (str): The procfs mount point.
+
+    Returns:
+        ProcessWatcher: The process connector watcher with CAP_NET_ADMIN, the /proc scan
+        watcher otherwise, or the psutil watcher where /proc does not exist.
+    """
+    if hasattr(socket, 'AF_NETLINK') and proc_root == PROC_ROOT:
+        try:
+            return ProcConnectorWatcher(interval, proc_root)
+        except OSError as e:
+            logger.debug(f"Process connector unavailable ({e}), scanning {proc_root} instead.")
+    if os.path.isdir(proc_root) and os.path.exists(os.path.join(proc_root, 'self')):
+        return ProcScanWatcher(interval, proc_root)
+    return PsutilPollWatcher(interval, proc_root)
@@ -0,0 +1,476 @@
+import os
+import re
+import sys
+import time
+import datetime
+import subprocess
+import logging
+
+from sampling_engine import Sensor, SamplingEngine
+from sample_log import SampleLogWriter, intel_columns
+from power_tiers import TierCompactor, remove_tiers
+
+logger = logging.getLogger(__name__)
+
+POWERCAP_ROOT = '/sys/class/powercap'
+HWMON_ROOT = '/sys/class/hwmon'
+PROC_STAT_PATH = '/proc/stat'
+CPUFREQ_GLOB_ROOT = '/sys/devices/system/cpu'
+
+# powercap zones look like intel-rapl:0 (package) and intel-rapl:0:1 (sub-domain of package 0)
+_ZONE_PATTERN = re.compile(r'^intel-rapl:(\d+)(?::(\d+))?$')
+# Intel Power Gadget column prefixes for each RAPL domain kind
+_DOMAIN_COLUMNS = (
+    ('package', 'Processor'),
+    ('core', 'IA'),
+    ('dram', 'DRAM'),
+)
+
+
+def _pread_int(fd):
+    """Read an integer attribute from an already opened sysfs/procfs file descriptor."""
+    return int(os.pread(fd, 64, 0))
+
+
+class RaplDomain:
+    """
+    A single energy counter (one powercap zone or one amd_energy input).
+
+    The counter is kept open so every tick costs a single pread. Energy is accumulated in
+    Joules, with counter wraparound handled through max_energy_range_uj.
+    """
+
+    def __init__(self, package, kind, energy_path, max_energy_range_uj=None):
+        self.package = package
+        self.kind = kind
+        self.energy_path = energy_path
+        self.max_energy_range_uj = max_energy_range_uj
+        self._fd = os.open(energy_path, os.O_RDONLY)
+        self._last_uj = None
+        self.energy_j = 0.0
+
+    def read_uj(self):
+        return _pread_int(self._fd)
+
+    def update(self):
+        """
+        Reads the counter and adds the energy spent since the previous read.
+
+        Returns:
+            float: The accumulated energy in Joules.
+        """
+        value = self.read_uj()
+        if self._last_uj is not None:
+            delta = value - self._last_uj
+            if delta < 0:
+                # the counter wrapped around; without a known range treat it as a reset
+                delta = delta + self.max_energy_range_uj if self.max_energy_range_uj else value
+            self.energy_j += delta / 1e6
+        self._last_uj = value
+        return self.energy_j
+
+    def reset(self):
+        self._last_uj = None
+        self.energy_j = 0.0
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+def _read_text(path):
+    with open(path, 'r') as file:
+        return file.read().strip()
+
+
+def _discover_powercap(powercap_root):
+    domains = []
+    if not os.path.isdir(powercap_root):
+        return domains
+    zone_names = {}
+    for entry in sorted(os.listdir(powercap_root)):
+        match = _ZONE_PATTERN.match(entry)
+        if not match:
+            continue
+        zone_dir = os.path.join(powercap_root, entry)
+        energy_path = os.path.join(zone_dir, 'energy_uj')
+        if not os.path.exists(energy_path):
+            continue
+        try:
+            name = _read_text(os.path.join(zone_dir, 'name'))
+        except OSError:
+            continue
+        zone_names[entry] = name
+        if name.startswith('package-'):
+            package, kind = int(name.split('-')[-1]), 'package'
+        elif name in ('core', 'dram', 'uncore'):
+            parent = zone_names.get('intel-rapl:' + match.group(1), '')
+            package = int(parent.split('-')[-1]) if parent.startswith('package-') else int(match.group(1))
+            kind = name
+        else:
+            # psys and other platform-wide zones overlap the package counters
+            continue
+        try:
+            max_range = int(_read_text(os.path.join(zone_dir, 'max_energy_range_uj')))
+        except (OSError, ValueError):
+            max_range = None
+        try:
+            domains.append(RaplDomain(package, kind, energy_path, max_range))
+        except OSError as e:
+            # energy_uj is root-only on kernels patched for PLATYPUS
+            logger.warning(f"Cannot read {energy_path}: {e}")
+    return domains
+
+
+def _core_package(cpu_root, core):
+    try:
+        return int(_read_text(os.path.join(cpu_root, f'cpu{core}', 'topology', 'physical_package_id')))
+    except (OSError, ValueError):
+        return None
+
+
+def _discover_amd_energy(hwmon_root, cpu_root=CPUFREQ_GLOB_ROOT):
+    domains = []
+    if not os.path.isdir(hwmon_root):
+        return domains
+    for entry in sorted(os.listdir(hwmon_root)):
+        hwmon_dir = os.path.join(hwmon_root, entry)
+        try:
+            if _read_text(os.path.join(hwmon_dir, 'name')) != 'amd_energy':
+                continue
+        except OSError:
+            continue
+        for file_name in sorted(os.listdir(hwmon_dir)):
+            if not (file_name.startswith('energy') and file_name.endswith('_input')):
+                continue
+            label_path = os.path.join(hwmon_dir, file_name.replace('_input', '_label'))
+            try:
+                label = _read_text(label_path)
+            except OSError:
+                continue
+            # amd_energy labels are Esocket<N> for packages and Ecore<NNN> for cores;
+            # the driver accumulates them into 64-bit counters, so no wrap range applies
+            if label.startswith('Esocket'):
+                package, kind = int(label[len('Esocket'):]), 'package'
+            elif label.startswith('Ecore'):
+                # a core of an unknown socket is left out rather than charged to the wrong one
+                package, kind = _core_package(cpu_root, int(label[len('Ecore'):])), 'core'
+                if package is None:
+                    continue
+            else:
+                continue
+            try:
+                domains.append(RaplDomain(package, kind, os.path.join(hwmon_dir, file_name)))
+            except OSError as e:
+                logger.warning(f"Cannot read {file_name} of {hwmon_dir}: {e}")
+    return domains
+
+
+def discover_rapl_domains(powercap_root=POWERCAP_ROOT, hwmon_root=HWMON_ROOT, cpu_root=CPUFREQ_GLOB_ROOT,
+                          kinds=None):
+    """
+    Finds the readable RAPL energy counters of the machine.
+
+    The powercap interface is preferred; the amd_energy hwmon driver is only used when powercap
+    does not expose any package counter, so the same energy is never counted twice.
+
+    Args:
+        powercap_root (str): The powercap class directory.
+        hwmon_root (str): The hwmon class directory.
+        cpu_root (str): The CPU devices directory, for the socket of each amd_energy core counter.
+        kinds (tuple): The domain kinds to return, e.g. ('package',); the counters of the other
+            domains are closed. None returns every domain.
+
+    Returns:
+        list: The RaplDomain objects found.
+    """
+    domains = _discover_powercap(powercap_root)
+    if not any(domain.kind == 'package' for domain in domains):
+        for domain in domains:
+            domain.close()
+        domains = _discover_amd_energy(hwmon_root, cpu_root)
+    if kinds is not None:
+        for domain in domains:
+            if domain.kind not in kinds:
+                domain.close()
+        domains = [domain for domain in domains if domain.kind in kinds]
+    return domains
+
+
+def rapl_available(powercap_root=POWERCAP_ROOT, hwmon_root=HWMON_ROOT):
+    """Check whether a RAPL package counter can be read on this machine."""
+    domains = discover_rapl_domains(powercap_root, hwmon_root)
+    available = any(domain.kind == 'package' for domain in domains)
+    for domain in domains:
+        domain.close()
+    return available
+
+
+class _CpuStatReader:
+    """Reads the aggregate CPU utilisation from /proc/stat and the mean cpufreq frequency."""
+
+    def __init__(self, proc_stat_path=PROC_STAT_PATH, cpu_root=CPUFREQ_GLOB_ROOT):
+        try:
+            self._stat_fd = os.open(proc_stat_path, os.O_RDONLY)
+        except OSError:
+            self._stat_fd = None
+        self._freq_fds = []
+        if os.path.isdir(cpu_root):
+            for entry in os.listdir(cpu_root):
+                if not re.match(r'^cpu\d+$', entry):
+                    continue
+                freq_path = os.path.join(cpu_root, entry, 'cpufreq', 'scaling_cur_freq')
+                try:
+                    self._freq_fds.append(os.open(freq_path, os.O_RDONLY))
+                except OSError:
+                    continue
+        self._last = None
+
+    def utilization(self):
+        if self._stat_fd is None:
+            return 0.0
+        line = os.pread(self._stat_fd, 256, 0).split(b'\n', 1)[0]
+        values = [int(value) for value in line.split()[1:]]
+        idle = values[3] + (values[4] if len(values) > 4 else 0)
+        total = sum(values[:8])
+        last, self._last = self._last, (idle, total)
+        if last is None or total == last[1]:
+            return 0.0
+        return 100.0 * (1.0 - (idle - last[0]) / (total - last[1]))
+
+    def frequency_mhz(self):
+        if not self._freq_fds:
+            return 0
+        return sum(_pread_int(fd) for fd in self._freq_fds) // len(self._freq_fds) // 1000
+
+    def close(self):
+        for fd in self._freq_fds + ([self._stat_fd] if self._stat_fd is not None else []):
+            os.close(fd)
+        self._freq_fds = []
+        self._stat_fd = None
+
+
+class RaplEnergySensor(Sensor):
+    """
+    Engine sensor for the RAPL package, core and DRAM counters.
+
+    Writes every sample to an Intel Power Gadget style log, with the same columns and summary
+    footer as PowerLog, so parse_intel_power_log keeps working. With log_format 'binary' the log
+    is a sample_log file with the same numeric columns instead, which the parsers also read.
+    With tiers the package energy is also rolled into power_tiers files as it is measured; with
+    raw_log False only those are kept, so the storage of a long run grows with its duration in
+    seconds rather than in samples.
+    """
+
+    name = 'cpu'
+    fields = ('package_energy_j', 'core_energy_j', 'dram_energy_j')
+
+    def __init__(
+            self,
+            log_file_path: str = "intel_power_gadget_log.csv",
+            powercap_root: str = POWERCAP_ROOT,
+            hwmon_root: str = HWMON_ROOT,
+            proc_stat_path: str = PROC_STAT_PATH,
+            cpu_root: str = CPUFREQ_GLOB_ROOT,
+            period: int = 1,
+            log_format: str = 'csv',
+            tiers=None,
+            raw_log: bool = True,
+    ):
+        self.log_file_path = log_file_path
+        self.period = period
+        self.log_format = log_format
+        self.tiers = tiers
+        self.raw_log = raw_log
+        self._domains = discover_rapl_domains(powercap_root, hwmon_root, cpu_root)
+        if not any(domain.kind == 'package' for domain in self._domains):
+            raise SystemError("No readable RAPL energy counters found in powercap or amd_energy")
+        self._packages = sorted({domain.package for domain in self._domains})
+        self._proc_stat_path = proc_stat_path
+        self._cpu_root = cpu_root
+        self._log_file = None
+        self._compactor = None
+        self._stat_reader = None
+
+    def _totals(self):
+        totals = {(package, kind): 0.0 for package in self._packages for kind, _ in _DOMAIN_COLUMNS}
+        for domain in self._domains:
+            if (domain.package, domain.kind) in totals:
+                totals[(domain.package, domain.kind)] += domain.update()
+        return totals
+
+    def _header(self):
+        columns = ['System Time', 'RDTSC', 'Elapsed Time (sec)', ' CPU Utilization(%)', 'CPU Frequency_0(MHz)']
+        for package in self._packages:
+            for _, label in _DOMAIN_COLUMNS:
+                columns += [f'{label} Power_{package}(Watt)',
+                            f'Cumulative {label} Energy_{package}(Joules)',
+                            f'Cumulative {label} Energy_{package}(mWh)']
+        return ','.join(columns)
+
+    def _row(self, now, elapsed, utilization, frequency, totals, previous, dt):
+        values = [f'{now:%H:%M:%S}:{now.microsecond // 1000:03d}', f' {time.perf_counter_ns()}',
+                  f'{elapsed:9.3f}', f'{utilization:9.3f}', f'{frequency:5d}']
+        for package in self._packages:
+            for kind, _ in _DOMAIN_COLUMNS:
+                energy = totals[(package, kind)]
+                power = (energy - previous[(package, kind)]) / dt if dt > 0 else 0.0
+                values += [f'{power:8.3f}', f'{energy:8.3f}', f'{energy / 3.6:8.3f}']
+        return ','.join(values)
+
+    def _footer(self, elapsed, totals):
+        lines = ['', f'Total Elapsed Time (sec) = {elapsed:.6f}', '']
+        for package in self._packages:
+            for kind, label in _DOMAIN_COLUMNS:
+                energy = totals[(package, kind)]
+                average = energy / elapsed if elapsed > 0 else 0.0
+                lines += [f'Cumulative {label} Energy_{package} (Joules) = {energy:.6f}',
+                          f'Cumulative {label} Energy_{package} (mWh) = {energy / 3.6:.6f}',
+                          f'Average {label} Power_{package} (Watt) = {average:.6f}',
+                          '']
+        return '\n'.join(lines)
+
+    def _sums(self, totals):
+        return tuple(sum(totals[(package, kind)] for package in self._packages) for kind, _ in _DOMAIN_COLUMNS)
+
+    def open(self, engine):
+        for domain in self._domains:
+            domain.reset()
+        self._stat_reader = _CpuStatReader(self._proc_stat_path, self._cpu_root)
+        self._stat_reader.utilization()
+        self._previous = self._totals()
+        self._last_elapsed = None
+        self._last_timestamp = engine.start_wall
+        if self.tiers:
+            self._compactor = TierCompactor(self.log_file_path, self.tiers, 'intel',
+                                            {'start_time': engine.start_wall})
+        else:
+            remove_tiers(self.log_file_path)
+        if not self.raw_log:
+            # a raw log of an earlier run would be read instead of the tiers
+            if os.path.isfile(self.log_file_path):
+                os.remove(self.log_file_path)
+        elif self.log_format == 'binary':
+            start = datetime.datetime.fromtimestamp(engine.start_wall)
+            self._midnight = start.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+            self._log_file = SampleLogWriter(self.log_file_path, intel_columns(self._packages), 'intel',
+                                             {'start_time': engine.start_wall})
+        else:
+            self._log_file = open(self.log_file_path, 'w', newline='')
+            self._log_file.write(self._header() + '\n')
+
+    def _record(self, timestamp, elapsed, utilization, frequency, totals, previous, dt):
+        values = [elapsed, timestamp - self._midnight, time.perf_counter_ns(), utilization, frequency]
+        for package in self._packages:
+            for kind, _ in _DOMAIN_COLUMNS:
+                energy = totals[(package, kind)]
+                values += [(energy - previous[(package, kind)]) / dt if dt > 0 else 0.0, energy]
+        return values
+
+    def _compact(self, timestamp, totals):
+        if self._compactor is not None:
+            self._compactor.add(self._last_timestamp, timestamp,
+                                sum(totals[(package, 'package')] - self._previous[(package, 'package')]
+                                    for package in self._packages))
+
+    def read(self, timestamp, elapsed):
+        totals = self._totals()
+        # the tick at engine start only sets the baseline, PowerLog's first row is one interval in
+        if self._last_elapsed is None:
+            # the cumulative columns and the footer count from open, so the tiers do as well
+            self._compact(timestamp, totals)
+            self._previous, self._last_elapsed, self._last_timestamp = totals, elapsed, timestamp
+        elif elapsed > self._last_elapsed:
+            self._compact(timestamp, totals)
+            if self._log_file is not None and self.log_format == 'binary':
+                self._log_file.write(self._record(timestamp, elapsed, self._stat_reader.utilization(),
+                                                  self._stat_reader.frequency_mhz(), totals, self._previous,
+                                                  elapsed - self._last_elapsed))
+            elif self._log_file is not None:
+                self._log_file.write(self._row(datetime.datetime.fromtimestamp(timestamp), elapsed,
+                                               self._stat_reader.utilization(), self._stat_reader.frequency_mhz(),
+                                               totals, self._previous, elapsed - self._last_elapsed) + '\n')
+            self._previous, self._last_elapsed, self._last_timestamp = totals, elapsed, timestamp
+        return [self._sums(totals)]
+
+    def close(self, timestamp, elapsed):
+        if self._stat_reader is None:
+            return
+        totals = self._totals()
+        interval_left = self._last_elapsed is not None and elapsed > self._last_elapsed
+        # the energy after the last tick is in the footer, so it goes into the tiers as well
+        if interval_left:
+            self._compact(timestamp, totals)
+        if self._compactor is not None:
+            self._compactor.close()
+            self._compactor = None
+        if self._log_file is not None:
+            # the binary log has no footer, readers take the totals from a last record at stop time
+            if self.log_format != 'binary':
+                self._log_file.write(self._footer(elapsed, totals))
+            elif interval_left:
+                self._log_file.write(self._record(timestamp, elapsed,
+                                                  self._stat_reader.utilization(), self._stat_reader.frequency_mhz(),
+                                                  totals, self._previous, elapsed - self._last_elapsed))
+            self._log_file.close()
+            self._log_file = None
+        self._stat_reader.close()
+        self._stat_reader = None
+
+    def close_counters(self):
+        for domain in self._domains:
+            domain.close()
+
+
+class RaplPowerLog:
+    """
+    In-process replacement for IntelPowerGadget on Linux.
+
+    Runs a RaplEnergySensor on its own SamplingEngine every `resolution` milliseconds, with the
+    start_logging/stop_logging interface of IntelPowerGadget.
+    """
+
+    def __init__(
+            self,
+            output_dir: str = ".",
+            resolution: int = 100,
+            log_file_name: str = "intel_power_gadget_log.csv",
+            powercap_root: str = POWERCAP_ROOT,
+            hwmon_root: str = HWMON_ROOT,
+            proc_stat_path: str = PROC_STAT_PATH,
+            cpu_root: str = CPUFREQ_GLOB_ROOT,
+    ):
+        self._log_file_path = os.path.join(output_dir, log_file_name)
+        self._system = sys.platform.lower()
+        self._resolution = resolution
+        self.sensor = RaplEnergySensor(self._log_file_path, powercap_root, hwmon_root, proc_stat_path, cpu_root)
+        self.engine = SamplingEngine([self.sensor], interval=resolution / 1000)
+        self.process = None
+
+    def start_logging(self, cmd=None):
+        """
+        Starts the logging process.
+
+        With a command the call blocks until the command exits, like PowerLog's -cmd option.
+        Without one, sampling continues in the background until stop_logging is called.
+        """
+        self.engine.start()
+        logger.info(f"Started logging to {self._log_file_path}")
+        if cmd is not None:
+            logger.info(f"Executing command: {cmd}")
+            self.process = subprocess.Popen(cmd, shell=True)
+            self.process.wait()
+            self.stop_logging()
+
+    def stop_logging(self):
+        """
+        Stops the logging process and writes the summary footer.
+        """
+        if self.engine.running:
+            self.engine.stop()
+            logger.info("Successfully stopped the RAPL logging thread.")
+
+    def close(self):
+        self.stop_logging()
+        self.sensor.close_counters()
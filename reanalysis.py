@@ -0,0 +1,399 @@
+import os
+import json
+import math
+import heapq
+import bisect
+import hashlib
+import sqlite3
+import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from attribution import ATTRIBUTION_FILE, load_attribution
+from self_overhead import OVERHEAD_FILE, load_overhead
+from cpu_power_model import POWER_MODEL_FILE, load_power_model_summary
+from memory_energy import MEMORY_ENERGY_FILE, RAM_WATTS_PER_GB, load_memory_energy
+from power_tiers import available_tiers, select_tier
+from sample_log import is_sample_log, read_header
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE = 'reanalysis_cache.sqlite'
+# bump when the cached integrals change meaning
+CACHE_VERSION = 2
+# the energy of a log is kept in bins of this width, fine enough for hourly or 15 min intensity data
+BIN_SECONDS = 300
+LOGS = {'intel': 'intel_power_gadget_log.csv', 'gpu': 'gpu_power_log.csv'}
+
+
+def _bin_energy(intervals, width=BIN_SECONDS):
+    # split at bin boundaries in proportion to time; the last piece takes the remainder
+    bins = {}
+    total = 0.0
+    for start, end, energy in intervals:
+        total += energy
+        if end <= start:
+            continue
+        power = energy / (end - start)
+        remaining = energy
+        while start < end:
+            boundary = (math.floor(start / width) + 1) * width
+            if boundary <= start:
+                boundary += width
+            piece_end = min(end, boundary)
+            piece = remaining if piece_end >= end else power * (piece_end - start)
+            remaining -= piece
+            bins[boundary - width] = bins.get(boundary - width, 0.0) + piece
+            start = piece_end
+    return total, sorted(bins.items())
+
+
+def _log_source(log_path):
+    """Returns the file the integrals of a log come from: the raw log, or its tier when it was not kept."""
+    if os.path.isfile(log_path):
+        return log_path
+    tier = select_tier(log_path, BIN_SECONDS) or select_tier(log_path)
+    return tier[1] if tier is not None else None
+
+
+def integrate_log(kind, log_path, attribution=None):
+    """
+    Computes the parameter-independent integrals of one power log.
+
+    Args:
+        kind (str): 'intel' or 'gpu'.
+        log_path (str): The raw log path; its power tiers are read when it was not kept.
+        attribution (dict): The attribution summary of the run, for the start of an Intel log.
+
+    Returns:
+        dict: energy_j in total, the start and end in epoch seconds, elapsed_sec of an Intel log
+        and the energy in BIN_SECONDS bins as [bin start, Joules] pairs.
+    """
+    from power_tiers import raw_intervals, iter_tier_energy, tier_summary
+    from log_parsers import read_intel_power_log_footer
+    from carbon_accounting import intel_log_start_time
+    if os.path.isfile(log_path):
+        intervals = list(raw_intervals(log_path, attribution))
+    else:
+        intervals = list(iter_tier_energy(log_path, BIN_SECONDS if select_tier(log_path, BIN_SECONDS) else None))
+    energy_j, bins = _bin_energy(intervals)
+    integrals = {
+        'energy_j': energy_j,
+        'start': intervals[0][0] if intervals else None,
+        'end': intervals[-1][1] if intervals else None,
+        'bins': bins,
+    }
+    if kind == 'intel':
+        integrals['start_time'] = intel_log_start_time(log_path, attribution)
+        integrals['elapsed_sec'] = read_intel_power_log_footer(log_path).get('Total Elapsed Time (sec)', 0.0)
+    elif not os.path.isfile(log_path) and tier_summary(log_path) is not None:
+        integrals['start'] = tier_summary(log_path)['start']
+    return integrals
+
+
+def _integrate_task(task):
+    kind, log_path, attribution = task
+    return integrate_log(kind, log_path, attribution)
+
+
+def _sha1(file_path):
+    digest = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class IntegralCache:
+    """
+    The integrals of every log seen, keyed by path, size and modification time, then by content.
+
+    A log whose size and mtime are unchanged is not read at all. Otherwise its SHA-1 is computed,
+    so a log that was copied or touched but not changed is still not parsed again. The context,
+    e.g. the start time taken from the attribution summary, is part of the key; a log placed in
+    time by its mtime has the mtime in its context, so its integrals are only reused at that mtime.
+    """
+
+    def __init__(self, cache_path=CACHE_FILE):
+        self._db = sqlite3.connect(cache_path)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('CREATE TABLE IF NOT EXISTS log_integrals (path TEXT PRIMARY KEY, size INTEGER, '
+                         'mtime_ns INTEGER, sha1 TEXT, context TEXT, integrals TEXT)')
+        self._db.execute('CREATE INDEX IF NOT EXISTS log_integrals_content ON log_integrals (sha1, context)')
+
+    def close(self):
+        self._db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def lookup(self, source_path, context):
+        """
+        Returns (integrals or None, the key to store fresh integrals under).
+        """
+        stat = os.stat(source_path)
+        path = os.path.abspath(source_path)
+        row = self._db.execute('SELECT size, mtime_ns, sha1, context, integrals FROM log_integrals WHERE path = ?',
+                               (path,)).fetchone()
+        if row is not None and row[:2] == (stat.st_size, stat.st_mtime_ns) and row[3] == context:
+            return json.loads(row[4]), None
+        key = (path, stat.st_size, stat.st_mtime_ns, _sha1(source_path), context)
+        row = self._db.execute('SELECT integrals FROM log_integrals WHERE sha1 = ? AND context = ?',
+                               key[3:]).fetchone()
+        if row is not None:
+            # the same content under another path or mtime
+            self.store([(key, json.loads(row[0]))])
+            return json.loads(row[0]), None
+        return None, key
+
+    def store(self, entries):
+        """Stores (key, integrals) pairs in one transaction."""
+        with self._db:
+            self._db.executemany('INSERT OR REPLACE INTO log_integrals VALUES (?, ?, ?, ?, ?, ?)',
+                                 [key + (json.dumps(integrals),) for key, integrals in entries])
+
+
+def _start_context(kind, log_path, attribution):
+    """
+    Returns what the absolute times of a log's integrals depend on besides its content.
+
+    GPU logs and binary logs carry their own times, but an Intel log is placed in time by the
+    attribution start_time or, failing that, by its modification time, see
+    carbon_accounting.intel_log_start_time; a copied or touched CSV is shifted accordingly.
+    """
+    if kind != 'intel':
+        return None
+    if attribution is not None and attribution.get('start_time'):
+        return attribution['start_time']
+    if not os.path.isfile(log_path) or (is_sample_log(log_path) and read_header(log_path)[0].get('start_time')):
+        return None
+    return ['mtime_ns', os.stat(log_path).st_mtime_ns]
+
+
+def find_runs(root):
+    """
+    Walks a directory tree for run directories: those holding a power log, its tiers or a CPU
+    power model summary.
+
+    Returns:
+        list: The run directories in sorted order.
+    """
+    runs = []
+    for directory, _, files in os.walk(root):
+        files = set(files)
+        if files & set(LOGS.values()) or POWER_MODEL_FILE in files or \
+                any(available_tiers(os.path.join(directory, log)) for log in LOGS.values()):
+            runs.append(directory)
+    return sorted(runs)
+
+
+def collect_integrals(run_dirs, cache_path=CACHE_FILE, workers=None):
+    """
+    Loads the integrals of every log of the runs, parsing only the logs missing from the cache,
+    on a process pool.
+
+    Returns:
+        dict: {run directory: {'intel': integrals, 'gpu': integrals}}, a kind left out when the
+        run has no such log.
+    """
+    integrals = {run_dir: {} for run_dir in run_dirs}
+    tasks, keys, owners = [], [], []
+    with IntegralCache(cache_path) as cache:
+        for run_dir in run_dirs:
+            attribution = load_attribution(os.path.join(run_dir, ATTRIBUTION_FILE))
+            for kind, name in LOGS.items():
+                log_path = os.path.join(run_dir, name)
+                source_path = _log_source(log_path)
+                if source_path is None:
+                    continue
+                context = json.dumps([CACHE_VERSION, kind, _start_context(kind, log_path, attribution)])
+                cached, key = cache.lookup(source_path, context)
+                if cached is not None:
+                    integrals[run_dir][kind] = cached
+                    continue
+                tasks.append((kind, log_path, attribution))
+                keys.append(key)
+                owners.append((run_dir, kind))
+        logger.info(f"{len(tasks)} of {len(tasks) + sum(map(len, integrals.values()))} logs need parsing")
+        if tasks:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_integrate_task, tasks))
+            for (run_dir, kind), result in zip(owners, results):
+                integrals[run_dir][kind] = result
+            cache.store(list(zip(keys, results)))
+    return integrals
+
+
+def _bin_stream(integrals, scale=1.0):
+    for bin_start, energy in integrals['bins']:
+        yield bin_start, bin_start + BIN_SECONDS, energy * scale
+
+
+def _constant_stream(start, end, power_w, step=BIN_SECONDS):
+    while start < end:
+        piece_end = min(end, start + step)
+        yield start, piece_end, power_w * (piece_end - start)
+        start = piece_end
+
+
+def load_intensity_points(source):
+    """
+    Parses an intensity series once, see carbon_accounting.iter_intensity.
+
+    Returns:
+        list: (epoch seconds, gCO2/kWh) tuples in time order.
+    """
+    from carbon_accounting import iter_intensity
+    return list(iter_intensity(source))
+
+
+def recompute_run(run_dir, integrals, grid_carbon_intensity=None, intensity_points=None, ram_gb=None,
+                  ram_watts_per_gb=RAM_WATTS_PER_GB, subtract_monitor_overhead=False):
+    """
+    Recomputes the energy and emission of one run from its cached integrals, like compute_run_metrics.
+
+    Args:
+        run_dir (str): The run directory, for the small attribution, overhead and power model files.
+        integrals (dict): The run's entry of collect_integrals.
+        grid_carbon_intensity (float): A constant intensity in gCO2/kWh.
+        intensity_points (list): An intensity series from load_intensity_points, used instead.
+        ram_gb (float): The installed RAM the RAM power is modelled from, for runs that did not
+            sample the model's memory.
+        ram_watts_per_gb (float): The RAM power model, applied to the sampled resident set of
+            runs that did and measured no DRAM energy.
+        subtract_monitor_overhead (bool): Whether to leave out the monitor's CPU energy, as the
+            project setting of that name does.
+
+    Returns:
+        dict: The metrics under the names of the result table.
+    """
+    from carbon_accounting import asof_emissions, JOULES_PER_KWH
+    attribution = load_attribution(os.path.join(run_dir, ATTRIBUTION_FILE))
+    overhead = load_overhead(os.path.join(run_dir, OVERHEAD_FILE))
+    power_model = load_power_model_summary(os.path.join(run_dir, POWER_MODEL_FILE))
+    memory = load_memory_energy(os.path.join(run_dir, MEMORY_ENERGY_FILE))
+    intel, gpu = integrals.get('intel'), integrals.get('gpu')
+
+    cpu_scale = 1.0
+    if attribution is not None:
+        cpu_scale = attribution['energy_share']
+    elif overhead is not None and subtract_monitor_overhead:
+        cpu_scale = 1.0 - overhead['overhead_share']
+    if intel is not None:
+        cpu_j, elapsed, start = intel['energy_j'], intel['elapsed_sec'], intel['start_time']
+    elif power_model is not None:
+        cpu_j, elapsed = power_model['energy_j'], power_model['duration_sec']
+        start = attribution['start_time'] if attribution is not None and attribution.get('start_time') else None
+    else:
+        cpu_j, elapsed, start = 0.0, None, None
+    if gpu is not None and gpu['start'] is not None:
+        start = gpu['start'] if start is None else start
+        elapsed = gpu['end'] - gpu['start'] if elapsed is None else elapsed
+    elapsed = elapsed or 0.0
+    ram_power_w = ram_watts_per_gb * ram_gb if ram_gb else 0.0
+    ram_start, ram_duration = start, elapsed
+    if memory is not None:
+        ram_j = memory['attributed_dram_energy_j'] if memory['source'] == 'rapl_dram' else \
+            ram_watts_per_gb * memory['rss_gb_seconds']
+        ram_start, ram_duration = memory['start_time'], memory['duration_sec']
+        ram_power_w = ram_j / ram_duration if ram_duration else 0.0
+
+    cpu_kwh = cpu_j * cpu_scale / JOULES_PER_KWH
+    gpu_kwh = gpu['energy_j'] / JOULES_PER_KWH if gpu is not None else 0.0
+    ram_kwh = ram_power_w * ram_duration / JOULES_PER_KWH
+    total_kwh = cpu_kwh + gpu_kwh + ram_kwh
+    if intensity_points and start is not None:
+        streams = [_constant_stream(ram_start, ram_start + ram_duration, ram_power_w)]
+        if intel is not None:
+            streams.append(_bin_stream(intel, cpu_scale))
+        elif elapsed:
+            streams.append(_constant_stream(start, start + elapsed, cpu_kwh * JOULES_PER_KWH / elapsed))
+        if gpu is not None:
+            streams.append(_bin_stream(gpu))
+        # only the intensity points from the one in force at the start of the run are walked
+        first = max(0, bisect.bisect_right(intensity_points, (min(start, ram_start), math.inf)) - 1)
+        emission_g = sum(period[3] for period in asof_emissions(
+            heapq.merge(*streams, key=lambda interval: interval[0]), intensity_points[first:]))
+        intensity = emission_g / total_kwh if total_kwh else None
+    else:
+        intensity = grid_carbon_intensity
+        emission_g = total_kwh * grid_carbon_intensity if grid_carbon_intensity is not None else None
+
+    metrics = {
+        'Run': run_dir,
+        'Elapsed Time (seconds)': elapsed,
+        'CPU Energy (kWh)': cpu_kwh,
+        'GPU Energy (kWh)': gpu_kwh,
+        'RAM Power Usage (kWh)': ram_kwh,
+        'Total Energy Usage (kWh)': total_kwh,
+        'Grid Carbon Intensity (g/CO2 Eq)': intensity,
+        'Total Carbon Emission (g/CO2 Eq)': emission_g,
+    }
+    return metrics
+
+
+def reanalyze(root, grid_carbon_intensity=None, intensity_source=None, ram_gb=None,
+              ram_watts_per_gb=RAM_WATTS_PER_GB, subtract_monitor_overhead=False, cache_path=CACHE_FILE,
+              workers=None):
+    """
+    Recomputes every run under root with new parameters.
+
+    The logs are parsed once, on a process pool, and their integrals cached in cache_path; a
+    later call with other parameters only reads the cache.
+
+    Args:
+        root (str): The directory tree of run artefacts, e.g. monitoring_output/batch.
+        grid_carbon_intensity (float): A constant intensity in gCO2/kWh.
+        intensity_source: An intensity series, see carbon_accounting.iter_intensity, used instead.
+        ram_gb (float): The RAM size, by default that of this machine.
+        ram_watts_per_gb (float): The RAM power model.
+        subtract_monitor_overhead (bool): Whether to leave out the monitor's CPU energy.
+        cache_path (str): The integral cache.
+        workers (int): The parsing processes, by default one per core.
+
+    Returns:
+        pandas.DataFrame: One row per run.
+    """
+    import pandas as pd
+    if ram_gb is None:
+        import psutil
+        ram_gb = round(psutil.virtual_memory().total / (1024 ** 3), 0)
+    run_dirs = find_runs(root)
+    integrals = collect_integrals(run_dirs, cache_path, workers)
+    intensity_points = load_intensity_points(intensity_source) if intensity_source is not None else None
+    rows = [recompute_run(run_dir, integrals[run_dir], grid_carbon_intensity, intensity_points, ram_gb,
+                          ram_watts_per_gb, subtract_monitor_overhead) for run_dir in run_dirs]
+    return pd.DataFrame(rows)
+
+
+def main():
+    import time
+    from tabulate import tabulate
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Recompute the energy and emission of archived runs.')
+    parser.add_argument('root', help='directory tree holding the run directories')
+    intensity = parser.add_mutually_exclusive_group(required=True)
+    intensity.add_argument('--intensity', type=float, help='constant grid carbon intensity in gCO2/kWh')
+    intensity.add_argument('--intensity-file', help='CSV or JSON carbon intensity series')
+    parser.add_argument('--ram-gb', type=float, default=None, help='installed RAM of runs without memory sampling, default: this machine')
+    parser.add_argument('--ram-watts-per-gb', type=float, default=RAM_WATTS_PER_GB)
+    parser.add_argument('--subtract-monitor-overhead', action='store_true')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--cache', default=CACHE_FILE)
+    parser.add_argument('--output', default=None, help='CSV receiving one row per run')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    results = reanalyze(args.root, args.intensity, args.intensity_file, args.ram_gb, args.ram_watts_per_gb,
+                        args.subtract_monitor_overhead, args.cache, args.workers)
+    print(tabulate(results, headers='keys', tablefmt='grid', showindex=False))
+    if args.output:
+        results.to_csv(args.output, index=False)
+    print(f'{len(results)} runs in {time.perf_counter() - start:.2f} s')
+
+
+if __name__ == "__main__":
+    main()
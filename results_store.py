@@ -0,0 +1,345 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import argparse
+import platform
+
+logger = logging.getLogger(__name__)
+
+RESULTS_DB = os.path.join('monitoring_output', 'results.sqlite')
+# result table rows stored per component in run_energy
+COMPONENT_METRICS = {
+    'CPU Energy (kWh)': 'cpu',
+    'CPU Energy, Whole System (kWh)': 'cpu_system',
+    'Monitor Overhead CPU Energy (kWh)': 'monitor_overhead',
+    'GPU Energy (kWh)': 'gpu',
+    'RAM Power Usage (kWh)': 'ram',
+}
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY,
+    project TEXT NOT NULL,
+    started_at REAL NOT NULL,
+    finished_at REAL NOT NULL,
+    month TEXT NOT NULL,
+    duration_sec REAL,
+    host TEXT,
+    hardware_fingerprint TEXT,
+    cpu_model TEXT,
+    total_energy_kwh REAL,
+    carbon_intensity REAL,
+    emission_g REAL,
+    metrics TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_project_time ON runs (project, started_at);
+CREATE INDEX IF NOT EXISTS runs_project_month ON runs (project, month, total_energy_kwh, emission_g);
+CREATE INDEX IF NOT EXISTS runs_time ON runs (started_at);
+CREATE INDEX IF NOT EXISTS runs_energy ON runs (total_energy_kwh);
+CREATE TABLE IF NOT EXISTS run_energy (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    component TEXT NOT NULL,
+    energy_kwh REAL,
+    PRIMARY KEY (run_id, component)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS run_phases (
+    run_id INTEGER NOT NULL REFERENCES runs (run_id) ON DELETE CASCADE,
+    phase_index INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    duration_sec REAL,
+    cpu_kwh REAL,
+    gpu_kwh REAL,
+    ram_kwh REAL,
+    energy_kwh REAL,
+    carbon_intensity REAL,
+    emission_g REAL,
+    PRIMARY KEY (run_id, phase_index)
+) WITHOUT ROWID;
+'''
+
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResultsStore:
+    """
+    The history of monitored runs in one SQLite database.
+
+    A run has one row in runs, with its project, start and end time, host and hardware
+    fingerprint, one row per energy component in run_energy and optionally one row per model
+    phase in run_phases. The database is in WAL mode, so reports can query it while runs are
+    being added. add_run only buffers; the buffered runs are written in one transaction when
+    batch_size runs are pending, on flush() and on close().
+    """
+
+    def __init__(self, db_path=RESULTS_DB, batch_size=500):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # concurrent batch runs and reports wait for each other's write lock
+        self._db = sqlite3.connect(db_path, timeout=30)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.execute('PRAGMA foreign_keys=ON')
+        self._db.executescript(_SCHEMA)
+        self._pending = []
+        self._host = None
+
+    def close(self):
+        if self._db is not None:
+            self.flush()
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _machine(self):
+        if self._host is None:
+            from hardware_cache import hardware_fingerprint, cpu_model_name
+            self._host = (platform.node(), hardware_fingerprint(), cpu_model_name())
+        return self._host
+
+    def add_run(self, project, metrics, phases=None, started_at=None, finished_at=None, host=None):
+        """
+        Buffers one run for the next flush.
+
+        Args:
+            project (str): The project or run name.
+            metrics (dict): The result table of compute_run_metrics as {metric: value}.
+            phases (list): Optional rows of compute_phase_metrics.
+            started_at (float): The epoch start of the run; by default finished_at minus the
+                elapsed time in metrics.
+            finished_at (float): The epoch end of the run; by default started_at plus the elapsed
+                time, or now.
+            host (tuple): (host name, hardware fingerprint, CPU model); by default this machine.
+        """
+        duration = _number(metrics.get('Elapsed Time (seconds)'))
+        if finished_at is None:
+            finished_at = started_at + duration if started_at is not None and duration is not None else time.time()
+        if started_at is None:
+            started_at = finished_at - (duration or 0.0)
+        self._pending.append((project, dict(metrics), list(phases or []), started_at, finished_at,
+                              host or self._machine()))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered runs in one transaction and returns their run ids."""
+        if not self._pending:
+            return []
+        pending, self._pending = self._pending, []
+        run_ids, energy_rows, phase_rows = [], [], []
+        with self._db:
+            for project, metrics, phases, started_at, finished_at, (host, fingerprint, cpu_model) in pending:
+                cursor = self._db.execute(
+                    'INSERT INTO runs (project, started_at, finished_at, month, duration_sec, host, '
+                    'hardware_fingerprint, cpu_model, total_energy_kwh, carbon_intensity, emission_g, metrics) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    # the local calendar month is stored, so monthly reports group on an index
+                    (project, started_at, finished_at, time.strftime('%Y-%m', time.localtime(started_at)),
+                     _number(metrics.get('Elapsed Time (seconds)')), host,
+                     fingerprint, cpu_model, _number(metrics.get('Total Energy Usage (kWh)')),
+                     _number(metrics.get('Grid Carbon Intensity (g/CO2 Eq)')),
+                     _number(metrics.get('Total Carbon Emission (g/CO2 Eq)')), json.dumps(metrics, default=str)))
+                run_id = cursor.lastrowid
+                run_ids.append(run_id)
+                energy_rows += [(run_id, component, _number(metrics[metric]))
+                                for metric, component in COMPONENT_METRICS.items() if metric in metrics]
+                phase_rows += [(run_id, index, str(phase[0]), *(_number(value) for value in phase[1:8]))
+                               for index, phase in enumerate(phases)]
+            self._db.executemany('INSERT INTO run_energy VALUES (?, ?, ?)', energy_rows)
+            self._db.executemany('INSERT INTO run_phases VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', phase_rows)
+        return run_ids
+
+    @staticmethod
+    def _where(project=None, since=None, until=None):
+        clauses, params = [], []
+        if project is not None:
+            clauses.append('project = ?')
+            params.append(project)
+        if since is not None:
+            clauses.append('started_at >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('started_at < ?')
+            params.append(until)
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def runs(self, project=None, since=None, until=None, limit=None):
+        """
+        Returns the stored runs, newest first, optionally of one project and start time range.
+
+        Returns:
+            list: One dict per run with the runs columns and its energy by component.
+        """
+        where, params = self._where(project, since, until)
+        query = f'SELECT * FROM runs{where} ORDER BY started_at DESC'
+        if limit is not None:
+            query += ' LIMIT ?'
+            params.append(limit)
+        cursor = self._db.execute(query, params)
+        columns = [column[0] for column in cursor.description]
+        runs = {}
+        for row in cursor:
+            run = dict(zip(columns, row))
+            run['metrics'] = json.loads(run['metrics']) if run['metrics'] else {}
+            run['energy_kwh'] = {}
+            runs[run['run_id']] = run
+        # the components of all selected runs in one query
+        selected = query.replace('*', 'run_id', 1)
+        for run_id, component, energy_kwh in self._db.execute(
+                f'SELECT run_id, component, energy_kwh FROM run_energy WHERE run_id IN ({selected})', params):
+            runs[run_id]['energy_kwh'][component] = energy_kwh
+        return list(runs.values())
+
+    def phases(self, run_id):
+        """Returns the phase rows of one run in phase order."""
+        cursor = self._db.execute('SELECT * FROM run_phases WHERE run_id = ? ORDER BY phase_index', (run_id,))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor]
+
+    def energy_by_month(self, project=None, since=None, until=None):
+        """
+        Aggregates the runs per project and calendar month of their local start time.
+
+        Returns:
+            list: (project, 'YYYY-MM', runs, total energy kWh, total emission g) tuples.
+        """
+        where, params = self._where(project, since, until)
+        return self._db.execute(
+            f'SELECT project, month, COUNT(*), SUM(total_energy_kwh), SUM(emission_g) FROM runs{where} '
+            'GROUP BY project, month ORDER BY project, month', params).fetchall()
+
+    def projects(self):
+        """
+        Summarises every project.
+
+        Returns:
+            list: (project, runs, total energy kWh, mean energy kWh, first start, last start) tuples.
+        """
+        return self._db.execute('SELECT project, COUNT(*), SUM(total_energy_kwh), AVG(total_energy_kwh), '
+                                'MIN(started_at), MAX(started_at) FROM runs GROUP BY project '
+                                'ORDER BY project').fetchall()
+
+    def energy_percentile(self, percentile=95.0, project=None, since=None, until=None):
+        """
+        Returns a percentile of the total energy per run, interpolated like numpy.percentile.
+
+        Only the one or two runs around the percentile's rank are read, walking the energy
+        index, so the cost does not grow with the number of runs returned.
+
+        Returns:
+            float: The energy in kWh, or None without runs.
+        """
+        where, params = self._where(project, since, until)
+        where += (' AND ' if where else ' WHERE ') + 'total_energy_kwh IS NOT NULL'
+        count, = self._db.execute(f'SELECT COUNT(*) FROM runs{where}', params).fetchone()
+        if not count:
+            return None
+        position = (count - 1) * percentile / 100
+        offset = int(position)
+        values = [row[0] for row in self._db.execute(
+            f'SELECT total_energy_kwh FROM runs{where} ORDER BY total_energy_kwh LIMIT 2 OFFSET ?',
+            params + [offset])]
+        if len(values) == 1:
+            return values[0]
+        return values[0] + (values[1] - values[0]) * (position - offset)
+
+    def import_csv(self, csv_path, project=None):
+        """
+        Adds the run of a Metric/Value CSV written by res_gen before the database existed, dated
+        by the file's modification time.
+        """
+        import csv
+        with open(csv_path, 'r', newline='') as file:
+            reader = csv.DictReader(file)
+            if reader.fieldnames != ['Metric', 'Value']:
+                raise ValueError(f"{csv_path} is not a Metric/Value result table")
+            metrics = {row['Metric']: row['Value'] for row in reader}
+        project = project or metrics.get('Project_name') or os.path.splitext(os.path.basename(csv_path))[0]
+        self.add_run(project, metrics, finished_at=os.path.getmtime(csv_path))
+
+
+def record_run(project, table_data, phase_rows=None, started_at=None, db_path=RESULTS_DB):
+    """
+    Stores one run's result table, and phase table if any, in the results database.
+
+    Returns:
+        int: The run id.
+    """
+    with ResultsStore(db_path) as store:
+        store.add_run(project, dict(table_data), phase_rows, started_at=started_at)
+        return store.flush()[0]
+
+
+def _month_start(text):
+    import datetime
+    return datetime.datetime.strptime(text, '%Y-%m').timestamp()
+
+
+def main():
+    from tabulate import tabulate
+    parser = argparse.ArgumentParser(description='Query the ProcessC results database.')
+    parser.add_argument('--db', default=RESULTS_DB)
+    commands = parser.add_subparsers(dest='command', required=True)
+    monthly = commands.add_parser('monthly', help='energy and emission per project and month')
+    percentile = commands.add_parser('percentile', help='a percentile of the energy per run')
+    percentile.add_argument('--q', type=float, default=95.0)
+    runs = commands.add_parser('runs', help='the latest runs')
+    runs.add_argument('--limit', type=int, default=20)
+    for command in (monthly, percentile, runs):
+        command.add_argument('--project', default=None)
+        command.add_argument('--since', type=_month_start, default=None, help='first month, YYYY-MM')
+        command.add_argument('--until', type=_month_start, default=None, help='month after the last, YYYY-MM')
+    commands.add_parser('projects', help='runs and energy of every project')
+    legacy = commands.add_parser('import', help='add result CSVs written by earlier versions')
+    legacy.add_argument('csv_files', nargs='+')
+    args = parser.parse_args()
+
+    with ResultsStore(args.db) as store:
+        start = time.perf_counter()
+        if args.command == 'monthly':
+            rows = store.energy_by_month(args.project, args.since, args.until)
+            table = tabulate(rows, headers=['Project', 'Month', 'Runs', 'Energy (kWh)', 'Emission (g/CO2 Eq)'],
+                             tablefmt='grid')
+        elif args.command == 'percentile':
+            value = store.energy_percentile(args.q, args.project, args.since, args.until)
+            table = f'p{args.q:g} energy per run: {value} kWh'
+        elif args.command == 'runs':
+            rows = [(run['run_id'], run['project'],
+                     time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(run['started_at'])),
+                     run['duration_sec'], run['total_energy_kwh'], run['emission_g'], run['host'])
+                    for run in store.runs(args.project, args.since, args.until, args.limit)]
+            table = tabulate(rows, headers=['Run', 'Project', 'Started', 'Duration (s)', 'Energy (kWh)',
+                                            'Emission (g/CO2 Eq)', 'Host'], tablefmt='grid')
+        elif args.command == 'projects':
+            rows = [(project, count, total, mean, time.strftime('%Y-%m-%d', time.localtime(first)),
+                     time.strftime('%Y-%m-%d', time.localtime(last)))
+                    for project, count, total, mean, first, last in store.projects()]
+            table = tabulate(rows, headers=['Project', 'Runs', 'Energy (kWh)', 'Mean Energy (kWh)', 'First Run',
+                                            'Last Run'], tablefmt='grid')
+        else:
+            for csv_path in args.csv_files:
+                try:
+                    store.import_csv(csv_path)
+                except ValueError as e:
+                    print(f'Skipped: {e}')
+            table = f'Imported {len(store.flush())} runs'
+        print(table)
+        print(f'({(time.perf_counter() - start) * 1000:.1f} ms)')
+
+
+if __name__ == "__main__":
+    main()
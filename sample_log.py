@@ -0,0 +1,256 @@
+import os
+import sys
+import json
+import time
+import struct
+import logging
+import argparse
+import datetime
+from array import array
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'PCSLOG01'
+_LENGTH = struct.Struct('<I')
+LOG_FORMATS = ('csv', 'binary')
+INTEL_DOMAINS = ('Processor', 'IA', 'DRAM')
+GPU_COLUMNS = ('timestamp', 'gpu', 'power.draw')
+# cumulative energy series of the modelled sensors, in epoch seconds and Joules
+ENERGY_COLUMNS = ('timestamp', 'energy_j')
+
+
+def _aligned(offset):
+    return (offset + 7) // 8 * 8
+
+
+class SampleLogWriter:
+    """
+    Appends fixed-width float64 records to a binary sample log.
+
+    The file starts with an 8 byte magic, the length of a JSON header and the header itself,
+    padded so the records begin on an 8 byte boundary. The header names the columns, so the file
+    describes itself. Records are written in chunks of whole rows with one os.write each; a crash
+    can only leave a partial last record, which readers ignore. The interface follows
+    sampling.BufferedCsvWriter, except that rows are sequences of numbers in column order.
+    """
+
+    def __init__(self, file_path, columns, kind, metadata=None, flush_interval=5.0, max_rows=1000):
+        self.file_path = file_path
+        self.columns = tuple(columns)
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        header = json.dumps(dict(metadata or {}, kind=kind, columns=list(self.columns), dtype='<f8')).encode()
+        prefix = MAGIC + _LENGTH.pack(len(header)) + header
+        prefix += b'\0' * (_aligned(len(prefix)) - len(prefix))
+        self._fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, 'O_BINARY', 0), 0o644)
+        os.write(self._fd, prefix)
+        self._pending = array('d')
+        self._last_flush = time.monotonic()
+
+    def write(self, row):
+        if len(row) != len(self.columns):
+            raise ValueError(f"Expected {len(self.columns)} values, got {len(row)}")
+        self._pending.extend(row)
+        if len(self._pending) >= self.max_rows * len(self.columns) or \
+                time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            if sys.byteorder != 'little':
+                self._pending.byteswap()
+            data = memoryview(self._pending).cast('B')
+            while data:
+                data = data[os.write(self._fd, data):]
+            self._pending = array('d')
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._fd is not None:
+            self.flush()
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def is_sample_log(file_path):
+    """Returns whether a file is a binary sample log, judged by its magic bytes."""
+    try:
+        with open(file_path, 'rb') as file:
+            return file.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def read_header(file_path):
+    """
+    Reads the JSON header of a binary sample log.
+
+    Returns:
+        tuple: The header dict and the byte offset of the first record.
+    """
+    with open(file_path, 'rb') as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{file_path} is not a ProcessC sample log")
+        length, = _LENGTH.unpack(file.read(_LENGTH.size))
+        header = json.loads(file.read(length))
+    return header, _aligned(len(MAGIC) + _LENGTH.size + length)
+
+
+def open_sample_log(file_path):
+    """
+    Maps the records of a binary sample log without copying them.
+
+    Returns:
+        tuple: The header dict and a read-only numpy.memmap record array with one float64 field
+        per column; data[column] is a zero-copy strided view.
+    """
+    import numpy as np
+    header, offset = read_header(file_path)
+    dtype = np.dtype([(column, '<f8') for column in header['columns']])
+    # a partial record left by a crash mid-append is not part of the log
+    rows = (os.path.getsize(file_path) - offset) // dtype.itemsize
+    if rows <= 0:
+        return header, np.zeros(0, dtype=dtype)
+    return header, np.memmap(file_path, dtype=dtype, mode='r', offset=offset, shape=(rows,))
+
+
+def local_seconds(timestamp):
+    """
+    Converts an epoch time to seconds since 1970-01-01 of the naive local time, the clock the
+    CSV GPU log is written in, so both formats load to the same datetime64 values.
+    """
+    moment = datetime.datetime.fromtimestamp(timestamp)
+    return (moment - datetime.datetime(1970, 1, 1)).total_seconds()
+
+
+def intel_columns(packages):
+    """Returns the binary Intel log columns for the given CPU package indices."""
+    columns = ['Elapsed Time (sec)', 'Time of Day (sec)', 'RDTSC', 'CPU Utilization(%)', 'CPU Frequency_0(MHz)']
+    for package in packages:
+        for domain in INTEL_DOMAINS:
+            columns += [f'{domain} Power_{package}(Watt)', f'Cumulative {domain} Energy_{package}(Joules)']
+    return columns
+
+
+def intel_csv_to_sample_log(csv_path, output_path):
+    """
+    Converts an intel_power_gadget_log.csv into a binary sample log.
+
+    The mWh columns and the footer are dropped, since both follow from the Joules columns, and
+    System Time is kept as Time of Day (sec).
+    """
+    from log_parsers import load_intel_power_log
+    df = load_intel_power_log(csv_path)
+    df.columns = [column.strip() for column in df.columns]
+    columns = [column for column in df.columns if column != 'System Time' and not column.endswith('(mWh)')]
+    with SampleLogWriter(output_path, columns, 'intel', max_rows=65536) as writer:
+        for row in df[columns].itertuples(index=False, name=None):
+            writer.write(row)
+
+
+def gpu_csv_to_sample_log(csv_path, output_path):
+    """
+    Converts a gpu_power_log.csv into a binary sample log with local-time epoch seconds.
+    """
+    import numpy as np
+    from log_parsers import load_gpu_power_log
+    df = load_gpu_power_log(csv_path)
+    seconds = df['timestamp'].to_numpy().astype('datetime64[ns]').astype(np.int64) / 1e9
+    with SampleLogWriter(output_path, GPU_COLUMNS, 'gpu', {'timestamp': 'local'}, max_rows=65536) as writer:
+        for row in zip(seconds.tolist(), df['gpu'].tolist(), df['power.draw'].tolist()):
+            writer.write(row)
+
+
+def _format_time_of_day(seconds):
+    milliseconds = int(round(seconds * 1000)) % (86400 * 1000)
+    return (f'{milliseconds // 3600000:02d}:{milliseconds // 60000 % 60:02d}:{milliseconds // 1000 % 60:02d}:'
+            f'{milliseconds % 1000:03d}')
+
+
+def sample_log_to_intel_csv(file_path, csv_path):
+    """
+    Writes a binary Intel sample log back out in the Intel Power Gadget CSV layout, footer included.
+    """
+    header, data = open_sample_log(file_path)
+    columns = header['columns']
+    energy_columns = [column for column in columns if column.startswith('Cumulative')]
+    csv_columns = ['System Time']
+    for column in columns:
+        if column == 'Time of Day (sec)':
+            continue
+        csv_columns.append(column if column != 'CPU Utilization(%)' else ' CPU Utilization(%)')
+        if column in energy_columns:
+            csv_columns.append(column.replace('(Joules)', '(mWh)'))
+    with open(csv_path, 'w', newline='') as file:
+        file.write(','.join(csv_columns) + '\n')
+        for record in data.tolist():
+            values = [_format_time_of_day(record[columns.index('Time of Day (sec)')])]
+            for column, value in zip(columns, record):
+                if column == 'Time of Day (sec)':
+                    continue
+                if column == 'RDTSC':
+                    values.append(f' {int(value)}')
+                elif column == 'CPU Frequency_0(MHz)':
+                    values.append(f'{int(value):5d}')
+                else:
+                    values.append(f'{value:9.3f}' if column in ('Elapsed Time (sec)', 'CPU Utilization(%)')
+                                  else f'{value:8.3f}')
+                if column in energy_columns:
+                    values.append(f'{value / 3.6:8.3f}')
+            file.write(','.join(values) + '\n')
+        elapsed = float(data['Elapsed Time (sec)'][-1]) if len(data) else 0.0
+        file.write(f'\nTotal Elapsed Time (sec) = {elapsed:.6f}\n\n')
+        for column in energy_columns:
+            joules = float(data[column][-1]) if len(data) else 0.0
+            name = column[:-len('(Joules)')]
+            file.write(f'{name} (Joules) = {joules:.6f}\n{name} (mWh) = {joules / 3.6:.6f}\n'
+                       f'Average {name[len("Cumulative "):].replace("Energy", "Power")} (Watt) = '
+                       f'{joules / elapsed if elapsed else 0.0:.6f}\n\n')
+
+
+def sample_log_to_gpu_csv(file_path, csv_path):
+    """
+    Writes a binary GPU sample log back out in the gpu_power_log.csv layout.
+    """
+    _, data = open_sample_log(file_path)
+    epoch = datetime.datetime(1970, 1, 1)
+    with open(csv_path, 'w', newline='') as file:
+        file.write('timestamp,gpu,power.draw,power.limit\n')
+        for seconds, gpu, power in data[list(GPU_COLUMNS)].tolist():
+            file.write(f'{epoch + datetime.timedelta(seconds=seconds)},{int(gpu)},{power},\n')
+
+
+def convert(source, destination):
+    """
+    Converts between the CSV and binary formats of an Intel or GPU log, whichever way applies.
+    """
+    if is_sample_log(source):
+        kind = read_header(source)[0]['kind']
+        (sample_log_to_intel_csv if kind == 'intel' else sample_log_to_gpu_csv)(source, destination)
+        return
+    with open(source, 'r') as file:
+        first_line = file.readline()
+    if 'Elapsed Time (sec)' in first_line:
+        intel_csv_to_sample_log(source, destination)
+    elif 'power.draw' in first_line:
+        gpu_csv_to_sample_log(source, destination)
+    else:
+        raise ValueError(f"{source} is neither an Intel power log nor a GPU power log")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert Intel and GPU power logs between CSV and binary.')
+    parser.add_argument('source')
+    parser.add_argument('destination')
+    args = parser.parse_args()
+    convert(args.source, args.destination)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+import os
+import logging
+from array import array
+
+logger = logging.getLogger(__name__)
+
+
+class SampleStore:
+    """
+    Fixed-size columnar buffer of float64 samples for the monitors.
+
+    Each column is a preallocated array('d') of ring_size slots, so memory stays the same however
+    long a run lasts. When the buffer is full and a spill_path is given, it is written there as
+    row-major float64 records and then reused from the start. Without a spill_path it is a ring:
+    each new sample overwrites the oldest one, so the latest ring_size samples are kept, and
+    dropped_rows counts the overwritten ones.
+    """
+
+    def __init__(self, columns, ring_size=86400, spill_path=None):
+        self.columns = tuple(columns)
+        self.ring_size = ring_size
+        self.spill_path = spill_path
+        self._data = [array('d', bytes(8 * ring_size)) for _ in self.columns]
+        self._count = 0
+        # slot of the oldest sample once the ring has wrapped
+        self._head = 0
+        self.spilled_rows = 0
+        self.dropped_rows = 0
+        if spill_path is not None and os.path.exists(spill_path):
+            os.remove(spill_path)
+
+    def __len__(self):
+        return self.spilled_rows + self.dropped_rows + self._count
+
+    def append(self, values):
+        """
+        Adds one sample.
+
+        Args:
+            values (sequence): One float per column, in column order.
+        """
+        if self._count == self.ring_size and self.spill_path is None:
+            if not self.dropped_rows:
+                logger.warning(f"Sample buffer of {self.ring_size} rows is full, keeping only the latest rows")
+            for column, value in zip(self._data, values):
+                column[self._head] = value
+            self._head = (self._head + 1) % self.ring_size
+            self.dropped_rows += 1
+            return
+        if self._count == self.ring_size:
+            self._spill()
+        index = self._count
+        for column, value in zip(self._data, values):
+            column[index] = value
+        self._count += 1
+
+    def _spill(self):
+        width = len(self.columns)
+        records = array('d', bytes(8 * width * self._count))
+        for position, column in enumerate(self._data):
+            records[position::width] = column[:self._count]
+        with open(self.spill_path, 'ab') as file:
+            records.tofile(file)
+        self.spilled_rows += self._count
+        self._count = 0
+
+    def flush(self):
+        """Writes the buffered samples to spill_path, if one is set."""
+        if self.spill_path is not None and self._count:
+            self._spill()
+
+    def column(self, name):
+        """
+        Returns a view of the buffered values of one column, oldest first.
+
+        The view is zero-copy and stays valid until the buffer next fills up and is reused; once
+        a ring without spill_path has wrapped, it is a copy in sample order instead.
+        """
+        data = self._data[self.columns.index(name)]
+        if self._head:
+            return memoryview(data[self._head:] + data[:self._head])
+        return memoryview(data)[:self._count]
+
+    def views(self):
+        """Returns a dict of views of every buffered column, see column."""
+        return {name: self.column(name) for name in self.columns}
+
+    def iter_spilled(self, chunk_rows=65536):
+        """
+        Reads the spilled samples back in chunks.
+
+        Yields:
+            dict: Column name to array('d') for each chunk of spilled rows.
+        """
+        if self.spill_path is None or not os.path.exists(self.spill_path):
+            return
+        width = len(self.columns)
+        with open(self.spill_path, 'rb') as file:
+            while True:
+                records = array('d')
+                try:
+                    records.fromfile(file, chunk_rows * width)
+                except EOFError:
+                    pass
+                # a crash during a spill can leave a partial record at the end
+                del records[len(records) - len(records) % width:]
+                if not records:
+                    return
+                yield {name: records[position::width] for position, name in enumerate(self.columns)}
@@ -0,0 +1,128 @@
+import csv
+import time
+import threading
+from collections import deque
+
+
+def percentile(values, fraction):
+    """
+    Returns the nearest-rank percentile of a sequence, or None when it is empty.
+
+    Args:
+        values (iterable): The observations.
+        fraction (float): The percentile as a fraction, e.g. 0.95.
+    """
+    ordered = sorted(values)
+    if not ordered:
+        return None
+    rank = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class FixedRateScheduler:
+    """
+    Yields ticks at a fixed rate on the monotonic clock.
+
+    Each deadline is derived from the start time rather than from the end of the previous tick,
+    so the time spent querying a sensor is absorbed instead of adding to the interval. When a
+    tick overruns whole periods, those deadlines are counted as missed and skipped.
+    """
+
+    def __init__(self, interval, stop_event=None, history=10000):
+        self.interval = interval
+        self._stop_event = stop_event if stop_event is not None else threading.Event()
+        self._jitter = deque(maxlen=history)
+        self._latency = deque(maxlen=history)
+        self.ticks = 0
+        self.missed_deadlines = 0
+        self.start_time = None
+        self.last_tick_time = None
+
+    def __iter__(self):
+        self.start_time = time.monotonic()
+        deadline = self.start_time
+        while not self._stop_event.is_set():
+            now = time.monotonic()
+            if deadline > now:
+                if self._stop_event.wait(deadline - now):
+                    break
+                now = time.monotonic()
+            self._jitter.append(now - deadline)
+            self.ticks += 1
+            self.last_tick_time = now
+            yield now
+            deadline += self.interval
+            now = time.monotonic()
+            if now >= deadline + self.interval:
+                missed = int((now - deadline) // self.interval)
+                self.missed_deadlines += missed
+                deadline += missed * self.interval
+
+    def record_latency(self, seconds):
+        """Records how long the sensor query of the current tick took."""
+        self._latency.append(seconds)
+
+    def stats(self):
+        """
+        Returns the scheduling statistics seen so far.
+
+        Returns:
+            dict: Target and achieved rate in Hz, tick and missed deadline counts, and the wake-up
+            jitter and query latency percentiles in milliseconds.
+        """
+        elapsed = (self.last_tick_time - self.start_time) if self.ticks > 1 else 0.0
+        result = {
+            'target_rate_hz': 1 / self.interval if self.interval else None,
+            'achieved_rate_hz': (self.ticks - 1) / elapsed if elapsed > 0 else None,
+            'ticks': self.ticks,
+            'missed_deadlines': self.missed_deadlines,
+        }
+        for name, values, fractions in (('jitter', self._jitter, (0.5, 0.95)),
+                                        ('query_latency', self._latency, (0.5, 0.95, 0.99))):
+            for fraction in fractions:
+                value = percentile(values, fraction)
+                result[f'{name}_ms_p{int(fraction * 100)}'] = None if value is None else value * 1000
+            result[f'{name}_ms_max'] = max(values) * 1000 if values else None
+        return result
+
+
+class BufferedCsvWriter:
+    """
+    csv.DictWriter that keeps rows in memory and writes them in batches.
+
+    A batch is written when max_rows rows are pending or flush_interval seconds have passed since
+    the last write, and on close, instead of one write per sample.
+    """
+
+    def __init__(self, file_path, fieldnames, flush_interval=5.0, max_rows=1000):
+        self.file_path = file_path
+        self.flush_interval = flush_interval
+        self.max_rows = max_rows
+        self._file = open(file_path, 'w', newline='')
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames)
+        self._writer.writeheader()
+        self._pending = []
+        self._last_flush = time.monotonic()
+
+    def write(self, row):
+        self._pending.append(row)
+        if len(self._pending) >= self.max_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._pending:
+            self._writer.writerows(self._pending)
+            self._pending = []
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
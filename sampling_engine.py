@@ -0,0 +1,284 @@
+import os
+import sys
+import time
+import threading
+import logging
+
+from sampling import FixedRateScheduler
+from sample_store import SampleStore
+
+logger = logging.getLogger(__name__)
+
+
+class Sensor:
+    """
+    A source of samples driven by a SamplingEngine.
+
+    Every `period` engine ticks the engine calls read() with the shared timestamp of the tick, so
+    all sensors of an engine sample on one time base. Rows returned by read() are kept in the
+    engine's SampleStore for the sensor, prefixed with the timestamp and elapsed time.
+    """
+
+    name = 'sensor'
+    fields = ()
+    period = 1
+    spill_path = None
+
+    def open(self, engine):
+        """Prepares the sensor; called once when the engine starts."""
+
+    def read(self, timestamp, elapsed):
+        """
+        Takes one sample.
+
+        Args:
+            timestamp (float): The wall-clock time of the tick, in epoch seconds.
+            elapsed (float): The monotonic seconds since the engine started.
+
+        Returns:
+            list: Rows of values aligned with `fields`, or None when there is nothing to store.
+        """
+        return None
+
+    def close(self, timestamp, elapsed):
+        """Finishes the sensor's output; called once when the engine stops."""
+
+
+class SamplingEngine:
+    """
+    Drives several sensors from one scheduler thread on a single monotonic clock.
+
+    Wall-clock timestamps are derived from the monotonic clock anchored at start, so samples of
+    different sensors stay comparable even if the system clock is adjusted during a run.
+    """
+
+    def __init__(self, sensors=(), interval=0.1, ring_size=86400):
+        self.interval = interval
+        self.ring_size = ring_size
+        self.sensors = []
+        self.stores = {}
+        self.start_monotonic = None
+        self.start_wall = None
+        self._read_time = {}
+        self._failures = {}
+        self._stop_event = threading.Event()
+        self._scheduler = None
+        self._thread = None
+        for sensor in sensors:
+            self.add_sensor(sensor)
+
+    def add_sensor(self, sensor):
+        """Adds a sensor; must be called before start."""
+        if self.running:
+            raise RuntimeError("Sensors cannot be added while the engine is running")
+        self.sensors.append(sensor)
+        if sensor.fields:
+            self.stores[sensor.name] = SampleStore(('timestamp', 'elapsed') + tuple(sensor.fields),
+                                                   ring_size=self.ring_size, spill_path=sensor.spill_path)
+        return sensor
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def now(self):
+        """
+        Returns the engine clock: (wall-clock epoch seconds, elapsed seconds since start).
+        """
+        elapsed = time.monotonic() - self.start_monotonic
+        return self.start_wall + elapsed, elapsed
+
+    def _run(self):
+        for tick, monotonic in enumerate(self._scheduler):
+            elapsed = monotonic - self.start_monotonic
+            timestamp = self.start_wall + elapsed
+            read_start = time.perf_counter()
+            for sensor in self.sensors:
+                if tick % sensor.period:
+                    continue
+                sensor_start = time.perf_counter()
+                try:
+                    rows = sensor.read(timestamp, elapsed)
+                except Exception as e:
+                    # one failing sensor must not stop the others; report each sensor once
+                    if sensor.name not in self._failures:
+                        logger.warning(f"Sensor {sensor.name} failed: {e}")
+                    self._failures[sensor.name] = self._failures.get(sensor.name, 0) + 1
+                    continue
+                finally:
+                    self._read_time[sensor.name] = self._read_time.get(sensor.name, 0.0) + \
+                        time.perf_counter() - sensor_start
+                if rows and sensor.name in self.stores:
+                    store = self.stores[sensor.name]
+                    for row in rows:
+                        store.append((timestamp, elapsed) + tuple(row))
+            self._scheduler.record_latency(time.perf_counter() - read_start)
+
+    def start(self):
+        """
+        Opens every sensor and starts the scheduler thread.
+        """
+        if self.running:
+            return
+        self.start_monotonic = time.monotonic()
+        self.start_wall = time.time()
+        for sensor in self.sensors:
+            sensor.open(self)
+        self._stop_event.clear()
+        self._scheduler = FixedRateScheduler(self.interval, self._stop_event)
+        self._thread = threading.Thread(target=self._run, name='sampling engine', daemon=True)
+        self._thread.start()
+        logger.info(f"Started sampling {', '.join(sensor.name for sensor in self.sensors)} "
+                    f"every {self.interval} s")
+
+    def stop(self):
+        """
+        Stops the scheduler thread and closes every sensor. The samples still buffered in the
+        stores stay there; call SampleStore.flush to move them to the spill file.
+
+        Returns:
+            dict: The engine statistics, see stats().
+        """
+        if not self.running:
+            return self.stats()
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        timestamp, elapsed = self.now()
+        for sensor in self.sensors:
+            try:
+                sensor.close(timestamp, elapsed)
+            except Exception as e:
+                logger.warning(f"Closing sensor {sensor.name} failed: {e}")
+        # the last buffer stays in memory for queries after stop; the spill file only holds
+        # the rows that had to make room
+        stats = self.stats()
+        logger.info(f"Stopped sampling: {stats}")
+        return stats
+
+    def stats(self):
+        """
+        Returns the scheduler statistics plus the CPU seconds spent reading each sensor.
+        """
+        stats = self._scheduler.stats() if self._scheduler is not None else {}
+        stats['sensor_read_sec'] = dict(self._read_time)
+        stats['sensor_failures'] = dict(self._failures)
+        return stats
+
+
+class CpuUtilizationSensor(Sensor):
+    """
+    Machine-wide CPU utilisation in percent since the previous read.
+    """
+
+    name = 'cpu_utilization'
+    fields = ('cpu_percent',)
+
+    def __init__(self, period=1):
+        self.period = period
+
+    def open(self, engine):
+        import psutil
+        self._psutil = psutil
+        psutil.cpu_percent(interval=None)
+
+    def read(self, timestamp, elapsed):
+        return [(self._psutil.cpu_percent(interval=None),)]
+
+
+class ProcessRssSensor(Sensor):
+    """
+    Resident set size of one process, through a cached psutil handle.
+    """
+
+    name = 'rss'
+    fields = ('rss_bytes',)
+
+    def __init__(self, pid, period=1):
+        self.pid = pid
+        self.period = period
+        self._process = None
+
+    def open(self, engine):
+        import psutil
+        self._psutil = psutil
+        self._process = psutil.Process(self.pid)
+
+    def read(self, timestamp, elapsed):
+        try:
+            return [(self._process.memory_info().rss,)]
+        except (self._psutil.NoSuchProcess, self._psutil.AccessDenied):
+            return None
+
+
+def create_monitoring_engine(root_pid=None, interval=0.1, gpu_period=10, tree_period=5, include_cpu=None,
+                             include_gpu=True, output_dir='.', cpu_tdp=None, cpu_model=None, include_overhead=True,
+                             log_format='csv', power_tiers=None, keep_raw_log=True):
+    """
+    Builds the engine used by bash mode, direct mode and Amd_Power_Log.
+
+    Args:
+        root_pid (int): The model process, for process tree attribution and its memory energy; None
+            to skip both.
+        interval (float): The engine tick in seconds, also the CPU energy resolution.
+        gpu_period (int): Ticks between GPU power and CPU utilisation samples.
+        tree_period (int): Ticks between process tree CPU time samples.
+        include_cpu (bool): Whether to sample RAPL into intel_power_gadget_log.csv; by default on
+            Linux when RAPL is readable. Elsewhere Intel Power Gadget wraps the whole run instead.
+        include_gpu (bool): Whether to sample GPU power into gpu_power_log.csv.
+        output_dir (str): Where the logs and the attribution summary are written.
+        cpu_tdp (float): Without RAPL, the TDP for a CpuPowerModelSensor estimating the CPU energy
+            from utilisation and clock frequency; None to leave the CPU unmodelled.
+        cpu_model (str): The CPU model, for the calibrated parameters of the power model.
+        include_overhead (bool): Whether to measure the CPU time of this process and its non-model
+            children into monitor_overhead.json.
+        log_format (str): 'csv' or 'binary', the format of the CPU and GPU power logs; both are
+            read by the parsers, see sample_log.
+        power_tiers: Bucket widths in seconds, or True for power_tiers.DEFAULT_TIERS, into which
+            the CPU and GPU energy is compacted during the run; None for no tiers.
+        keep_raw_log (bool): Whether the raw power logs are written besides the tiers; ignored
+            without power_tiers.
+
+    Returns:
+        SamplingEngine: The engine, not started yet.
+    """
+    from rapl_monitor import RaplEnergySensor, rapl_available
+    from gpu_monitor import GpuPowerLogSensor
+    from attribution import ProcessTreeTracker, ATTRIBUTION_FILE, rapl_package_energy_reader
+    from cpu_power_model import CpuPowerModelSensor, POWER_MODEL_FILE, POWER_MODEL_LOG, load_power_model
+    from self_overhead import SelfOverheadSensor, OVERHEAD_FILE
+    from memory_energy import MemoryEnergySensor, MEMORY_ENERGY_FILE, MEMORY_ENERGY_LOG, rapl_dram_energy_reader
+
+    if include_cpu is None:
+        include_cpu = sys.platform.lower().startswith('linux') and rapl_available()
+    raw_log = keep_raw_log or not power_tiers
+    engine = SamplingEngine(interval=interval)
+    if include_cpu:
+        engine.add_sensor(RaplEnergySensor(os.path.join(output_dir, 'intel_power_gadget_log.csv'),
+                                           log_format=log_format, tiers=power_tiers, raw_log=raw_log))
+    elif cpu_tdp:
+        engine.add_sensor(CpuPowerModelSensor(load_power_model(cpu_model, cpu_tdp),
+                                              summary_path=os.path.join(output_dir, POWER_MODEL_FILE),
+                                              log_path=os.path.join(output_dir, POWER_MODEL_LOG)))
+    if include_gpu:
+        engine.add_sensor(GpuPowerLogSensor(os.path.join(output_dir, 'gpu_power_log.csv'), period=gpu_period,
+                                            log_format=log_format, tiers=power_tiers, raw_log=raw_log))
+    engine.add_sensor(CpuUtilizationSensor(period=gpu_period))
+    if root_pid is not None:
+        try:
+            energy_reader = rapl_package_energy_reader()
+        except OSError:
+            energy_reader = None
+        engine.add_sensor(ProcessTreeTracker(root_pid, energy_reader=energy_reader, period=tree_period,
+                                             summary_path=os.path.join(output_dir, ATTRIBUTION_FILE)))
+        try:
+            dram_energy_reader = rapl_dram_energy_reader()
+        except OSError:
+            dram_energy_reader = None
+        engine.add_sensor(MemoryEnergySensor(root_pid, dram_energy_reader=dram_energy_reader,
+                                             summary_path=os.path.join(output_dir, MEMORY_ENERGY_FILE),
+                                             log_path=os.path.join(output_dir, MEMORY_ENERGY_LOG)))
+    if include_overhead:
+        engine.add_sensor(SelfOverheadSensor(model_pid=root_pid, period=gpu_period,
+                                             summary_path=os.path.join(output_dir, OVERHEAD_FILE)))
+    return engine
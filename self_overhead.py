@@ -0,0 +1,251 @@
+import os
+import json
+import logging
+import threading
+
+from sampling_engine import Sensor
+
+logger = logging.getLogger(__name__)
+
+OVERHEAD_FILE = 'monitor_overhead.json'
+PROC_ROOT = '/proc'
+
+
+def _stat_cpu_ticks(stat_path, include_children=False):
+    # the command name in parentheses may contain spaces, so split after its closing bracket
+    with open(stat_path, 'rb') as file:
+        data = file.read()
+    name = data[data.index(b'(') + 1:data.rindex(b')')].decode(errors='replace')
+    fields = data[data.rindex(b')') + 2:].split()
+    ticks = int(fields[11]) + int(fields[12])
+    if include_children:
+        ticks += int(fields[13]) + int(fields[14])
+    return name, ticks
+
+
+class SelfOverheadSensor(Sensor):
+    """
+    Measures the CPU time ProcessC itself spends observing the model.
+
+    The process total comes from os.times(); each read also records the CPU time of every thread
+    of this process and of every child that is not the model, e.g. the sampling engine thread, the
+    output pumps or an nvidia-smi call, so the overhead can be broken down. Threads or children
+    that exit keep the last time seen. The whole-system busy time of the same window gives the
+    share of the measured CPU energy spent on observation; at close the summary is written to
+    summary_path. Helpers outside this process, such as the Intel PowerLog that launches the
+    monitored script on Windows and macOS, are measured with ProcessCpuMeter and added to the
+    summary with add_helper_overhead.
+    """
+
+    name = 'monitor_overhead'
+    fields = ('monitor_cpu_sec', 'system_busy_sec')
+
+    def __init__(self, model_pid=None, period=10, summary_path=None, proc_root=PROC_ROOT):
+        self.model_pid = model_pid
+        self.period = period
+        self.summary_path = summary_path
+        self.proc_root = proc_root
+        self._use_proc = os.path.isdir(f'{proc_root}/{os.getpid()}/task')
+        self._clock_ticks = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+        self._engine = None
+        self._thread_names = {}
+        self.threads = {}
+        self.children = {}
+
+    @staticmethod
+    def _process_cpu_time():
+        times = os.times()
+        return times.user + times.system
+
+    def _thread_times(self):
+        # a joined thread can linger in /proc for a moment, keep the name it had
+        names = self._thread_names
+        names.update((thread.native_id, thread.name) for thread in threading.enumerate())
+        if self._use_proc:
+            times = {}
+            task_root = f'{self.proc_root}/{os.getpid()}/task'
+            for tid in os.listdir(task_root):
+                try:
+                    comm, ticks = _stat_cpu_ticks(f'{task_root}/{tid}/stat')
+                except (OSError, ValueError):
+                    continue
+                times[int(tid)] = (names.get(int(tid), comm), ticks / self._clock_ticks)
+            return times
+        import psutil
+        return {thread.id: (names.get(thread.id, str(thread.id)), thread.user_time + thread.system_time)
+                for thread in psutil.Process().threads()}
+
+    def _child_times(self):
+        times = {}
+        if self._use_proc:
+            pid = os.getpid()
+            task_root = f'{self.proc_root}/{pid}/task'
+            children = set()
+            for tid in os.listdir(task_root):
+                try:
+                    with open(f'{task_root}/{tid}/children', 'r') as file:
+                        children.update(int(child) for child in file.read().split())
+                except OSError:
+                    continue
+            for child in children - {self.model_pid}:
+                try:
+                    comm, ticks = _stat_cpu_ticks(f'{self.proc_root}/{child}/stat', include_children=True)
+                except (OSError, ValueError):
+                    continue
+                times[child] = (comm, ticks / self._clock_ticks)
+            return times
+        import psutil
+        for child in psutil.Process().children():
+            if child.pid == self.model_pid:
+                continue
+            try:
+                cpu = child.cpu_times()
+                times[child.pid] = (child.name(), cpu.user + cpu.system + cpu.children_user + cpu.children_system)
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        return times
+
+    def _sample(self):
+        for tid, (name, seconds) in self._thread_times().items():
+            self.threads[tid] = (name, seconds - self._thread_baseline.get(tid, 0.0))
+        for pid, (name, seconds) in self._child_times().items():
+            self.children[pid] = (name, seconds - self._child_baseline.get(pid, 0.0))
+
+    def open(self, engine):
+        from attribution import system_busy_time
+        self._engine = engine
+        self._system_busy_time = system_busy_time
+        self.before_start_cpu_sec = self._process_cpu_time()
+        self._start_busy = system_busy_time()
+        self._thread_baseline = {tid: seconds for tid, (_, seconds) in self._thread_times().items()}
+        self._child_baseline = {pid: seconds for pid, (_, seconds) in self._child_times().items()}
+        self.threads, self.children = {}, {}
+
+    def read(self, timestamp, elapsed):
+        self._sample()
+        return [(self.monitor_cpu_sec(), self._system_busy_time() - self._start_busy)]
+
+    def monitor_cpu_sec(self):
+        """Returns the CPU seconds of this process and its non-model children since the engine started."""
+        process = self._process_cpu_time() - self.before_start_cpu_sec
+        return process + sum(seconds for _, seconds in self.children.values())
+
+    def close(self, timestamp, elapsed):
+        self._sample()
+        if self.summary_path is not None:
+            with open(self.summary_path, 'w') as file:
+                json.dump(self.summary(), file, indent=4)
+
+    def summary(self):
+        """
+        Summarises the observation overhead of the run.
+
+        Returns:
+            dict: monitor_cpu_time_sec in total, system_busy_time_sec over the same window, the
+            resulting overhead_share of the whole-system CPU energy, and the CPU seconds by thread,
+            by child process and spent reading each sensor. before_start_cpu_sec is what this
+            process used before sampling started, e.g. waiting for the model in direct mode.
+        """
+        monitor_cpu_sec = self.monitor_cpu_sec()
+        busy_sec = self._system_busy_time() - self._start_busy
+        by_thread = {}
+        for name, seconds in self.threads.values():
+            by_thread[name] = by_thread.get(name, 0.0) + seconds
+        # threads that exited between samples only show in the process total
+        process_sec = monitor_cpu_sec - sum(seconds for _, seconds in self.children.values())
+        unaccounted = process_sec - sum(by_thread.values())
+        if unaccounted > 0:
+            by_thread['exited threads'] = unaccounted
+        return {
+            'monitor_cpu_time_sec': monitor_cpu_sec,
+            'system_busy_time_sec': busy_sec,
+            'overhead_share': min(1.0, monitor_cpu_sec / busy_sec) if busy_sec > 0 else 0.0,
+            'before_start_cpu_sec': self.before_start_cpu_sec,
+            'threads': by_thread,
+            'children': {f'{name} ({pid})': seconds for pid, (name, seconds) in self.children.items()},
+            'sensor_read_sec': self._engine.stats()['sensor_read_sec'] if self._engine is not None else {},
+        }
+
+
+class ProcessCpuMeter:
+    """
+    Follows the CPU time of a helper process ProcessC launched, such as Intel PowerLog, while it runs.
+
+    The launched process and its descendants whose name starts with name_prefix are polled
+    through psutil every interval seconds, keeping the last time seen of those that exit, so a
+    shell wrapper and the helper are counted but the monitored script and model it starts are not.
+    """
+
+    def __init__(self, pid, name_prefix, interval=1.0):
+        self.pid = pid
+        self.name_prefix = name_prefix.lower()
+        self.interval = interval
+        self._times = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def sample(self):
+        import psutil
+        try:
+            root = psutil.Process(self.pid)
+            processes = [root] + [child for child in root.children(recursive=True)
+                                  if child.name().lower().startswith(self.name_prefix)]
+        except psutil.Error:
+            return
+        for process in processes:
+            try:
+                times = process.cpu_times()
+            except psutil.Error:
+                continue
+            self._times[process.pid] = times.user + times.system
+
+    def _run(self):
+        while not self._stop_event.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        self.sample()
+        self._thread = threading.Thread(target=self._run, name='helper cpu meter', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stops polling and returns the CPU seconds of the helper processes."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.cpu_sec
+
+    @property
+    def cpu_sec(self):
+        return sum(self._times.values())
+
+
+def add_helper_overhead(name, cpu_sec, file_path=OVERHEAD_FILE):
+    """
+    Adds the CPU time of a helper process outside the engine's process, e.g. the PowerLog parent
+    of the monitored script, to the overhead summary written by SelfOverheadSensor.
+
+    Returns:
+        dict: The updated summary, or None when the run wrote none.
+    """
+    summary = load_overhead(file_path)
+    if summary is None:
+        return None
+    summary['children'][name] = summary['children'].get(name, 0.0) + cpu_sec
+    summary['monitor_cpu_time_sec'] += cpu_sec
+    busy_sec = summary['system_busy_time_sec']
+    summary['overhead_share'] = min(1.0, summary['monitor_cpu_time_sec'] / busy_sec) if busy_sec > 0 else 0.0
+    with open(file_path, 'w') as file:
+        json.dump(summary, file, indent=4)
+    return summary
+
+
+def load_overhead(file_path=OVERHEAD_FILE):
+    """
+    Loads the overhead summary written by the monitoring run, or None if there is none.
+    """
+    if not os.path.isfile(file_path):
+        return None
+    with open(file_path, 'r') as file:
+        return json.load(file)
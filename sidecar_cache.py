@@ -0,0 +1,48 @@
+import os
+import pickle
+import logging
+
+logger = logging.getLogger(__name__)
+
+SIDECAR_SUFFIX = '.index'
+
+
+def load_or_build(source_path, build, version=1, sidecar_path=None):
+    """
+    Returns a structure derived from a source file, cached in a pickle sidecar next to it.
+
+    The sidecar stores the size and modification time of the source it was built from, so it is
+    rebuilt only when the source file changes or the format version is bumped. When the sidecar
+    cannot be written, for example in a read-only install, the structure is built in memory.
+
+    Args:
+        source_path (str): The file the structure is derived from, e.g. a CSV in database/.
+        build (callable): Takes source_path and returns the structure; must be picklable.
+        version (int): The format version of the structure.
+        sidecar_path (str): Where to cache it, by default the source path plus '.index'.
+
+    Returns:
+        The structure returned by build, fresh or from the sidecar.
+    """
+    sidecar_path = sidecar_path or source_path + SIDECAR_SUFFIX
+    stat = os.stat(source_path)
+    key = (version, stat.st_size, stat.st_mtime_ns)
+    try:
+        with open(sidecar_path, 'rb') as file:
+            cached_key, data = pickle.load(file)
+        if cached_key == key:
+            return data
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        pass
+
+    data = build(source_path)
+    temporary_path = f'{sidecar_path}.{os.getpid()}.tmp'
+    try:
+        with open(temporary_path, 'wb') as file:
+            pickle.dump((key, data), file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary_path, sidecar_path)
+    except OSError as e:
+        logger.debug(f"Could not write the index sidecar {sidecar_path}: {e}")
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+    return data
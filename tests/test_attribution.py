@@ -0,0 +1,96 @@
+import os
+import math
+
+import pytest
+
+from attribution import ProcessTreeTracker, proc_tree_pids
+
+
+def _children(proc_root, pid, tid, children):
+    task = proc_root / str(pid) / 'task' / str(tid)
+    os.makedirs(str(task), exist_ok=True)
+    (task / 'children').write_text(' '.join(str(child) for child in children) + ' ')
+
+
+def test_tree_is_walked_through_every_thread(tmp_path):
+    proc_root = tmp_path / 'proc'
+    _children(proc_root, 100, 100, [200, 201])
+    _children(proc_root, 100, 101, [202])
+    _children(proc_root, 200, 200, [300])
+    _children(proc_root, 202, 202, [])
+    _children(proc_root, 300, 300, [])
+    # the parent of the root is not part of the tree
+    _children(proc_root, 999, 999, [100])
+    # 201 has no /proc entry, as when it exits during the walk; it is reported without children
+    assert proc_tree_pids(100, str(proc_root)) == {100, 200, 201, 202, 300}
+    assert proc_tree_pids(300, str(proc_root)) == {300}
+
+
+def test_tree_without_children_files(tmp_path):
+    os.makedirs(str(tmp_path / 'proc' / '100'))
+    assert proc_tree_pids(100, str(tmp_path / 'proc')) is None
+
+
+class FakeEngine:
+    start_wall = 1700000000.0
+
+
+def _tracker(readings, energy=True):
+    """A tracker replaying (tree CPU seconds, busy seconds, package Joules) readings."""
+    tracker = ProcessTreeTracker(100, energy_reader=(lambda: None) if energy else None)
+    samples = iter(readings)
+
+    def read(timestamp):
+        tree, busy, joules = next(samples)
+        return timestamp, tree, busy, joules if energy else None
+    tracker._read = read
+    tracker.open(FakeEngine())
+    return tracker
+
+
+def test_energy_is_split_by_the_cpu_share_of_each_window():
+    tracker = _tracker([(0.0, 0.0, 0.0), (1.0, 4.0, 100.0), (4.0, 7.0, 200.0)])
+    assert tracker.read(FakeEngine.start_wall + 1, 1)[0] == (1.0, 4.0, 100.0, pytest.approx(25.0))
+    assert tracker.read(FakeEngine.start_wall + 2, 2)[0] == (3.0, 3.0, 100.0, pytest.approx(100.0))
+    summary = tracker.summary()
+    assert summary['attributed_package_energy_j'] == pytest.approx(125.0)
+    assert summary['measured_package_energy_j'] == pytest.approx(200.0)
+    assert summary['energy_share'] == pytest.approx(0.625)
+    assert summary['cpu_share'] == pytest.approx(4.0 / 7.0)
+
+
+def test_share_is_clamped_to_the_whole_window():
+    # the tree can accrue more CPU time than the machine reports busy, e.g. children reaped late
+    tracker = _tracker([(0.0, 0.0, 0.0), (5.0, 2.0, 50.0)])
+    assert tracker.read(FakeEngine.start_wall + 1, 1)[0] == (5.0, 2.0, 50.0, 50.0)
+    assert tracker.summary()['cpu_share'] == 1.0
+
+
+def test_idle_window_charges_no_energy():
+    tracker = _tracker([(0.0, 3.0, 0.0), (0.0, 3.0, 10.0)])
+    assert tracker.read(FakeEngine.start_wall + 1, 1)[0] == (0.0, 0.0, 10.0, 0.0)
+    assert tracker.summary()['energy_share'] == 0.0
+
+
+def test_negative_deltas_are_not_recorded():
+    tracker = _tracker([(5.0, 10.0, 0.0), (4.0, 12.0, 20.0)])
+    assert tracker.read(FakeEngine.start_wall + 1, 1)[0] == (0.0, 2.0, 20.0, 0.0)
+    assert tracker.tree_cpu_sec == 0.0
+
+
+def test_without_energy_reader_the_energy_is_nan():
+    tracker = _tracker([(0.0, 0.0, None), (1.0, 2.0, None)], energy=False)
+    tree, busy, energy, attributed = tracker.read(FakeEngine.start_wall + 1, 1)[0]
+    assert (tree, busy) == (1.0, 2.0)
+    assert math.isnan(energy) and math.isnan(attributed)
+    summary = tracker.summary()
+    assert summary['measured_package_energy_j'] is None
+    assert summary['energy_share'] == summary['cpu_share'] == 0.5
+
+
+def test_close_writes_the_summary(tmp_path):
+    tracker = _tracker([(0.0, 0.0, 0.0), (1.0, 2.0, 10.0)])
+    tracker.summary_path = str(tmp_path / 'process_attribution.json')
+    tracker.close(FakeEngine.start_wall + 1, 1)
+    from attribution import load_attribution
+    assert load_attribution(tracker.summary_path)['energy_share'] == pytest.approx(0.5)
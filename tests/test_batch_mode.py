@@ -0,0 +1,113 @@
+import os
+import json
+import datetime
+
+import pandas as pd
+import pytest
+
+from batch_mode import expand_sweep, batch_total
+
+HOUR = 1699999200
+
+
+@pytest.fixture
+def projects():
+    return {'test7': {'monitoring_mode': 'bash mode', 'grid_carbon_intensity': 400.0,
+                      'model_wrapping_settings': {'process_based_model_dir': 'C:/rz/base', 'threads': 1}}}
+
+
+def test_sweep_grid_sets_dotted_keys_on_copies(projects):
+    runs = expand_sweep(projects, {'base_project': 'test7', 'name': 'rz',
+                                   'parameters': {'model_wrapping_settings.threads': [1, 2],
+                                                  'pue': [1.0, 1.2]}})
+    assert [name for name, _, _ in runs] == ['rz_0000', 'rz_0001', 'rz_0002', 'rz_0003']
+    assert [parameters for _, _, parameters in runs][1] == {'model_wrapping_settings.threads': 1, 'pue': 1.2}
+    name, setting, _ = runs[3]
+    assert setting['name'] == name
+    assert setting['model_wrapping_settings'] == {'process_based_model_dir': 'C:/rz/base', 'threads': 2}
+    assert setting['pue'] == 1.2
+    assert 'pue' not in projects['test7']
+    assert projects['test7']['model_wrapping_settings']['threads'] == 1
+
+
+def test_sweep_runs_take_their_names_and_overrides(projects):
+    runs = expand_sweep(projects, {'base_project': 'test7', 'runs': [
+        {'name': 'wet', 'overrides': {'model_wrapping_settings.process_based_model_dir': 'C:/rz/wet'}},
+        {'overrides': {'grid_carbon_intensity': 50.0}}]})
+    assert [name for name, _, _ in runs] == ['wet', 'test7_0001']
+    assert runs[0][1]['model_wrapping_settings']['process_based_model_dir'] == 'C:/rz/wet'
+    assert runs[1][1]['grid_carbon_intensity'] == 50.0
+
+
+def _summary(*rows):
+    return pd.DataFrame([{'Project_name': name, 'CPU Energy (kWh)': cpu, 'Total Energy Usage (kWh)': cpu,
+                          'Total Carbon Emission (g/CO2 Eq)': emission,
+                          'Grid Carbon Intensity (g/CO2 Eq)': emission / cpu} for name, cpu, emission in rows])
+
+
+def _write_json(path, content):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        json.dump(content, file)
+
+
+def _write_gpu_log(path, start, end, power_w=100.0, step=60):
+    with open(path, 'w') as file:
+        file.write('timestamp,gpu,power.draw,power.limit\n')
+        for timestamp in range(start, end + 1, step):
+            file.write(f'{datetime.datetime.fromtimestamp(timestamp).isoformat()},0,{power_w},\n')
+
+
+def test_total_sums_the_runs_and_skips_failed_ones(tmp_path):
+    runs = [('a', {'grid_carbon_intensity': 100.0}, {}), ('b', {'grid_carbon_intensity': 100.0}, {}),
+            ('c', {'grid_carbon_intensity': 100.0}, {})]
+    summary = pd.concat([_summary(('a', 1.0, 100.0), ('b', 2.0, 200.0)),
+                         pd.DataFrame([{'Project_name': 'c', 'Error': 'the model run failed'}])], ignore_index=True)
+    total = batch_total(runs, summary, 12.0, str(tmp_path), shared_gpu=False)
+    assert total['Project_name'] == 'TOTAL'
+    assert total['Elapsed Time (seconds)'] == 12.0
+    assert total['CPU Energy (kWh)'] == pytest.approx(3.0)
+    assert total['Total Carbon Emission (g/CO2 Eq)'] == pytest.approx(300.0)
+    assert 'GPU Energy (kWh)' not in total
+
+
+def test_shared_monitor_overhead_is_charged_per_cpu_second(tmp_path):
+    runs = [('a', {'grid_carbon_intensity': 100.0}, {}), ('b', {'grid_carbon_intensity': 100.0}, {})]
+    _write_json(str(tmp_path / 'a' / 'process_attribution.json'), {'tree_cpu_time_sec': 30.0})
+    _write_json(str(tmp_path / 'b' / 'process_attribution.json'), {'tree_cpu_time_sec': 10.0})
+    _write_json(str(tmp_path / 'monitor_overhead.json'), {'monitor_cpu_time_sec': 2.0})
+    total = batch_total(runs, _summary(('a', 1.0, 100.0), ('b', 1.0, 100.0)), 60.0, str(tmp_path),
+                        shared_gpu=True)
+    assert total['Monitor Overhead CPU Energy (kWh)'] == pytest.approx(2.0 / 40.0 * 2.0)
+    assert batch_total(runs, _summary(('a', 1.0, 100.0), ('b', 1.0, 100.0)), 60.0, str(tmp_path),
+                       shared_gpu=False).get('Monitor Overhead CPU Energy (kWh)') is None
+
+
+def test_shared_gpu_at_a_constant_intensity(tmp_path):
+    runs = [('a', {'grid_carbon_intensity': 400.0}, {}), ('b', {'grid_carbon_intensity': 400.0}, {})]
+    _write_gpu_log(str(tmp_path / 'gpu_power_log.csv'), HOUR, HOUR + 3600)
+    total = batch_total(runs, _summary(('a', 1.0, 400.0), ('b', 1.0, 400.0)), 60.0, str(tmp_path),
+                        shared_gpu=True)
+    assert total['GPU Energy (kWh)'] == pytest.approx(0.1)
+    assert total['Total Energy Usage (kWh)'] == pytest.approx(2.1)
+    assert total['Total Carbon Emission (g/CO2 Eq)'] == pytest.approx(800.0 + 40.0)
+
+
+def test_shared_gpu_is_joined_with_an_hourly_intensity_list(tmp_path):
+    history = [{'datetime': datetime.datetime.fromtimestamp(HOUR + offset, datetime.timezone.utc).isoformat(),
+                'carbonIntensity': intensity} for offset, intensity in ((0, 100.0), (3600, 300.0))]
+    runs = [('a', {'grid_carbon_intensity': history}, {}), ('b', {'grid_carbon_intensity': list(history)}, {})]
+    _write_gpu_log(str(tmp_path / 'gpu_power_log.csv'), HOUR, HOUR + 7200)
+    total = batch_total(runs, _summary(('a', 1.0, 200.0), ('b', 1.0, 200.0)), 60.0, str(tmp_path),
+                        shared_gpu=True)
+    assert total['GPU Energy (kWh)'] == pytest.approx(0.2)
+    # 0.1 kWh in each hour, at that hour's intensity
+    assert total['Total Carbon Emission (g/CO2 Eq)'] == pytest.approx(400.0 + 0.1 * 100.0 + 0.1 * 300.0)
+
+
+def test_shared_gpu_uses_the_batch_mean_when_runs_differ(tmp_path):
+    runs = [('a', {'grid_carbon_intensity': 100.0}, {}), ('b', {'grid_carbon_intensity': 300.0}, {})]
+    _write_gpu_log(str(tmp_path / 'gpu_power_log.csv'), HOUR, HOUR + 3600)
+    total = batch_total(runs, _summary(('a', 1.0, 100.0), ('b', 1.0, 300.0)), 60.0, str(tmp_path),
+                        shared_gpu=True)
+    assert total['Total Carbon Emission (g/CO2 Eq)'] == pytest.approx(400.0 + 0.1 * 200.0)
@@ -0,0 +1,84 @@
+import json
+import datetime
+
+import pytest
+
+from carbon_accounting import (IntensitySeries, intensity_at, iter_intensity, asof_emissions, account_emissions,
+                               iter_constant_power, JOULES_PER_KWH)
+
+HOUR = 3600.0
+T0 = 1700000000.0 - 1700000000.0 % HOUR
+# 100 g/kWh from T0, 200 from T0 + 1 h, 400 from T0 + 2 h
+POINTS = [(T0, 100.0), (T0 + HOUR, 200.0), (T0 + 2 * HOUR, 400.0)]
+
+
+def _records(points):
+    return [{'datetime': datetime.datetime.fromtimestamp(point_time, datetime.timezone.utc).isoformat(),
+             'carbonIntensity': value} for point_time, value in points]
+
+
+def test_sources_stream_the_same_points(tmp_path):
+    records = _records(POINTS)
+    csv_path = tmp_path / 'intensity.csv'
+    csv_path.write_text('datetime,carbonIntensity\n' + ''.join(f"{record['datetime']},{record['carbonIntensity']}\n"
+                                                               for record in records))
+    json_path = tmp_path / 'intensity.json'
+    json_path.write_text(json.dumps({'history': records[::-1]}))
+    for source in (records, str(csv_path), str(json_path)):
+        assert list(iter_intensity(source)) == POINTS
+
+
+@pytest.mark.parametrize('timestamp, expected', [
+    (T0 - HOUR, 100.0),
+    (T0, 100.0),
+    (T0 + HOUR - 1, 100.0),
+    (T0 + HOUR, 200.0),
+    (T0 + 1.5 * HOUR, 200.0),
+    (T0 + 2 * HOUR, 400.0),
+    (T0 + 30 * HOUR, 400.0),
+])
+def test_intensity_at(timestamp, expected):
+    series = IntensitySeries(_records(POINTS))
+    assert series.at(timestamp) == expected
+    assert intensity_at(_records(POINTS), timestamp) == expected
+
+
+def test_empty_series_has_no_intensity():
+    assert len(IntensitySeries([])) == 0
+    assert intensity_at([], T0) is None
+
+
+def test_intervals_join_at_their_midpoint():
+    intervals = [
+        # before the first point, charged at the first intensity
+        (T0 - 600, T0 - 300, 1.0),
+        # straddles the 1 h point, its midpoint is still in the first hour
+        (T0 + HOUR - 600, T0 + HOUR + 300, 2.0),
+        # straddles it with the midpoint after it
+        (T0 + HOUR - 300, T0 + HOUR + 600, 4.0),
+        # after the last point, charged at the last intensity
+        (T0 + 5 * HOUR, T0 + 5 * HOUR + 60, 8.0),
+    ]
+    periods = list(asof_emissions(intervals, POINTS))
+    assert [(start, intensity) for start, intensity, _, _ in periods] == [
+        (T0, 100.0), (T0 + HOUR, 200.0), (T0 + 2 * HOUR, 400.0)]
+    assert [energy * JOULES_PER_KWH for _, _, energy, _ in periods] == pytest.approx([3.0, 4.0, 8.0])
+    assert [emission for _, _, _, emission in periods] == pytest.approx(
+        [3.0 / JOULES_PER_KWH * 100, 4.0 / JOULES_PER_KWH * 200, 8.0 / JOULES_PER_KWH * 400])
+
+
+def test_empty_series_is_rejected():
+    with pytest.raises(ValueError):
+        list(asof_emissions([(T0, T0 + 1, 1.0)], []))
+
+
+def test_streams_are_merged_and_written(tmp_path):
+    output_path = tmp_path / 'emissions.csv'
+    # 1 W for 3 h on two streams, 3 * 3600 J each
+    streams = [iter_constant_power(T0, T0 + 3 * HOUR, 1.0, step=HOUR) for _ in range(2)]
+    result = account_emissions(streams, _records(POINTS), str(output_path))
+    hour_kwh = 2 * HOUR / JOULES_PER_KWH
+    assert result['energy_kwh'] == pytest.approx(3 * hour_kwh)
+    assert result['emission_g'] == pytest.approx(700 * hour_kwh)
+    assert result['average_intensity'] == pytest.approx(700 / 3)
+    assert len(output_path.read_text().splitlines()) == 4
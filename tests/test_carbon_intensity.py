@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from carbon_intensity import CarbonIntensityIndex, INTENSITY_COLUMN
+
+ROWS = [
+    ('Canada', 'CAN', 2000, 240.0),
+    ('Canada', 'CAN', 2002, 250.0),
+    ('Canada', 'CAN', 2006, 210.0),
+    ('Europe (Ember)', '', 2001, 300.0),
+    ('Europe (Ember)', '', 2003, 'n/a'),
+]
+
+
+def _write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8') as file:
+        file.write(f'Entity,Code,Year,{INTENSITY_COLUMN}\n')
+        for row in rows:
+            file.write(','.join(str(value) for value in row) + '\n')
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = tmp_path / 'carbon-intensity-electricity.csv'
+    _write_csv(path, ROWS)
+    return CarbonIntensityIndex(str(path))
+
+
+@pytest.mark.parametrize('entity, year, fallback, expected', [
+    ('Canada', 2002, 'interpolate', 250.0),
+    ('CAN', 2002, None, 250.0),
+    ('can', 2000, None, 240.0),
+    ('Canada', 2001, None, None),
+    ('Canada', 2001, 'interpolate', 245.0),
+    ('Canada', 2003, 'interpolate', 240.0),
+    ('Canada', 2003, 'nearest', 250.0),
+    ('Canada', 2005, 'nearest', 210.0),
+    # a tie goes to the earlier year
+    ('Canada', 2004, 'nearest', 250.0),
+    ('Canada', 1990, 'interpolate', 240.0),
+    ('Canada', 2030, 'nearest', 210.0),
+    ('Europe (Ember)', 2003, 'interpolate', 300.0),
+    ('Atlantis', 2002, 'interpolate', None),
+])
+def test_lookup(index, entity, year, fallback, expected):
+    value = index.lookup(entity, year, fallback)
+    assert value == (pytest.approx(expected) if expected is not None else None)
+
+
+def test_lookup_many_keeps_the_order(index):
+    assert index.lookup_many([('CAN', 2001), ('Atlantis', 2001), ('Europe (Ember)', 2001)]) == [245.0, None, 300.0]
+
+
+def test_edited_csv_is_reindexed(tmp_path, index):
+    assert index.lookup('Canada', 2000) == 240.0
+    stat = os.stat(index.csv_path)
+    _write_csv(index.csv_path, [('Canada', 'CAN', 2000, 100.0)] + ROWS[1:])
+    os.utime(index.csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert CarbonIntensityIndex(index.csv_path).lookup('Canada', 2000) == 100.0
+    assert CarbonIntensityIndex(index.csv_path).lookup('Canada', 2001) == pytest.approx(175.0)
@@ -0,0 +1,101 @@
+import os
+import json
+import itertools
+
+import pytest
+
+import cpu_power_model
+from cpu_power_model import CpuPowerModel, CpuPowerModelSensor, core_reader, load_power_model, save_calibration
+
+
+def _write_stat(path, cores, tick=0):
+    # large counters, as on a long-running many-core host, and a long interrupt line after them;
+    # core n is busy (n + 1) / (2 * cores) of the ticks
+    base = 10 ** 17
+    lines = ['cpu  ' + ' '.join(['0'] * 10)]
+    for core in range(cores):
+        busy = tick * (core + 1) // (2 * cores)
+        lines.append(f'cpu{core} {base + busy} 0 0 {base + tick - busy} 0 0 0 0 0 0')
+    lines.append('intr ' + ' '.join(str(value) for value in range(5000)))
+    lines.append('ctxt 123')
+    with open(path, 'w') as file:
+        file.write('\n'.join(lines) + '\n')
+
+
+def test_every_core_line_is_read_whole(tmp_path, monkeypatch):
+    # the first read is sized for two cores and ends inside the per-core lines
+    monkeypatch.setattr(cpu_power_model.os, 'cpu_count', lambda: 2)
+    stat_path = str(tmp_path / 'stat')
+    _write_stat(stat_path, 64, tick=1000)
+    reader = core_reader(stat_path, str(tmp_path / 'cpu'))
+    try:
+        cores = reader.read()
+    finally:
+        reader.close()
+    assert sorted(cores) == list(range(64))
+    busy, total, ratio = cores[63]
+    assert busy == 10 ** 17 + 500
+    assert total == 2 * 10 ** 17 + 1000
+    assert ratio == 1.0
+
+
+def test_power_scales_with_load_and_clock():
+    model = CpuPowerModel(100.0, idle_fraction=0.2, frequency_exponent=2.0)
+    assert model.power(0.0) == pytest.approx(20.0)
+    assert model.power(1.0) == pytest.approx(100.0)
+    assert model.power(0.5, 0.5) == pytest.approx(100.0 * (0.2 + 0.8 * 0.5 * 0.25))
+
+
+def test_calibration_recovers_known_coefficients():
+    truth = CpuPowerModel(65.0, idle_fraction=0.15, dynamic_fraction=0.7, frequency_exponent=2.0)
+    grid = list(itertools.product([0.0, 0.1, 0.3, 0.6, 1.0], [0.4, 0.7, 1.0]))
+    utilization = [u for u, _ in grid] + [0.5]
+    frequency_ratio = [r for _, r in grid] + [0.8]
+    measured = [truth.power(u, r) for u, r in zip(utilization, frequency_ratio)]
+    # samples without a measurement are left out of the fit
+    measured[-1] = float('nan')
+    model = CpuPowerModel(65.0)
+    rmse_w = model.calibrate(utilization, frequency_ratio, measured)
+    assert rmse_w == pytest.approx(0.0, abs=1e-9)
+    assert model.idle_fraction == pytest.approx(0.15)
+    assert model.dynamic_fraction == pytest.approx(0.7)
+    assert model.frequency_exponent == 2.0
+
+
+def test_calibration_needs_two_samples():
+    with pytest.raises(ValueError):
+        CpuPowerModel(65.0).calibrate([0.5, 0.6], [1.0, 1.0], [30.0, float('nan')])
+
+
+def test_calibration_is_stored_per_model_and_rescaled_to_the_tdp(tmp_path):
+    calibration_path = str(tmp_path / 'cpu_power_calibration.json')
+    model = CpuPowerModel(65.0, idle_fraction=0.1, dynamic_fraction=0.8, frequency_exponent=1.5)
+    save_calibration('AMD Ryzen 5 5600X 6-Core Processor', model, 1.2, 100, calibration_path)
+    with open(calibration_path) as file:
+        assert len(json.load(file)) == 1
+    loaded = load_power_model('AMD Ryzen 5 5600X 6-Core Processor', 130.0, calibration_path)
+    assert loaded.frequency_exponent == 1.5
+    assert loaded.power(0.7, 0.9) == pytest.approx(model.power(0.7, 0.9))
+    assert load_power_model('Intel Core i7-8700', 65.0, calibration_path).idle_fraction == 0.2
+
+
+class FakeEngine:
+    start_wall = 1700000000.0
+
+
+def test_sensor_integrates_the_modelled_power(tmp_path):
+    stat_path = str(tmp_path / 'stat')
+    _write_stat(stat_path, 4, tick=0)
+    sensor = CpuPowerModelSensor(CpuPowerModel(100.0), proc_stat_path=stat_path, cpu_root=str(tmp_path / 'cpu'),
+                                 summary_path=str(tmp_path / 'cpu_power_model.json'))
+    sensor.open(FakeEngine())
+    sensor.read(FakeEngine.start_wall, 0.0)
+    _write_stat(stat_path, 4, tick=1000)
+    (utilization, ratio, power_w, energy_j, _), = sensor.read(FakeEngine.start_wall + 2, 2.0)
+    # the cores are busy 1/8, 2/8, 3/8 and 4/8 of the time
+    assert utilization == pytest.approx(10 / 32)
+    assert power_w == pytest.approx(100.0 * (0.2 + 0.8 * 10 / 32))
+    assert energy_j == pytest.approx(2 * power_w)
+    sensor.close(FakeEngine.start_wall + 2, 2.0)
+    with open(str(tmp_path / 'cpu_power_model.json')) as file:
+        assert json.load(file)['average_power_w'] == pytest.approx(power_w)
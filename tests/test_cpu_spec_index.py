@@ -0,0 +1,66 @@
+import shutil
+
+import pytest
+
+from cpu_spec_index import CpuSpecIndex, AMD_SPEC_PATHS, normalize_cpu_name
+
+
+@pytest.fixture(scope='module')
+def index(tmp_path_factory):
+    # copies, so the sidecars are not written into database/
+    root = tmp_path_factory.mktemp('database')
+    return CpuSpecIndex([shutil.copy(path, root) for path in AMD_SPEC_PATHS])
+
+
+@pytest.mark.parametrize('name, expected', [
+    ('AMD Ryzen™ 5 5600X', ('ryzen 5', '5600', 'x')),
+    ('AMD Ryzen 5 5600X 6-Core Processor', ('ryzen 5', '5600', 'x')),
+    ('AMD Ryzen 5 5600G with Radeon Graphics', ('ryzen 5', '5600', 'g')),
+    ('AMD Ryzen Threadripper PRO 5995WX 64-Cores', ('ryzen threadripper pro', '5995', 'wx')),
+    ('AMD Ryzen™ 7 5800 (OEM Only)', ('ryzen 7', '5800', '')),
+    ('AMD Opteron™ 6386 SE', ('opteron', '6386', 'se')),
+    ('Quad-Core AMD Opteron(tm) Processor 6376', ('opteron', '6376', '')),
+])
+def test_normalize(name, expected):
+    assert normalize_cpu_name(name) == expected
+
+
+# cpuinfo brand strings and the spec database rows they must resolve to
+@pytest.mark.parametrize('brand, expected', [
+    ('AMD Ryzen 5 5600 6-Core Processor', 'AMD Ryzen™ 5 5600'),
+    ('AMD Ryzen 5 5600X 6-Core Processor', 'AMD Ryzen™ 5 5600X'),
+    ('AMD Ryzen 5 5600 6-Cores', 'AMD Ryzen™ 5 5600'),
+    ('AMD Ryzen 5 5600X 6-Cores', 'AMD Ryzen™ 5 5600X'),
+    ('AMD Ryzen 5 5600X3D 6-Core Processor', 'AMD Ryzen™ 5 5600X3D'),
+    ('AMD Ryzen 5 5600G with Radeon Graphics', 'AMD Ryzen™ 5 5600G'),
+    ('AMD Ryzen 5 5600H with Radeon Graphics', 'AMD Ryzen™ 5 5600H'),
+    ('AMD Ryzen 7 5800 8-Core Processor', 'AMD Ryzen™ 7 5800 (OEM Only)'),
+    ('AMD Ryzen Threadripper PRO 5995WX 64-Cores', 'AMD Ryzen™ Threadripper™ PRO 5995WX'),
+    ('AMD EPYC 7763 64-Core Processor', 'AMD EPYC™ 7763'),
+    ('AMD EPYC 9654 96-Core Processor', 'AMD EPYC™ 9654'),
+    ('AMD EPYC 9654P 96-Core Processor', 'AMD EPYC™ 9654P'),
+    ('AMD Opteron(tm) Processor 6386 SE', 'AMD Opteron™ 6386 SE'),
+])
+def test_brand_strings_resolve_to_the_exact_model(index, brand, expected):
+    match = index.candidates(brand)[0]
+    assert (match.spec.name, match.exact) == (expected, True)
+
+
+def test_unknown_suffix_takes_the_closest_model(index):
+    match = index.candidates('AMD Ryzen 5 5600XT 6-Core Processor')[0]
+    assert (match.spec.name, match.exact) == ('AMD Ryzen™ 5 5600X', False)
+
+
+def test_resolve_reads_the_spec_columns(index):
+    spec = index.resolve('AMD Ryzen 5 5600X 6-Core Processor')
+    assert (spec.model, spec.cores, spec.threads, spec.tdp_w) == ('5600x', 6, 12, 65.0)
+
+
+def test_source_restricts_the_database(index):
+    assert index.candidates('AMD EPYC 7763', source='AMD_non_server_spec.csv') == []
+    assert index.resolve('AMD EPYC 7763', source='database/AMD_server_processor_spec.csv').name == 'AMD EPYC™ 7763'
+
+
+def test_names_without_a_model_number_have_no_candidates(index):
+    assert index.candidates('AMD Custom APU') == []
+    assert index.resolve('AMD Custom APU') is None
@@ -0,0 +1,111 @@
+import json
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+import pytest
+
+pytest.importorskip('requests')
+
+from electricity_maps import ElectricityMapsClient, HOUR, MAX_WINDOW  # noqa: E402
+
+START = datetime.datetime(2024, 1, 1, tzinfo=datetime.timezone.utc)
+# an hour the stub has no data for
+GAP = START + datetime.timedelta(days=3, hours=5)
+
+
+def _time(text):
+    return datetime.datetime.fromisoformat(text.replace('Z', '+00:00'))
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        server = self.server
+        query = parse_qs(urlparse(self.path).query)
+        with server.lock:
+            server.requests.append(query)
+            throttled = server.throttle > 0
+            server.throttle -= 1
+        if throttled:
+            self.send_response(429)
+            self.send_header('Retry-After', '0')
+            self.end_headers()
+            return
+        start, end = _time(query['start'][0]), _time(query['end'][0])
+        records = []
+        moment = start
+        while moment < end:
+            if moment != GAP:
+                records.append({'datetime': moment.strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+                                'carbonIntensity': moment.hour + 100})
+            moment += datetime.timedelta(hours=1)
+        body = json.dumps({'zone': query.get('zone', [''])[0], 'data': records}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.lock = threading.Lock()
+    server.requests = []
+    server.throttle = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def client(stub, tmp_path):
+    with ElectricityMapsClient('token', zone='CA-QC', cache_path=str(tmp_path / 'cache.sqlite'),
+                               base_url=f'http://127.0.0.1:{stub.server_port}', backoff=0.01) as client:
+        yield client
+
+
+def test_long_ranges_are_split_into_api_windows(client, stub):
+    end = START + datetime.timedelta(days=25)
+    records = client.carbon_intensity_history(START, end)
+    assert len(stub.requests) == 3
+    for query in stub.requests:
+        assert _time(query['end'][0]) - _time(query['start'][0]) <= MAX_WINDOW
+        assert query['zone'] == ['CA-QC']
+    assert len(records) == 25 * 24 - 1
+    assert records[0] == {'datetime': '2024-01-01T00:00:00.000Z', 'carbonIntensity': 100}
+
+
+def test_cached_hours_and_hours_without_data_are_not_fetched_again(client, stub):
+    end = START + datetime.timedelta(days=5)
+    first = client.carbon_intensity_history(START, end)
+    requests = len(stub.requests)
+    assert client.carbon_intensity_history(START, end) == first
+    assert len(stub.requests) == requests
+
+
+def test_only_missing_hours_are_fetched(client, stub):
+    client.carbon_intensity_history(START, START + datetime.timedelta(days=2))
+    stub.requests.clear()
+    client.carbon_intensity_history(START, START + datetime.timedelta(days=3))
+    assert len(stub.requests) == 1
+    assert _time(stub.requests[0]['start'][0]) == START + datetime.timedelta(days=2)
+
+
+def test_rate_limited_requests_are_retried(client, stub):
+    stub.throttle = 2
+    records = client.carbon_intensity_history(START, START + datetime.timedelta(hours=4))
+    assert len(records) == 4
+    assert len(stub.requests) == 3
+
+
+def test_epoch_and_text_bounds_agree(client):
+    text = client.carbon_intensity_history('2024-01-01T00:00:00Z', '2024-01-01T03:00:00Z')
+    epoch = client.carbon_intensity_history(START.timestamp(), START.timestamp() + 3 * HOUR)
+    assert text == epoch and len(text) == 3
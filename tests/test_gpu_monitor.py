@@ -0,0 +1,29 @@
+import gpu_monitor
+from gpu_monitor import GpuPowerLogSensor
+from gpu_sensors import NvmlPowerSensor, FakeNvml
+
+
+class FakeEngine:
+    start_wall = 1700000000.0
+
+
+def test_a_sensor_created_at_open_is_shut_down_at_close(tmp_path, monkeypatch):
+    nvml = FakeNvml(powers_w=(50.0,), energy_supported=False)
+    monkeypatch.setattr(gpu_monitor, 'create_gpu_sensor', lambda: NvmlPowerSensor(nvml))
+    log_sensor = GpuPowerLogSensor(str(tmp_path / 'gpu_power_log.csv'))
+    log_sensor.open(FakeEngine())
+    assert log_sensor.read(FakeEngine.start_wall + 1, 1) == [(0, 50.0)]
+    log_sensor.close(FakeEngine.start_wall + 1, 1)
+    assert not nvml.initialized
+    assert log_sensor.sensor is None
+
+
+def test_an_injected_sensor_is_left_open(tmp_path):
+    nvml = FakeNvml(powers_w=(50.0,))
+    sensor = NvmlPowerSensor(nvml)
+    log_sensor = GpuPowerLogSensor(str(tmp_path / 'gpu_power_log.csv'), sensor=sensor)
+    log_sensor.open(FakeEngine())
+    log_sensor.close(FakeEngine.start_wall + 1, 1)
+    assert nvml.initialized
+    assert log_sensor.sensor is sensor
+    sensor.close()
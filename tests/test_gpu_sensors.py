@@ -0,0 +1,61 @@
+import pytest
+
+import gpu_sensors
+from gpu_sensors import GpuPowerSensor, NvmlPowerSensor, FakeNvml
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(gpu_sensors.time, 'monotonic', lambda: now[0])
+    return now
+
+
+def test_power_is_the_energy_counter_delta_over_time(clock):
+    nvml = FakeNvml(powers_w=(50.0, 120.0))
+    sensor = NvmlPowerSensor(nvml)
+    clock[0] += 2.0
+    assert sensor.read() == [(0, pytest.approx(50.0)), (1, pytest.approx(120.0))]
+    nvml.powers_w[0] = 80.0
+    clock[0] += 1.0
+    # FakeNvml charges its current power from its start, so the counter jumps when the power changes
+    assert sensor.read()[0] == (0, pytest.approx(80.0 * 3 - 50.0 * 2))
+    assert sensor.read_energy_j() == [pytest.approx(240.0), pytest.approx(360.0)]
+
+
+def test_power_usage_is_read_without_the_energy_counter(clock):
+    nvml = FakeNvml(powers_w=(65.5,), energy_supported=False)
+    sensor = NvmlPowerSensor(nvml)
+    clock[0] += 1.0
+    assert sensor.read() == [(0, 65.5)]
+    assert sensor.read_energy_j() == [None]
+
+
+def test_a_stalled_clock_falls_back_to_the_power_usage(clock):
+    sensor = NvmlPowerSensor(FakeNvml(powers_w=(40.0,)))
+    assert sensor.read() == [(0, 40.0)]
+
+
+def test_names_and_close():
+    nvml = FakeNvml(powers_w=(1.0, 2.0), names=(b'Tesla V100', 'A100'))
+    sensor = NvmlPowerSensor(nvml)
+    assert sensor.names() == ['Tesla V100', 'A100']
+    sensor.close()
+    assert not nvml.initialized
+    sensor.close()
+
+
+def test_failed_reads_report_no_power(clock):
+    nvml = FakeNvml(powers_w=(50.0,))
+    sensor = NvmlPowerSensor(nvml)
+    nvml.nvmlShutdown()
+    assert sensor.read() == [(0, None)]
+
+
+def test_backends_must_implement_the_interface():
+    class Partial(GpuPowerSensor):
+        def names(self):
+            return []
+
+    with pytest.raises(TypeError):
+        Partial()
@@ -0,0 +1,131 @@
+import pytest
+
+import rapl_monitor
+from memory_energy import MemoryEnergySensor, rapl_dram_energy_reader, load_memory_energy, RAM_WATTS_PER_GB
+
+PAGE = 4096
+GB = 1024 ** 3
+START = 1700000000.0
+
+
+class FakeEngine:
+    start_wall = START
+
+
+def _process(proc_root, pid, resident_pages, children=()):
+    task = proc_root / str(pid) / 'task' / str(pid)
+    task.mkdir(parents=True, exist_ok=True)
+    (task / 'children').write_text(' '.join(str(child) for child in children))
+    _statm(proc_root, pid, resident_pages)
+
+
+def _statm(proc_root, pid, resident_pages):
+    # rewritten in place, so a descriptor kept open reads the new value like /proc
+    (proc_root / str(pid) / 'statm').write_text(f'99999 {resident_pages} 10 1 0 50 0\n')
+
+
+def _meminfo(proc_root, total_kb, available_kb):
+    (proc_root / 'meminfo').write_text(f'MemTotal:       {total_kb} kB\nMemFree:        1 kB\n'
+                                       f'MemAvailable:   {available_kb} kB\n')
+
+
+def _sensor(proc_root, **kwargs):
+    sensor = MemoryEnergySensor(100, proc_root=str(proc_root), **kwargs)
+    sensor._page_size = PAGE
+    return sensor
+
+
+def test_tree_rss_is_integrated_with_the_trapezoidal_rule(tmp_path):
+    gb_pages = GB // PAGE
+    _process(tmp_path, 100, gb_pages, children=[200])
+    _process(tmp_path, 200, gb_pages)
+    summary_path = tmp_path / 'memory_energy.json'
+    sensor = _sensor(tmp_path, summary_path=str(summary_path))
+    sensor.open(FakeEngine())
+
+    _statm(tmp_path, 200, 3 * gb_pages)
+    rss, power_w, energy_j = sensor.read(START + 10, 10)[0]
+    assert rss == 4 * GB
+    assert power_w == pytest.approx(4 * RAM_WATTS_PER_GB)
+    # 2 GB at the start, 4 GB after 10 s
+    assert energy_j == pytest.approx(30 * RAM_WATTS_PER_GB)
+    sensor.close(START + 20, 20)
+
+    summary = load_memory_energy(str(summary_path))
+    assert summary['source'] == 'rss_model'
+    assert summary['duration_sec'] == 20
+    assert summary['rss_gb_seconds'] == pytest.approx(70)
+    assert summary['mean_rss_bytes'] == pytest.approx(3.5 * GB)
+    assert summary['peak_rss_bytes'] == 4 * GB
+    assert summary['dram_energy_j'] is None
+
+
+def test_tree_is_walked_every_tree_period_reads(tmp_path):
+    _process(tmp_path, 100, 10)
+    sensor = _sensor(tmp_path, tree_period=2)
+    sensor.open(FakeEngine())
+    _process(tmp_path, 100, 10, children=[200])
+    _process(tmp_path, 200, 5)
+    assert sensor.tree_rss() == 10 * PAGE
+    assert sensor.tree_rss() == 15 * PAGE
+    # an exited process reads nothing and its descriptor is dropped
+    (tmp_path / '200' / 'statm').write_text('')
+    assert sensor.tree_rss() == 10 * PAGE
+    assert set(sensor._fds) == {100}
+    sensor.close(START + 1, 1)
+
+
+def test_dram_energy_is_split_by_the_rss_share(tmp_path):
+    gb_pages = GB // PAGE
+    _process(tmp_path, 100, gb_pages)
+    # 4 GiB in use machine-wide
+    _meminfo(tmp_path, 8 * 1024 ** 2, 4 * 1024 ** 2)
+    dram = iter([1000.0, 1100.0, 1300.0])
+    sensor = _sensor(tmp_path, dram_energy_reader=lambda: next(dram))
+    sensor.open(FakeEngine())
+
+    _statm(tmp_path, 100, 2 * gb_pages)
+    rss, power_w, energy_j = sensor.read(START + 10, 10)[0]
+    # the share goes from 1/4 to 1/2 over the interval
+    assert energy_j == pytest.approx(100 * 0.375)
+    assert power_w == pytest.approx(100 * 0.5 / 10)
+
+    _meminfo(tmp_path, 8 * 1024 ** 2, 0)
+    sensor.close(START + 20, 20)
+    summary = sensor.summary()
+    assert summary['source'] == 'rapl_dram'
+    assert summary['dram_energy_j'] == pytest.approx(300)
+    # 1/2 then 1/4 of the 200 J of the second interval
+    assert summary['attributed_dram_energy_j'] == pytest.approx(37.5 + 200 * 0.375)
+    assert summary['energy_j'] == summary['attributed_dram_energy_j']
+    assert summary['model_energy_j'] == pytest.approx(35 * RAM_WATTS_PER_GB)
+
+
+def test_dram_energy_without_meminfo_falls_back_to_the_model(tmp_path):
+    _process(tmp_path, 100, 10)
+    sensor = _sensor(tmp_path, dram_energy_reader=lambda: 0.0)
+    sensor.open(FakeEngine())
+    sensor.close(START + 10, 10)
+    assert sensor.summary()['source'] == 'rss_model'
+
+
+class FakeDomain:
+    def __init__(self, energy):
+        self.energy = energy
+
+    def update(self):
+        return self.energy
+
+
+def test_dram_reader_keeps_only_the_dram_domains(monkeypatch):
+    requested = []
+
+    def discover(kinds=None):
+        requested.append(kinds)
+        return [FakeDomain(2.0), FakeDomain(3.0)] if kinds == ('dram',) else []
+
+    monkeypatch.setattr(rapl_monitor, 'discover_rapl_domains', discover)
+    assert rapl_dram_energy_reader()() == 5.0
+    monkeypatch.setattr(rapl_monitor, 'discover_rapl_domains', lambda kinds=None: [])
+    assert rapl_dram_energy_reader() is None
+    assert requested == [('dram',)]
@@ -0,0 +1,47 @@
+import io
+
+import pytest
+
+from output_pipeline import MarkerScanner, pump
+
+STREAM = b'loading\nSIMULATION\nstep 1\nstep 2\nSIMULATION COMPLETE\nbye\n'
+MARKERS = ['SIMULATION', 'SIMULATION COMPLETE']
+
+
+def scan(chunks, markers=MARKERS):
+    scanner = MarkerScanner(markers)
+    found = []
+    for chunk in chunks:
+        found += scanner.feed(chunk)
+    return found
+
+
+def test_prefix_markers_are_all_reported():
+    assert scan([STREAM]) == ['SIMULATION', 'SIMULATION', 'SIMULATION COMPLETE']
+
+
+@pytest.mark.parametrize('split', range(1, len(STREAM)))
+def test_every_split_point_reports_the_same_markers(split):
+    assert scan([STREAM[:split], STREAM[split:]]) == scan([STREAM])
+
+
+def test_byte_by_byte_feed_reports_the_same_markers():
+    assert scan([STREAM[i:i + 1] for i in range(len(STREAM))]) == scan([STREAM])
+
+
+def test_overlapping_matches_of_one_marker_are_reported_once():
+    assert scan([b'aaaa'], ['aa']) == ['aa', 'aa']
+    assert scan([b'aa', b'aa'], ['aa']) == ['aa', 'aa']
+    assert scan([b'a', b'aa', b'a'], ['aa']) == ['aa', 'aa']
+
+
+@pytest.mark.parametrize('split', range(1, len(STREAM)))
+def test_pump_fires_the_end_callback_at_every_split_point(split):
+    class SplitStream(io.BytesIO):
+        def read1(self, size=-1):
+            return self.read(split if self.tell() == 0 else size)
+
+    calls = []
+    callbacks = {marker: [lambda marker=marker: calls.append(marker)] for marker in MARKERS}
+    pump(SplitStream(STREAM), callbacks=callbacks)
+    assert calls == ['SIMULATION', 'SIMULATION', 'SIMULATION COMPLETE']
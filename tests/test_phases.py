@@ -0,0 +1,128 @@
+import json
+import datetime
+
+import pytest
+
+from phases import PhaseRecorder, phase_energy, phase_markers, load_phases
+from sample_log import SampleLogWriter, ENERGY_COLUMNS
+from cpu_power_model import POWER_MODEL_LOG
+from memory_energy import MEMORY_ENERGY_LOG
+
+START = 1700000000.0
+
+
+class FakeEngine:
+    """An engine whose clock is set by the test."""
+
+    def __init__(self):
+        self.start_monotonic = None
+        self.start_wall = START
+        self.elapsed = 0.0
+
+    def start(self):
+        if self.start_monotonic is None:
+            self.start_monotonic = 0.0
+
+    def now(self):
+        return self.start_wall + self.elapsed, self.elapsed
+
+
+def _recorder(tmp_path, marks):
+    engine = FakeEngine()
+    recorder = PhaseRecorder(engine, str(tmp_path / 'model_phases.json'))
+    for elapsed, name in marks:
+        engine.elapsed = elapsed
+        recorder.mark(name)
+    return engine, recorder
+
+
+def test_markers_keep_their_order():
+    assert phase_markers({'phase_markers': {'spin-up': 'SPIN', 'run': 'RUN'}}) == [('spin-up', 'SPIN'), ('run', 'RUN')]
+    assert phase_markers({'phase_markers': [{'name': 'a', 'marker': 'A'}]}) == [('a', 'A')]
+    assert phase_markers({}) == []
+
+
+def test_each_mark_closes_the_previous_phase(tmp_path):
+    engine, recorder = _recorder(tmp_path, [(1.0, 'spin-up'), (4.0, 'simulation')])
+    engine.elapsed = 10.0
+    recorder.finish()
+    phases = load_phases(recorder.file_path)
+    assert [(phase['name'], phase['start_elapsed'], phase['end_elapsed']) for phase in phases] == \
+        [('spin-up', 1.0, 4.0), ('simulation', 4.0, 10.0)]
+    assert phases[1]['end_time'] == START + 10.0
+
+
+def test_a_repeated_marker_does_not_start_a_new_phase(tmp_path):
+    engine, recorder = _recorder(tmp_path, [(1.0, 'train'), (2.0, 'train'), (3.0, 'train'), (5.0, 'eval'),
+                                            (6.0, 'eval'), (7.0, 'train')])
+    engine.elapsed = 9.0
+    recorder.finish()
+    assert [(phase['name'], phase['start_elapsed'], phase['end_elapsed']) for phase in recorder.phases] == \
+        [('train', 1.0, 5.0), ('eval', 5.0, 7.0), ('train', 7.0, 9.0)]
+
+
+def test_finish_is_final(tmp_path):
+    engine, recorder = _recorder(tmp_path, [(1.0, 'a')])
+    engine.elapsed = 2.0
+    recorder.finish()
+    engine.elapsed = 3.0
+    recorder.mark('b')
+    recorder.finish()
+    with open(recorder.file_path) as file:
+        assert [phase['name'] for phase in json.load(file)] == ['a']
+
+
+def test_callbacks_mark_their_phase(tmp_path):
+    engine, recorder = _recorder(tmp_path, [])
+    callbacks = recorder.callbacks([('spin-up', b'SPIN'), ('run', b'RUN')])
+    callbacks[b'RUN'][0]()
+    assert [phase['name'] for phase in recorder.phases] == ['run']
+
+
+def test_no_phases_no_file(tmp_path):
+    _, recorder = _recorder(tmp_path, [])
+    recorder.finish()
+    assert load_phases(recorder.file_path) is None
+
+
+def _energy_log(path, power_w, seconds):
+    # a cumulative energy log sampled every second, power_w(t) Watt from START on
+    with SampleLogWriter(path, ENERGY_COLUMNS, 'energy') as writer:
+        energy = 0.0
+        writer.write((START, 0.0))
+        for second in range(1, seconds + 1):
+            energy += power_w(second)
+            writer.write((START + second, energy))
+
+
+def _phases(*bounds):
+    return [{'name': name, 'start_time': START + start, 'end_time': START + end,
+             'start_elapsed': start, 'end_elapsed': end} for name, start, end in bounds]
+
+
+def test_energy_is_split_at_the_phase_boundaries(tmp_path):
+    _energy_log(str(tmp_path / POWER_MODEL_LOG), lambda second: 10.0 if second <= 20 else 40.0, 60)
+    _energy_log(str(tmp_path / MEMORY_ENERGY_LOG), lambda second: 1.0 if second <= 20 else 3.0, 60)
+    with open(str(tmp_path / 'gpu_power_log.csv'), 'w') as file:
+        file.write('timestamp,gpu,power.draw,power.limit\n')
+        for second in range(0, 61):
+            file.write(f'{datetime.datetime.fromtimestamp(START + second).isoformat()},0,100.0,\n')
+    phases = _phases(('spin-up', 0, 20), ('simulation', 20, 60)) + \
+        [{'name': 'unfinished', 'start_time': START + 60, 'end_time': None}]
+    breakdown = phase_energy(phases, output_dir=str(tmp_path), cpu_scale=0.5, cpu_power_w=25.0)
+    assert [phase['name'] for phase in breakdown] == ['spin-up', 'simulation']
+    assert [phase['duration_sec'] for phase in breakdown] == [20.0, 40.0]
+    assert breakdown[0]['cpu_kwh'] * 3.6e6 == pytest.approx(20 * 10.0 * 0.5)
+    assert breakdown[1]['cpu_kwh'] * 3.6e6 == pytest.approx(40 * 40.0 * 0.5)
+    assert breakdown[0]['ram_kwh'] * 3.6e6 == pytest.approx(20 * 1.0)
+    assert breakdown[1]['ram_kwh'] * 3.6e6 == pytest.approx(40 * 3.0)
+    assert breakdown[0]['gpu_kwh'] * 3.6e6 == pytest.approx(20 * 100.0)
+    assert breakdown[1]['gpu_kwh'] * 3.6e6 == pytest.approx(40 * 100.0)
+
+
+def test_constant_powers_without_logs(tmp_path):
+    breakdown = phase_energy(_phases(('a', 0, 10), ('b', 10, 40)), output_dir=str(tmp_path), cpu_scale=0.5,
+                             ram_power_w=3.0, cpu_power_w=20.0)
+    assert [phase['cpu_kwh'] * 3.6e6 for phase in breakdown] == pytest.approx([100.0, 300.0])
+    assert [phase['ram_kwh'] * 3.6e6 for phase in breakdown] == pytest.approx([30.0, 90.0])
+    assert [phase['gpu_kwh'] for phase in breakdown] == [0.0, 0.0]
@@ -0,0 +1,99 @@
+import math
+import datetime
+
+import numpy as np
+import pytest
+
+from main import parse_gpu_power_csv
+from sample_log import open_sample_log
+from power_tiers import TierCompactor, available_tiers, compact_log, iter_tier_energy, tier_energy_between, \
+    tier_records, tier_summary, tier_widths
+
+START = 1699999200.0
+
+
+def _tier_energy(log_path):
+    return {width: float(open_sample_log(path)[1]['energy_j'].sum()) for width, path in available_tiers(log_path)}
+
+
+def test_widths_must_nest():
+    assert tier_widths(True) == (1.0, 60.0, 3600.0)
+    with pytest.raises(ValueError):
+        tier_widths((1, 60, 90))
+    with pytest.raises(ValueError):
+        tier_widths((0, 60))
+
+
+def test_every_tier_holds_the_trapezoid_energy_of_the_raw_log(tmp_path):
+    log_path = str(tmp_path / 'gpu_power_log.csv')
+    # two GPUs sampled at irregular intervals, crossing bucket boundaries of every tier
+    timestamp = START - 17.3
+    with open(log_path, 'w') as file:
+        file.write('timestamp,gpu,power.draw,power.limit\n')
+        for step in range(900):
+            moment = datetime.datetime.fromtimestamp(timestamp).isoformat(timespec='microseconds')
+            file.write(f'{moment},0,{100 + 40 * math.sin(step / 7):.3f},\n')
+            file.write(f'{moment},1,{30 + step % 11:.3f},\n')
+            timestamp += 1.7 + (step % 5) * 0.9
+    compact_log(log_path)
+    raw_j = parse_gpu_power_csv(log_path) * 3.6e6
+    energies = _tier_energy(log_path)
+    assert sorted(energies) == [1.0, 60.0, 3600.0]
+    for energy in energies.values():
+        assert energy == pytest.approx(raw_j, rel=1e-9)
+    assert tier_summary(log_path)['energy_j'] == pytest.approx(raw_j, rel=1e-9)
+
+
+def _run(log_path, hours, retention, power_w=lambda t: 50.0 + (t % 600) / 10):
+    compactor = TierCompactor(log_path, (1, 60, 3600), 'intel', retention=retention)
+    total = 0.0
+    t = START
+    while t < START + hours * 3600:
+        energy = power_w(t) * 1.5
+        compactor.add(t, t + 1.5, energy)
+        total += energy
+        t += 1.5
+    compactor.close()
+    return total
+
+
+def test_bounded_tiers_stay_small_and_keep_the_energy(tmp_path):
+    log_path = str(tmp_path / 'intel_power_gadget_log.csv')
+    total = _run(log_path, hours=12, retention=300)
+    sizes = {width: len(open_sample_log(path)[1]) for width, path in available_tiers(log_path)}
+    # 43200 one-second buckets were written; the bounded tiers span at most twice their retention
+    assert sizes[1.0] <= 2 * 3600
+    assert sizes[60.0] <= 2 * 300
+    assert sizes[3600.0] == 12
+    for energy in _tier_energy(log_path).values():
+        assert energy <= total * (1 + 1e-9)
+    assert tier_summary(log_path)['energy_j'] == pytest.approx(total, rel=1e-9)
+
+
+def test_trimmed_tiers_are_filled_in_from_coarser_ones(tmp_path):
+    log_path = str(tmp_path / 'intel_power_gadget_log.csv')
+    total = _run(log_path, hours=12, retention=300)
+    records = tier_records(log_path, resolution=1)
+    assert records['start'][0] == START
+    assert records['end'][-1] == pytest.approx(START + 43200)
+    assert np.all(records['start'][1:] >= records['end'][:-1])
+    assert float(records['energy_j'].sum()) == pytest.approx(total, rel=1e-9)
+    # the latest time is still at one-second resolution; the start of the run only survives in the
+    # hourly tier, since the minute tier was trimmed as well
+    widths = records['end'] - records['start']
+    assert widths[-1] <= 1.0
+    assert widths[0] == 3600.0
+    assert 60.0 in widths
+    assert sum(energy for _, _, energy in iter_tier_energy(log_path, 60)) == pytest.approx(total, rel=1e-9)
+    assert tier_energy_between(log_path, [START], [START + 43200], resolution=1)[0] == pytest.approx(total, rel=1e-9)
+    # the last half hour is read from one-second buckets
+    last = tier_energy_between(log_path, [START + 41400], [START + 43200], resolution=1)[0]
+    expected = sum((50.0 + (t % 600) / 10) * 1.5 for t in np.arange(START + 41400, START + 43200, 1.5))
+    assert last == pytest.approx(expected, rel=1e-9)
+
+
+def test_retention_none_keeps_every_bucket(tmp_path):
+    log_path = str(tmp_path / 'intel_power_gadget_log.csv')
+    _run(log_path, hours=1, retention=None)
+    assert len(open_sample_log(available_tiers(log_path)[0][1])[1]) == 3600
+    assert isinstance(tier_records(log_path, resolution=1), np.memmap)
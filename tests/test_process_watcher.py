@@ -0,0 +1,77 @@
+import shutil
+
+import pytest
+
+import process_watcher
+from process_watcher import ProcScanWatcher, EXEC_GRACE_SEC
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(process_watcher.time, 'monotonic', clock)
+    return clock
+
+
+def _process(proc_root, pid, comm, cmdline=None):
+    path = proc_root / str(pid)
+    path.mkdir(exist_ok=True)
+    (path / 'comm').write_bytes(comm.encode() + b'\n')
+    (path / 'cmdline').write_bytes((cmdline or comm).encode() + b'\0')
+
+
+def test_fork_is_seen_once_it_execs(tmp_path, clock):
+    _process(tmp_path, 'self', 'python')
+    _process(tmp_path, 100, 'bash')
+    watcher = ProcScanWatcher(proc_root=str(tmp_path))
+    assert watcher._scan('model') is None
+    # the forked child still has its parent's comm until exec renames it
+    clock.now = EXEC_GRACE_SEC / 2
+    _process(tmp_path, 100, 'model')
+    assert watcher._scan('model') == 100
+
+
+def test_comm_is_trusted_after_the_grace_period(tmp_path, clock):
+    _process(tmp_path, 100, 'bash')
+    watcher = ProcScanWatcher(proc_root=str(tmp_path))
+    assert watcher._scan('model') is None
+    clock.now = EXEC_GRACE_SEC * 2
+    _process(tmp_path, 100, 'model')
+    assert watcher._scan('model') is None
+    assert watcher._known == {'100': ('bash', 0.0)}
+
+
+def test_long_names_are_confirmed_by_the_executable(tmp_path, clock):
+    _process(tmp_path, 100, 'process_based_m', '/opt/model/process_based_model')
+    _process(tmp_path, 101, 'process_based_o', '/opt/model/process_based_other')
+    watcher = ProcScanWatcher(proc_root=str(tmp_path))
+    assert watcher._scan('process_based_model') == 100
+    assert watcher._scan('process_based_other') == 101
+    assert watcher._scan('process_based_mod') is None
+
+
+def test_exited_pids_are_pruned_on_a_matching_scan(tmp_path, clock):
+    _process(tmp_path, 100, 'bash')
+    _process(tmp_path, 200, 'model')
+    watcher = ProcScanWatcher(proc_root=str(tmp_path))
+    assert watcher._scan('other') is None
+    assert set(watcher._known) == {'100', '200'}
+    shutil.rmtree(tmp_path / '100')
+    assert watcher._scan('model') == 200
+    assert set(watcher._known) == {'200'}
+
+
+def test_wait_for_start_times_out(tmp_path, clock, monkeypatch):
+    _process(tmp_path, 100, 'bash')
+    monkeypatch.setattr(process_watcher.time, 'sleep', lambda seconds: setattr(clock, 'now', clock.now + seconds))
+    watcher = ProcScanWatcher(interval=0.5, proc_root=str(tmp_path))
+    assert watcher.wait_for_start('model', timeout=2.0) is None
+    assert clock.now == pytest.approx(2.0)
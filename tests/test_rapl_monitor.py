@@ -0,0 +1,115 @@
+import os
+
+import pytest
+
+from rapl_monitor import RaplDomain, RaplEnergySensor, discover_rapl_domains
+
+
+def _write(path, text):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as file:
+        file.write(text)
+
+
+@pytest.fixture
+def powercap(tmp_path):
+    root = tmp_path / 'powercap'
+    for zone, name, energy in (('intel-rapl:0', 'package-0', 900000), ('intel-rapl:0:0', 'core', 400000),
+                               ('intel-rapl:0:1', 'dram', 100000), ('intel-rapl:1', 'psys', 5)):
+        _write(str(root / zone / 'name'), name)
+        _write(str(root / zone / 'energy_uj'), str(energy))
+        _write(str(root / zone / 'max_energy_range_uj'), '1000000')
+    return root
+
+
+def _set_energy(root, zone, energy):
+    _write(str(root / zone / 'energy_uj'), str(energy))
+
+
+class FakeEngine:
+    start_wall = 1700000000.0
+
+
+def test_powercap_zones_are_discovered_without_psys(powercap, tmp_path):
+    domains = discover_rapl_domains(str(powercap), str(tmp_path / 'hwmon'))
+    assert sorted((domain.package, domain.kind) for domain in domains) == [(0, 'core'), (0, 'dram'), (0, 'package')]
+    for domain in domains:
+        domain.close()
+
+
+def test_counter_wraparound_uses_max_energy_range(powercap):
+    domain = RaplDomain(0, 'package', str(powercap / 'intel-rapl:0' / 'energy_uj'), max_energy_range_uj=1000000)
+    assert domain.update() == 0.0
+    _set_energy(powercap, 'intel-rapl:0', 950000)
+    assert domain.update() == pytest.approx(0.05)
+    # wrapped: 950000 -> 1000000 -> 0 -> 150000
+    _set_energy(powercap, 'intel-rapl:0', 150000)
+    assert domain.update() == pytest.approx(0.25)
+    domain.close()
+
+
+def test_wraparound_without_range_counts_from_zero(powercap):
+    domain = RaplDomain(0, 'package', str(powercap / 'intel-rapl:0' / 'energy_uj'))
+    domain.update()
+    _set_energy(powercap, 'intel-rapl:0', 300000)
+    assert domain.update() == pytest.approx(0.3)
+    domain.close()
+
+
+def _footer(log_path):
+    with open(log_path, 'r') as file:
+        text = file.read()
+    footer = text[text.index('Total Elapsed Time (sec)'):]
+    return {key.strip(): float(value) for key, value in
+            (line.split('=') for line in footer.splitlines() if '=' in line)}
+
+
+def test_footer_totals_include_a_wrapped_counter(powercap, tmp_path):
+    log_path = str(tmp_path / 'intel_power_gadget_log.csv')
+    sensor = RaplEnergySensor(log_path, powercap_root=str(powercap), hwmon_root=str(tmp_path / 'hwmon'),
+                              proc_stat_path=str(tmp_path / 'stat'), cpu_root=str(tmp_path / 'cpu'))
+    engine = FakeEngine()
+    sensor.open(engine)
+    sensor.read(engine.start_wall + 0.1, 0.1)
+    _set_energy(powercap, 'intel-rapl:0', 100000)
+    _set_energy(powercap, 'intel-rapl:0:0', 500000)
+    sensor.read(engine.start_wall + 1.1, 1.1)
+    _set_energy(powercap, 'intel-rapl:0', 300000)
+    sensor.close(engine.start_wall + 2.1, 2.1)
+    sensor.close_counters()
+
+    footer = _footer(log_path)
+    assert footer['Total Elapsed Time (sec)'] == pytest.approx(2.1)
+    assert footer['Cumulative Processor Energy_0 (Joules)'] == pytest.approx(0.4)
+    assert footer['Cumulative Processor Energy_0 (mWh)'] == pytest.approx(0.4 / 3.6, abs=1e-6)
+    assert footer['Average Processor Power_0 (Watt)'] == pytest.approx(0.4 / 2.1, abs=1e-6)
+    assert footer['Cumulative IA Energy_0 (Joules)'] == pytest.approx(0.1)
+    assert footer['Cumulative DRAM Energy_0 (Joules)'] == 0.0
+    with open(log_path, 'r') as file:
+        rows = file.read().split('\n\n')[0].splitlines()
+    assert rows[0].startswith('System Time,RDTSC,Elapsed Time (sec)')
+    assert len(rows) == 2
+
+
+def test_amd_energy_cores_are_mapped_to_their_socket(tmp_path):
+    hwmon = tmp_path / 'hwmon' / 'hwmon0'
+    _write(str(hwmon / 'name'), 'amd_energy')
+    for index, label in enumerate(('Esocket0', 'Esocket1', 'Ecore000', 'Ecore064', 'Ecore099'), start=1):
+        _write(str(hwmon / f'energy{index}_label'), label)
+        _write(str(hwmon / f'energy{index}_input'), '0')
+    cpu_root = tmp_path / 'cpu'
+    _write(str(cpu_root / 'cpu0' / 'topology' / 'physical_package_id'), '0')
+    _write(str(cpu_root / 'cpu64' / 'topology' / 'physical_package_id'), '1')
+    domains = discover_rapl_domains(str(tmp_path / 'powercap'), str(tmp_path / 'hwmon'), str(cpu_root))
+    assert sorted((domain.package, domain.kind) for domain in domains) == \
+        [(0, 'core'), (0, 'package'), (1, 'core'), (1, 'package')]
+    for domain in domains:
+        domain.close()
+
+
+def test_kinds_filter_closes_the_other_counters(powercap, tmp_path):
+    open_fds = len(os.listdir('/proc/self/fd'))
+    domains = discover_rapl_domains(str(powercap), str(tmp_path / 'hwmon'), kinds=('package',))
+    assert [domain.kind for domain in domains] == ['package']
+    assert len(os.listdir('/proc/self/fd')) == open_fds + 1
+    domains[0].close()
@@ -0,0 +1,29 @@
+from sample_store import SampleStore
+
+
+def test_ring_keeps_the_latest_rows_in_order():
+    store = SampleStore(('a', 'b'), ring_size=4)
+    for value in range(10):
+        store.append((value, -value))
+    assert list(store.column('a')) == [6, 7, 8, 9]
+    assert list(store.views()['b']) == [-6, -7, -8, -9]
+    assert store.dropped_rows == 6
+    assert len(store) == 10
+
+
+def test_views_are_zero_copy_until_the_ring_wraps():
+    store = SampleStore(('a',), ring_size=4)
+    store.append((1.0,))
+    view = store.column('a')
+    store.append((2.0,))
+    assert list(view) == [1.0]
+    assert list(store.column('a')) == [1.0, 2.0]
+
+
+def test_spill_path_keeps_every_row(tmp_path):
+    store = SampleStore(('a',), ring_size=3, spill_path=str(tmp_path / 'spill.bin'))
+    for value in range(7):
+        store.append((value,))
+    spilled = [value for chunk in store.iter_spilled() for value in chunk['a']]
+    assert spilled + list(store.column('a')) == list(range(7))
+    assert store.dropped_rows == 0
@@ -0,0 +1,104 @@
+import time
+
+from sampling_engine import Sensor, SamplingEngine
+
+
+class CountingSensor(Sensor):
+    name = 'counter'
+    fields = ('value',)
+
+    def __init__(self):
+        self.reads = 0
+
+    def read(self, timestamp, elapsed):
+        self.reads += 1
+        return [(self.reads,)]
+
+
+def test_stop_keeps_the_last_buffer_in_memory(tmp_path):
+    sensor = CountingSensor()
+    sensor.spill_path = str(tmp_path / 'spill.bin')
+    engine = SamplingEngine([sensor], interval=0.01, ring_size=1000)
+    engine.start()
+    while sensor.reads < 5:
+        time.sleep(0.01)
+    engine.stop()
+    store = engine.stores['counter']
+    assert list(store.column('value')) == list(range(1, sensor.reads + 1))
+    assert store.spilled_rows == 0
+
+
+class FailingSensor(Sensor):
+    name = 'failing'
+    fields = ('value',)
+
+    def __init__(self):
+        self.reads = 0
+
+    def read(self, timestamp, elapsed):
+        self.reads += 1
+        raise OSError('counter unreadable')
+
+
+class RecordingSensor(Sensor):
+    fields = ('value',)
+
+    def __init__(self, name, events, fail_close=False):
+        self.name = name
+        self.events = events
+        self.fail_close = fail_close
+
+    def open(self, engine):
+        self.events.append(('open', self.name, None))
+
+    def read(self, timestamp, elapsed):
+        self.events.append(('read', self.name, timestamp))
+        return [(0,)]
+
+    def close(self, timestamp, elapsed):
+        self.events.append(('close', self.name, timestamp))
+        if self.fail_close:
+            raise OSError('close failed')
+
+
+def _run_until(engine, condition):
+    engine.start()
+    deadline = time.monotonic() + 5
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return engine.stop()
+
+
+def test_failing_sensor_does_not_stop_the_engine(caplog):
+    failing, counting = FailingSensor(), CountingSensor()
+    engine = SamplingEngine([failing, counting], interval=0.01)
+    with caplog.at_level('WARNING', logger='sampling_engine'):
+        stats = _run_until(engine, lambda: counting.reads >= 5 and failing.reads >= 5)
+    assert counting.reads >= 5
+    assert len(engine.stores['counter']) == counting.reads
+    assert len(engine.stores['failing']) == 0
+    assert stats['sensor_failures'] == {'failing': failing.reads}
+    assert 'failing' in stats['sensor_read_sec']
+    # reported once, not on every tick
+    warnings = [record.getMessage() for record in caplog.records if 'failing' in record.getMessage()]
+    assert warnings == ['Sensor failing failed: counter unreadable']
+
+
+def test_sensors_close_in_order_after_the_last_read(caplog):
+    events = []
+    sensors = [RecordingSensor('first', events, fail_close=True), RecordingSensor('second', events)]
+    engine = SamplingEngine(sensors, interval=0.01)
+    with caplog.at_level('WARNING', logger='sampling_engine'):
+        _run_until(engine, lambda: sum(event[0] == 'read' for event in events) >= 4)
+    assert events[:2] == [('open', 'first', None), ('open', 'second', None)]
+    closes = [event for event in events if event[0] == 'close']
+    # a sensor failing to close does not keep the next one open
+    assert [name for _, name, _ in closes] == ['first', 'second']
+    assert events[-2:] == closes
+    last_read = max(timestamp for what, _, timestamp in events if what == 'read')
+    assert all(timestamp >= last_read for _, _, timestamp in closes)
+    assert 'Closing sensor first failed: close failed' in caplog.text
+    # stopping again neither reads nor closes anything
+    count = len(events)
+    engine.stop()
+    assert len(events) == count
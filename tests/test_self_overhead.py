@@ -0,0 +1,81 @@
+import sys
+import json
+import subprocess
+
+import pytest
+
+import attribution
+from self_overhead import (SelfOverheadSensor, ProcessCpuMeter, add_helper_overhead, load_overhead,
+                           _stat_cpu_ticks)
+
+
+class FakeEngine:
+    def stats(self):
+        return {'sensor_read_sec': {'monitor_overhead': 0.25}}
+
+
+def _write_summary(path, monitor_sec=2.0, busy_sec=100.0):
+    summary = {'monitor_cpu_time_sec': monitor_sec, 'system_busy_time_sec': busy_sec,
+               'overhead_share': monitor_sec / busy_sec, 'before_start_cpu_sec': 0.0,
+               'threads': {}, 'children': {}, 'sensor_read_sec': {}}
+    with open(path, 'w') as file:
+        json.dump(summary, file)
+
+
+def test_stat_ticks_parse_a_command_name_with_spaces(tmp_path):
+    fields = ['S'] + ['0'] * 10 + ['7', '3', '20', '10'] + ['0'] * 30
+    path = tmp_path / 'stat'
+    path.write_bytes(b'123 (power (log) x) ' + ' '.join(fields).encode())
+    assert _stat_cpu_ticks(str(path)) == ('power (log) x', 10)
+    assert _stat_cpu_ticks(str(path), include_children=True) == ('power (log) x', 40)
+
+
+def test_helper_time_is_added_to_the_summary(tmp_path):
+    path = str(tmp_path / 'monitor_overhead.json')
+    _write_summary(path)
+    summary = add_helper_overhead('PowerLog', 3.0, path)
+    assert summary['monitor_cpu_time_sec'] == pytest.approx(5.0)
+    assert summary['overhead_share'] == pytest.approx(0.05)
+    assert summary['children'] == {'PowerLog': 3.0}
+    assert load_overhead(path) == summary
+
+
+def test_helper_time_without_a_summary_is_dropped(tmp_path):
+    path = str(tmp_path / 'monitor_overhead.json')
+    assert add_helper_overhead('PowerLog', 3.0, path) is None
+    assert load_overhead(path) is None
+
+
+def test_meter_counts_the_cpu_time_of_the_helper():
+    pytest.importorskip('psutil')
+    busy = 'import time\nend = time.process_time() + 0.3\nwhile time.process_time() < end: pass\n'
+    process = subprocess.Popen([sys.executable, '-c', busy])
+    meter = ProcessCpuMeter(process.pid, 'python', interval=0.05)
+    meter.start()
+    process.wait()
+    cpu_sec = meter.stop()
+    # the last poll may come a little before the process exits
+    assert 0.1 < cpu_sec < 1.0
+
+
+def test_sensor_summary_counts_children_and_sensor_reads(tmp_path, monkeypatch):
+    busy = iter([10.0, 30.0, 30.0])
+    monkeypatch.setattr(attribution, 'system_busy_time', lambda: next(busy))
+    summary_path = tmp_path / 'monitor_overhead.json'
+    sensor = SelfOverheadSensor(model_pid=-1, summary_path=str(summary_path))
+    cpu = iter([1.0, 1.5, 1.5])
+    monkeypatch.setattr(sensor, '_process_cpu_time', lambda: next(cpu))
+    monkeypatch.setattr(sensor, '_thread_times', lambda: {1: ('main', 0.0)})
+    children = iter([{}, {42: ('nvidia-smi', 0.5)}, {42: ('nvidia-smi', 0.5)}])
+    monkeypatch.setattr(sensor, '_child_times', lambda: next(children))
+
+    sensor.open(FakeEngine())
+    assert sensor.read(0.0, 1.0) == [(1.0, 20.0)]
+    sensor.close(0.0, 2.0)
+
+    summary = json.loads(summary_path.read_text())
+    assert summary['monitor_cpu_time_sec'] == pytest.approx(1.0)
+    assert summary['overhead_share'] == pytest.approx(0.05)
+    assert summary['children'] == {'nvidia-smi (42)': 0.5}
+    assert summary['threads'] == {'main': 0.0, 'exited threads': 0.5}
+    assert summary['sensor_read_sec'] == {'monitor_overhead': 0.25}
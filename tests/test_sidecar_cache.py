@@ -0,0 +1,69 @@
+import os
+import pickle
+
+from sidecar_cache import load_or_build, SIDECAR_SUFFIX
+
+
+class CountingBuild:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        with open(path, 'r') as file:
+            return file.read().split()
+
+
+def _source(tmp_path, text='a b c'):
+    path = tmp_path / 'table.csv'
+    path.write_text(text)
+    return str(path)
+
+
+def test_sidecar_is_reused_while_the_source_is_unchanged(tmp_path):
+    path, build = _source(tmp_path), CountingBuild()
+    assert load_or_build(path, build) == ['a', 'b', 'c']
+    assert os.path.isfile(path + SIDECAR_SUFFIX)
+    assert load_or_build(path, build) == ['a', 'b', 'c']
+    assert build.calls == 1
+
+
+def test_sidecar_is_rebuilt_when_the_source_changes(tmp_path):
+    path, build = _source(tmp_path), CountingBuild()
+    load_or_build(path, build)
+    # same size, only the modification time tells the edit apart
+    stat = os.stat(path)
+    with open(path, 'w') as file:
+        file.write('x y z')
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert load_or_build(path, build) == ['x', 'y', 'z']
+    with open(path, 'a') as file:
+        file.write(' w')
+    assert load_or_build(path, build) == ['x', 'y', 'z', 'w']
+    assert build.calls == 3
+
+
+def test_sidecar_is_rebuilt_for_a_new_version(tmp_path):
+    path, build = _source(tmp_path), CountingBuild()
+    load_or_build(path, build, version=1)
+    load_or_build(path, build, version=2)
+    load_or_build(path, build, version=2)
+    assert build.calls == 2
+
+
+def test_corrupt_sidecar_is_rebuilt(tmp_path):
+    path, build = _source(tmp_path), CountingBuild()
+    with open(path + SIDECAR_SUFFIX, 'wb') as file:
+        file.write(b'not a pickle')
+    assert load_or_build(path, build) == ['a', 'b', 'c']
+    with open(path + SIDECAR_SUFFIX, 'rb') as file:
+        assert pickle.load(file)[1] == ['a', 'b', 'c']
+
+
+def test_unwritable_sidecar_builds_in_memory(tmp_path):
+    path, build = _source(tmp_path), CountingBuild()
+    sidecar_path = str(tmp_path / 'missing' / 'table.index')
+    assert load_or_build(path, build, sidecar_path=sidecar_path) == ['a', 'b', 'c']
+    assert load_or_build(path, build, sidecar_path=sidecar_path) == ['a', 'b', 'c']
+    assert build.calls == 2
+    assert os.listdir(tmp_path) == ['table.csv']